@@ -1,6 +1,8 @@
-import os.path, re, datetime, logging, urllib.request
+import os.path, re, datetime, logging, hashlib, shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pyquery import PyQuery as pq
-from src.download import open_or_download, sanity_check
+from src.download import download_pages, read_content, get_file, sanity_check, DOWNLOAD_CONCURRENCY
 from models.basemodel import BaseModel
 from peewee import (PrimaryKeyField, TextField,
                     DoubleField, DateTimeField, BooleanField)
@@ -28,29 +30,67 @@ class Actor(BaseModel):
     twitter = TextField(null=True)
 
     @staticmethod
-    def save_actors(logging_level=logging.INFO):
-        from src.season import BASE_URL, PLAYERS_PATH, COACHES_PATH
+    def save_actors(actors=None, logging_level=logging.INFO):
         """
-        Method for saving locally the actors.
+        Method for saving locally the actors and their photos. The profiles already downloaded are skipped.
+        :param actors: list of Actor, by default all of them.
         :param logging_level: logging object
         """
         logging.basicConfig(level=logging_level)
         logger = logging.getLogger(__name__)
 
         logger.info('Starting the download of actors...')
-        actors = Actor.select()
-        for cont, actor in enumerate(actors):
-            folder = COACHES_PATH if actor.is_coach else PLAYERS_PATH
-            url_tag = 'entrenador' if actor.is_coach else 'jugador'
+        actors = list(Actor.select()) if actors is None else actors
+        downloaded = download_pages([actor._profile() for actor in actors])
+        logger.info('Downloading finished! (new {} actors)\n'.format(downloaded))
+
+        Actor.save_photos(actors, logging_level)
+
+    @staticmethod
+    def save_photos(actors, logging_level=logging.INFO):
+        from src.season import PHOTOS_PATH
+        """
+        Method for saving locally the photos of the actors, concurrently.
+        Each url is requested once, and the photos with the same content are stored once in PHOTOS_PATH and linked
+        from the folder of each actor.
+        :param actors: list of Actor
+        :param logging_level: logging object
+        """
+        logging.basicConfig(level=logging_level)
+        logger = logging.getLogger(__name__)
 
-            filename = os.path.join(folder, actor.actor_acbid + '.html')
-            url = os.path.join(BASE_URL, '{}.php?id={}'.format(url_tag, actor.actor_acbid))
-            open_or_download(file_path=filename, url=url)
+        photos = defaultdict(list)  # url -> photo files
+        for actor in actors:
+            filename, _ = actor._profile()
+            photo_filename = os.path.splitext(filename)[0] + '.jpg'
+            if os.path.isfile(photo_filename):
+                continue
+            content = read_content(filename)
+            photo_url = actor._get_photo(content) if content is not None else None
+            if photo_url:
+                photos[photo_url].append(photo_filename)
+
+        def fetch(url):
+            try:
+                return url, get_file(url)
+            except Exception:
+                logger.info('Error downloading image: {}'.format(url))
+                return url, None
 
-            if cont % (round(len(actors) / 3)) == 0:
-                logger.info('{}% already downloaded'.format(round(float(cont) / len(actors) * 100)))
+        saved = 0
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as executor:
+            for url, data in executor.map(fetch, list(photos)):
+                if data is None:
+                    continue
+                photo_path = os.path.join(PHOTOS_PATH, hashlib.sha1(data).hexdigest() + '.jpg')
+                if not os.path.isfile(photo_path):
+                    with open(photo_path, 'wb') as file:
+                        file.write(data)
+                    saved += 1
+                for photo_filename in photos[url]:
+                    link_file(photo_path, photo_filename)
 
-        logger.info('Downloading finished!\n')
+        logger.info('Photos finished! ({} urls requested, {} distinct photos saved)\n'.format(len(photos), saved))
 
     @staticmethod
     def sanity_check(logging_level=logging.INFO):
@@ -68,7 +108,8 @@ class Actor(BaseModel):
         logger = logging.getLogger(__name__)
 
         logger.info('Starting to update the actors that have not been filled yet...')
-        actors = Actor.select().where(Actor.full_name >> None)
+        actors = list(Actor.select().where(Actor.full_name >> None))
+        Actor.save_actors(actors, logging_level)  # only the profiles that are not saved yet are downloaded.
         for cont, actor in enumerate(actors):
             actor._update_content()
             try:
@@ -79,30 +120,33 @@ class Actor(BaseModel):
 
         logger.info('Update finished! ({} actors)\n'.format(len(actors)))
 
-    def _update_content(self):
+    def _profile(self):
         from src.season import BASE_URL, PLAYERS_PATH, COACHES_PATH
         """
-        Update the information of a particular actor.
+        :return: (file, url) of the page of the actor.
         """
-        logging.basicConfig(level=logging.INFO)
-        logger = logging.getLogger(__name__)
-
         folder = COACHES_PATH if self.is_coach else PLAYERS_PATH
         url_tag = 'entrenador' if self.is_coach else 'jugador'
 
         filename = os.path.join(folder, self.actor_acbid + '.html')
         url = os.path.join(BASE_URL, '{}.php?id={}'.format(url_tag, self.actor_acbid))
-        content = open_or_download(file_path=filename, url=url)
+        return filename, url
+
+    def _update_content(self):
+        """
+        Update the information of a particular actor from its saved page.
+        """
+        logging.basicConfig(level=logging.INFO)
+        logger = logging.getLogger(__name__)
+
+        filename, url = self._profile()
+        content = read_content(filename)
+        if content is None:
+            logger.info('The page of the actor {} has not been downloaded: {}'.format(self.actor_acbid, url))
+            return
 
         personal_info = self._get_personal_info(content)
         twitter = self._get_twitter(content)
-        photo_url = self._get_photo(content)
-
-        photo_filename = os.path.join(folder, self.actor_acbid + '.jpg')
-        try:
-            urllib.request.urlretrieve(photo_url,photo_filename)
-        except:
-            logger.info('Error downloading image: {}'.format(photo_url))
 
         personal_info.update({'twitter': twitter})
 
@@ -209,3 +253,16 @@ class Actor(BaseModel):
             url = photo.attr['src']
 
         return url
+
+
+def link_file(source, destination):
+    """
+    Hard link a file, or copy it when the filesystem does not support links.
+
+    :param source: String
+    :param destination: String
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
@@ -1,16 +1,19 @@
-import os.path, re, difflib, logging
-from src.download import get_page,save_content,sanity_check_events
+import difflib, logging
+from src.download import get_page,sanity_check_events
 from models.basemodel import BaseModel, db
 from models.team import Team
 from models.actor import Actor
-from src.utils import convert_time, create_driver
+from src.utils import convert_time
+from src.driver_pool import DriverPool, DRIVER_POOL_SIZE, fibalivestats_targets
+from src.fibalivestats import get_backend
+from src.pbp import extract_pbp
+from src.competition import LACB, events_path, shotchart_path, fibalivestats_ids as competition_fibalivestats_ids
 from peewee import (PrimaryKeyField, ForeignKeyField, CharField, TextField, IntegerField)
-import time
-from src.utils import get_current_season
 import ast
 import mysql.connector as sql
 import pandas as pd
 
+INSERT_BATCH_SIZE = 500
 
 legend_dict = {
     'Asistencia': 'assist',
@@ -222,10 +225,13 @@ class Event(BaseModel):
     roster_away = CharField(null=True)
 
     @staticmethod
-    def save_events(season, driver_path, logging_level=logging.INFO):
+    def save_events(season, driver_path, pool_size=DRIVER_POOL_SIZE, backend='selenium', fibalivestats_ids=None, competition=LACB, logging_level=logging.INFO):
         """
         Method for saving locally the games of a season.
         :param season: int
+        :param backend: String, 'selenium', 'http' to build the pages without browser when possible, or 'replay'
+        :param fibalivestats_ids: dict fls_id -> game acbid, by default all the games of the season.
+        :param competition: Competition, see src/competition.py
         :param logging_level: logging object
         :return:
         """
@@ -235,87 +241,18 @@ class Event(BaseModel):
 
         logger.info('Taking all the ids for the events-games...')
 
-        if season.season == get_current_season():
-            fibalivestats_ids = season.get_current_game_events_ids()
-        else:
-            fibalivestats_ids = season.get_game_events_ids()
+        if fibalivestats_ids is None:
+            fibalivestats_ids = competition_fibalivestats_ids(season, competition)
 
         logger.info('Starting the download of events...')
 
-        driver = create_driver(driver_path)
-        n_checkpoints = 10
-        checkpoints = [int(i * float(len(fibalivestats_ids)) / n_checkpoints) for i in range(n_checkpoints + 1)]
-        for i, (fls_id, game_acbid) in enumerate(fibalivestats_ids.items()):
-            filename = os.path.join(season.EVENTS_PATH, str(game_acbid)+"-"+str(fls_id) + ".html")
-            eventURL="http://www.fibalivestats.com/u/ACBS/{}/pbp.html".format(fls_id)
-            if not os.path.isfile(filename):
-                try:
-                    driver.get(eventURL)
-                    time.sleep(1)
-                    html = driver.page_source
-                    save_content(filename,html)
-                except Exception as e:
-                    logger.info(str(e) + ' when trying to retrieve ' + filename)
-                    pass
-
-            # Debugging
-            if i-1 in checkpoints:
-                logger.info('{}% already downloaded'.format(round(float(i-1) / len(fibalivestats_ids) * 100)))
-
-        driver.close()
-        logger.info('Download finished!)\n')
-
-    @staticmethod
-    def sanity_check_events(driver_path,season, logging_level=logging.INFO):
-        sanity_check_events(driver_path,season.EVENTS_PATH, logging_level)
-
-    @staticmethod
-    def save_events_copa(season, driver_path, logging_level=logging.INFO):
-        """
-        Method for saving locally the games of a season.
-        :param season: int
-        :param logging_level: logging object
-        :return:
-        """
-
-        logging.basicConfig(level=logging_level)
-        logger = logging.getLogger(__name__)
-
-        logger.info('Taking all the ids for the events-games...')
-
-        if season.season == get_current_season():
-            fibalivestats_ids = season.get_current_game_events_ids_copa()
-        else:
-            fibalivestats_ids = season.get_game_events_ids_copa()
-
-        logger.info('Starting the download of events...')
-
-        driver = create_driver(driver_path)
-        n_checkpoints = 10
-        checkpoints = [int(i * float(len(fibalivestats_ids)) / n_checkpoints) for i in range(n_checkpoints + 1)]
-        for i, (fls_id, game_acbid) in enumerate(fibalivestats_ids.items()):
-            filename = os.path.join(season.EVENTS_PATH_COPA, str(game_acbid)+"-"+str(fls_id) + ".html")
-            eventURL="http://www.fibalivestats.com/u/ACBS/{}/pbp.html".format(fls_id)
-            if not os.path.isfile(filename):
-                try:
-                    driver.get(eventURL)
-                    time.sleep(1)
-                    html = driver.page_source
-                    save_content(filename,html)
-                except Exception as e:
-                    logger.info(str(e) + ' when trying to retrieve ' + filename)
-                    pass
-
-            # Debugging
-            if i-1 in checkpoints:
-                logger.info('{}% already downloaded'.format(round(float(i-1) / len(fibalivestats_ids) * 100)))
-
-        driver.close()
+        # The play-by-play and the shotchart of a game are captured together by the same worker.
+        DriverPool(driver_path, size=pool_size, backend=get_backend(backend)).run(fibalivestats_ids.items(), fibalivestats_targets(events_path(season, competition), shotchart_path(season, competition)))
         logger.info('Download finished!)\n')
 
     @staticmethod
-    def sanity_check_events_copa(driver_path,season, logging_level=logging.INFO):
-        sanity_check_events(driver_path,season.EVENTS_PATH_COPA, logging_level)
+    def sanity_check_events(driver_path, season, competition=LACB, logging_level=logging.INFO):
+        sanity_check_events(driver_path, events_path(season, competition), logging_level)
 
     @staticmethod
     def _fix_short_roster(game_acbid, roster_home_or_away, roster, list_include_actor, legend):
@@ -682,34 +619,31 @@ class Event(BaseModel):
 
     @staticmethod
     def scrap_and_insert(events_game_acbid, game_acbid, playbyplay, team_home_id, team_away_id, actors_home, actors_away):
+        """
+        :param playbyplay: PbpBatch with the actions of the game (see src/pbp.py), or the play-by-play page as a String.
+        :return: int, number of events with errors in the rosters.
+        """
         logging.basicConfig(level=logging.INFO)
         logger = logging.getLogger(__name__)
 
-        actions = {}
-        cont = 1
+        if isinstance(playbyplay, str):
+            playbyplay = extract_pbp(playbyplay)
+
+        actions = []
         events_with_errors=0
-        home_score = away_score = 0
 
         roster_home=[]
         roster_away=[]
+        matched_actors = {}
 
-        for elem in reversed(list(playbyplay('div').items())):
-            if elem.attr['class'] and elem.attr['class'].startswith("pbpa"):
-
-                tag = elem.attr['class']
-                team_id = team_home_id if "pbpt1" in tag else team_away_id if "pbpt2" in tag else None
+        for i in range(len(playbyplay.side)):
+            side = playbyplay.side[i]
+            team_id = team_home_id if side == 1 else team_away_id if side == 2 else None
 
+            parsed = playbyplay.parsed[i]
+            if parsed:
+                display_name = playbyplay.name[i]
                 try:
-                    legend = elem('.pbp-action').text().split(", ")[-1].split("\n")[0]
-                    period, marker = elem('.pbp-time').text().split(" ")
-                    marker_search = re.search(r'([0-9]{2}:[0-9]{2})([0-9]+)-([0-9]+)', marker)
-                    if marker_search:
-                        time, home_score, away_score = marker_search.groups()
-                    else:
-                        time = re.search(r'([0-9]{2}:[0-9]{2})', marker).groups()[0]
-                    jersey, display_name, _ = elem('.pbp-action').text().split(", ")
-                    jersey = int(jersey)
-
                     # Matching display_name with actor_id
                     if team_id == team_home_id:
                         actors_names_ids = actors_home
@@ -720,70 +654,77 @@ class Event(BaseModel):
 
                     if display_name in actors_names_ids.keys():
                         query_actor_id = actors_names_ids[display_name]
+                    elif (side, display_name) in matched_actors:
+                        query_actor_id = matched_actors[(side, display_name)]
                     else:
                         most_likely_actor = difflib.get_close_matches(display_name, actors_names_ids.keys(), 1, 0.4)[0]
                         query_actor_id = actors_names_ids[most_likely_actor]
+                        matched_actors[(side, display_name)] = query_actor_id
                         logger.info('Actor {} has been matched to: {}'.format(display_name, most_likely_actor))
-
-                except:  # Cells without player associated (e.g. timeouts and missing info)
-                    legend = elem('.pbp-action').text() if elem('.pbp-action').text() != '' else \
-                    elem.text().split("\n")[0]
-                    time = elem.attr['id']
-                    period = "P" + re.search(r'per_[a-z]?([a-z]?[0-9]+)', tag).groups()[0]
-                    jersey = -1
-                    query_actor_id=None
-
-                #roster home
-                if "pbpt1" in tag:
-                    if legend_dict[legend]=="sub_in":
-                        if query_actor_id not in roster_home:
-                            roster_home.append(query_actor_id)
-                    elif legend_dict[legend]=="sub_out":
-                        try:
-                            roster_home.remove(query_actor_id)
-                        except:
-                            logger.warning('Game: {} ({}). Cannot remove actor. Actor {} is not in list {}'.format(game_acbid, events_game_acbid, query_actor_id, roster_home))
-
-                #roster away
-                elif "pbpt2" in tag:
-                    if legend_dict[legend]=="sub_in":
-                        if query_actor_id not in roster_away:
-                            roster_away.append(query_actor_id)
-                    elif legend_dict[legend]=="sub_out":
-                        try:
-                            roster_away.remove(query_actor_id)
-                        except:
-                            logger.warning('Game: {} ({}). Cannot remove actor. Actor {} is not in list {}'.format(game_acbid, events_game_acbid, query_actor_id, roster_away))
-
-                if legend in play_events_dict:
-                    if len(roster_home) != 5:
-                        events_with_errors+=1
-                        logger.warning('Game: {} ({}). Roster home list length ({}) error: {} for team: {} and event: {}'.format(game_acbid,events_game_acbid,len(roster_home),roster_home,team_home_id,legend_dict[legend]))
-                    if len(roster_away) != 5:
-                        events_with_errors += 1
-                        logger.warning('Game: {} ({}). Roster away list length ({}) error: {} for team: {} and event: {}'.format(game_acbid,events_game_acbid,len(roster_away),roster_away,team_away_id,legend_dict[legend]))
-                    #if query_actor_id not in roster_home and query_actor_id not in roster_away:
-                        #if jersey is not -1:
-                        #logger.warning('Game: {} ({}). The actor: {} with jersey: {} is not in the field for event: {}. Roster home {}, Roster away: {}'.format(game_acbid,events_game_acbid,query_actor_id,jersey,legend_dict[legend],roster_home,roster_away))
-
-                elapsed_time = convert_time(time, period[1:])
-                actions[cont] = {"events_game_acbid": events_game_acbid,
-                                 "game_acbid": game_acbid,
-                                 "team_id": team_id,
-                                 "actor_id": query_actor_id,
-                                 "legend": legend_dict[legend],
-                                 "extra_info": extra_legend_dict.setdefault(legend, None),
-                                 "elapsed_time": elapsed_time,
-                                 "jersey": jersey,
-                                 "home_score": home_score,
-                                 "away_score": away_score,
-                                 "roster_home": str(roster_home),
-                                 "roster_away": str(roster_away)}
-                cont+=1
+                except:
+                    parsed = False
+
+            if parsed:
+                legend = playbyplay.legend[i]
+                jersey = playbyplay.jersey[i]
+                elapsed_time = playbyplay.elapsed_time[i]
+                if elapsed_time is None:
+                    elapsed_time = convert_time(playbyplay.clock[i], playbyplay.period[i][1:])
+            else:  # Cells without player associated (e.g. timeouts and missing info)
+                legend = playbyplay.fallback_legend[i]
+                if playbyplay.fallback_period[i] is None:
+                    raise ValueError('The period of an action of game {} could not be read'.format(game_acbid))
+                elapsed_time = convert_time(playbyplay.fallback_clock[i], playbyplay.fallback_period[i][1:])
+                jersey = -1
+                query_actor_id = None
+
+            legend_code = legend_dict[legend]
+
+            #roster home
+            if side == 1:
+                if legend_code=="sub_in":
+                    if query_actor_id not in roster_home:
+                        roster_home.append(query_actor_id)
+                elif legend_code=="sub_out":
+                    try:
+                        roster_home.remove(query_actor_id)
+                    except:
+                        logger.warning('Game: {} ({}). Cannot remove actor. Actor {} is not in list {}'.format(game_acbid, events_game_acbid, query_actor_id, roster_home))
+
+            #roster away
+            elif side == 2:
+                if legend_code=="sub_in":
+                    if query_actor_id not in roster_away:
+                        roster_away.append(query_actor_id)
+                elif legend_code=="sub_out":
+                    try:
+                        roster_away.remove(query_actor_id)
+                    except:
+                        logger.warning('Game: {} ({}). Cannot remove actor. Actor {} is not in list {}'.format(game_acbid, events_game_acbid, query_actor_id, roster_away))
+
+            if legend in play_events_dict:
+                if len(roster_home) != 5:
+                    events_with_errors+=1
+                    logger.warning('Game: {} ({}). Roster home list length ({}) error: {} for team: {} and event: {}'.format(game_acbid,events_game_acbid,len(roster_home),roster_home,team_home_id,legend_code))
+                if len(roster_away) != 5:
+                    events_with_errors += 1
+                    logger.warning('Game: {} ({}). Roster away list length ({}) error: {} for team: {} and event: {}'.format(game_acbid,events_game_acbid,len(roster_away),roster_away,team_away_id,legend_code))
+
+            actions.append({"events_game_acbid": events_game_acbid,
+                            "game_acbid": game_acbid,
+                            "team_id": team_id,
+                            "actor_id": query_actor_id,
+                            "legend": legend_code,
+                            "extra_info": extra_legend_dict.setdefault(legend, None),
+                            "elapsed_time": elapsed_time,
+                            "jersey": jersey,
+                            "home_score": playbyplay.home_score[i],
+                            "away_score": playbyplay.away_score[i],
+                            "roster_home": str(roster_home),
+                            "roster_away": str(roster_away)})
 
         with db.atomic():
-            for event in actions.values():
-                Event.create(**event)
+            for start in range(0, len(actions), INSERT_BATCH_SIZE):
+                Event.insert_many(actions[start:start + INSERT_BATCH_SIZE]).execute()
 
         return events_with_errors
-
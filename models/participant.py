@@ -1,7 +1,5 @@
-import re, logging
-from pyquery import PyQuery as pq
-from collections import defaultdict
-from src.utils import fill_dict, replace_nth_ocurrence
+import logging
+from src.ficha import extract_game
 from models.basemodel import BaseModel
 from models.game import Game
 from models.team import Team
@@ -47,14 +45,16 @@ class Participant(BaseModel):
     efficiency = IntegerField(null=True)
 
     @staticmethod
-    def create_instances(raw_game, game):
+    def create_instances(game_record, game):
         """
         Extract all the information regarding a participant from a game.
 
-        :param raw_game: string
+        :param game_record: GameRecord read from the ficha by src/ficha.py, or the ficha as a String.
         :param game: Game instance
         """
-        Participant._create_players_and_coaches(raw_game, game)
+        if isinstance(game_record, str):
+            game_record = extract_game(game_record, game.game_acbid)
+        Participant._create_players_and_coaches(game_record, game)
 
     @staticmethod
     def _fix_acbid(actor_name, actor_acbid,is_coach):
@@ -168,211 +168,26 @@ class Participant(BaseModel):
         Participant._fix_players_participations(0,17)
 
     @staticmethod
-    def _create_players_and_coaches(raw_game, game):
+    def _create_players_and_coaches(game_record, game):
         """
-        Extract and create the information about players and coaches.
+        Create the information about players and coaches from the box score of a game.
 
-        :param raw_game: String
+        :param game_record: GameRecord
         :param game: Game object
         :return: List of Participant objects and list of Actor objects.
         """
-        estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"',
-                                                           raw_game) else '.estadisticas'
-        doc = pq(raw_game)
-        info_players_data = doc(estadisticas_tag).eq(1)
+        # The final score is read from the box score too, see Game.create_instance.
+        scores = {'score_home': game_record.score_home, 'score_away': game_record.score_away}
+        scores = {attribute: score for attribute, score in scores.items() if score is not None}
+        if any(getattr(game, attribute) != score for attribute, score in scores.items()):
+            for attribute, score in scores.items():
+                setattr(game, attribute, score)
+            game.save()
 
-        """
-        We make sure we only retrieve stats that are in the header. One clear example can be found when the
-        estadisticas_tag is 'estadisticas' since it hasn't got the +/- stat.
-        """
-        header_text = info_players_data('tr').eq(1)
-        header = []
-        for index in header_text('td').items():
-            header.append(index.text())
-
-        """
-        However, the acb ids of the stats are not unique and some of them are repeteated.
-        We have three times a 'C' and two times a 'F'. We manually modify these ids.
-        """
-        # The first C is counterattack, the second C is received_block and the third received_fault.
-        header = replace_nth_ocurrence(header, 3, "C", "FPC")
-        header = replace_nth_ocurrence(header, 2, "C", "TAPC")
-        # The first F is block and the second F is  fault.
-        header = replace_nth_ocurrence(header, 2, "F", "FPF")
-        header = replace_nth_ocurrence(header, 1, "F", "TAPF")
-
-        """
-        We create the correspondance between the acb ids and the attributes in our database
-        """
-        header_to_db = {'D': 'number', 'Nombre': "display_name", 'Min': 'minutes', 'P': 'point', 'T2': 't2',
-                        'T3': 't3', 'T1': 't1', 'REBD': 'defensive_reb', 'REBO': 'offensive_reb', 'A': 'assist',
-                        'BR': 'steal', 'BP': 'turnover', 'C': 'counterattack', 'TAPF': 'block',
-                        'TAPC': 'received_block', 'M': 'dunk', 'FPF': 'fault', 'FPC': 'received_fault',
-                        '+/-': 'plus_minus', 'V': 'efficiency'}
-
-        """
-        Let us remove the database attributes that are not included in the header.
-        """
-        # Preventing from missing stats
-        for key, match in list(header_to_db.items()):
-            if key not in header:
-                header_to_db.pop(key)
-
-        """
-        We add extra attributes that are not inferred directly from the stats, but from the context.
-        """
-        header_to_db.update({"is_coach": "is_coach",
-                             "is_starter": "is_starter",
-                             "game": "game",
-                             "team": "team",
-                             "actor": "actor",
-                             "t1_attempt": "t1_attempt",
-                             "t2_attempt": "t2_attempt",
-                             "t3_attempt": "t3_attempt",
-                             "defensive_reb": "defensive_reb",
-                             "offensive_reb": "offensive_reb"})
+        if game_record.box_error is not None:
+            raise game_record.box_error
 
         """
-        We create a dictionary that contains, for each of the teams, and for each of the players, and for each of the stats
-        the value of such stat for such player of such team.
-
-        > stats[team][player][stat]
-
-        where 'team' is the name of the team, 'player' is the number of the player and 'stat' is the acb stat id.
-        """
-        acb_error_player = None
-        stats = defaultdict(dict)
-        current_team = None
-        score_flag = 0
-        for tr in info_players_data('tr').items():  # iterate over each row
-            if tr('.estverde'):  # header
-                if tr.eq(0)('.estverdel'):  # team information
-                    current_team = 0 if current_team is None else 1  # first team home team
-                    stats[current_team] = defaultdict(dict)
-                else:  # omit indexes
-                    pass
-            else:  # players, equipo, and coach.
-                number = None
-                for cont, td in enumerate(tr('td').items()):  # iterate over each cell (stat)
-
-                    if td.text() == "5f":
-                        break
-
-                    elif td.text() == 'Total' or number == 'Total':
-                        number = 'Total'
-                        if score_flag < 2:
-                            score_flag += 1
-                            continue
-                        elif score_flag == 2:
-                            score_flag += 1
-                            try:
-                                game.score_home = int(td.text()) if current_team == 0 else game.score_home
-                            except Exception as e:
-                                print(e)
-                                pass
-                            try:
-                                game.score_away = int(td.text()) if current_team == 1 else game.score_away
-                            except Exception as e:
-                                print(e)
-                                pass
-                            game.save()
-                            continue
-                        else:
-                            score_flag = 0
-                            break
-
-                    elif cont == 0:  # first cell number of the player
-                        number = td.text() if td.text() else 'Equipo'
-                        #if number == 'Equipo': #¿Queremos que las stats de equipo en un partido se metan en participantes????
-                        #    break
-                        if number in stats[current_team]:  # preventing from errors with the number.
-                            wrong_pages_first = ['55313', '54017', '54026', '61072', '61076', '61107','62177']  # if the good one is the first.
-                            wrong_pages_second = ['53154', '61218','62177']  # if the good one is the second.
-                            if game.game_acbid in wrong_pages_first:  # acb error... >:(
-                                pass
-                            elif game.game_acbid in wrong_pages_second:
-                                stats[current_team][number] = acb_error_player
-                                break
-                            else:  # sometimes th acb has some duplicated players (error).
-                                continue
-                                #raise ValueError('Number {} does already exist in game {}!'.format(number, game.game_acbid))
-
-                        else:
-                            # Create the dict with default attributes.
-                            stats[current_team][number] = fill_dict(header_to_db.values())
-                            stats[current_team][number]['is_starter'] = 1 if td('.gristit') else 0
-                            stats[current_team][number]['game'] = game
-                            stats[current_team][number]['team'] = game.team_home_id if current_team == 0 else game.team_away_id
-
-                    elif cont == 1 and td('a'):  # second cell player id
-                        href_attribute = td('a').attr('href').split("=")  # the acb id is in the href attribute.
-                        stats[current_team][number]['id'] = href_attribute[-1]
-
-                        is_coach = re.search(r'entrenador', href_attribute[0])
-                        stats[current_team][number]['is_coach'] = 1 if is_coach else 0
-                        stats[current_team][number]['number'] = None if is_coach else int(number)
-
-
-                        display_name = td.text()
-                        #if display_name=="":
-                        #    stats=None
-                        #    pass
-                        #else:
-                        if ',' in display_name:
-                            try:
-                                last_name, first_name = list(map(lambda x: x.strip(), td.text().split(",")))
-                                new_display_name = str(first_name)[0] + '. ' + last_name
-                                stats[current_team][number]['display_name'] = new_display_name
-                            except: # E.g Milisavljevic,                                new_display_name=last_name
-                                stats[current_team][number]['display_name'] = new_display_name
-                        else:  # E.g. San Emeterio
-                            stats[current_team][number]['display_name'] = display_name
-
-
-
-                    elif '%' in header[cont]:  # discard percentages.
-                        continue
-
-                    elif '/' in td.text():  # T1, T2 or T3 in format success/attempts.
-                        success, attempts = td.text().split("/")
-                        try:
-                            stats[current_team][number][header_to_db[header[cont]]] = int(success)
-                        except Exception as e:
-                            print(e)
-                            pass
-                        try:
-                            stats[current_team][number][header_to_db[header[cont]] + "_attempt"] = int(attempts)
-                        except Exception as e:
-                            print(e)
-                            pass
-
-                    elif '+' in td.text():  # defensive and offensive rebounds in format D+O
-                        defensive, offensive = td.text().split("+")
-                        try:
-                            stats[current_team][number]["defensive_reb"] = int(defensive)
-                        except Exception as e:
-                            print(e)
-                            pass
-                        try:
-                            stats[current_team][number]["offensive_reb"] = int(offensive)
-                        except Exception as e:
-                            print(e)
-                            pass
-
-                    elif ':' in td.text():  # minutes in format minutes:seconds
-                        minutes, seconds = td.text().split(":")
-                        stats[current_team][number]["minutes"] = int(minutes) * 60 + int(seconds)
-
-                    else:
-                        if header[cont] in header_to_db:  # only add useful stats.
-                            try:
-                                stats[current_team][number][header_to_db[header[cont]]] = int(
-                                    td.text()) if td.text() else 0
-                            except:
-                                stats[current_team][number][header_to_db[header[cont]]] = td.text()
-
-                    acb_error_player = stats[current_team][number]
-        """
         We now insert the participants of the game in the database.
         Therefore, we need first to get or create the actors in the database.
 
@@ -381,24 +196,24 @@ class Participant(BaseModel):
         """
         to_insert_many_participants = []
         actors = []
-        for team, team_dict in stats.items():
-            for player, player_stats in team_dict.items():
-                try:
-                    if stats[team][player]['id']=="" or stats[team][player]['display_name']=="":
-                        #del stats[team][player]
-                        stats[team][player].pop('id')
-                        pass
-                    actor = Actor.get_or_create(actor_acbid=stats[team][player]['id'],display_name=stats[team][player]['display_name'])
-                    if actor[1]:
-                        actor[0].display_name = stats[team][player]['display_name']
-                        actor[0].is_coach = stats[team][player]['is_coach']
-                        actor[0].save()
-                        actors.append(actor)
-                    stats[team][player]['actor'] = actor[0]
-                    stats[team][player].pop('id')
-                except KeyError:
-                    pass
-                to_insert_many_participants.append(stats[team][player])
+        for row in game_record.box:
+            player_stats = row.stats
+            player_stats['game'] = game
+            player_stats['team'] = game.team_home_id if row.team == 0 else game.team_away_id
+            try:
+                if player_stats['id']=="" or player_stats['display_name']=="":
+                    player_stats.pop('id')
+                actor = Actor.get_or_create(actor_acbid=player_stats['id'],display_name=player_stats['display_name'])
+                if actor[1]:
+                    actor[0].display_name = player_stats['display_name']
+                    actor[0].is_coach = player_stats['is_coach']
+                    actor[0].save()
+                    actors.append(actor)
+                player_stats['actor'] = actor[0]
+                player_stats.pop('id')
+            except KeyError:
+                pass
+            to_insert_many_participants.append(player_stats)
 
         participants = Participant.insert_many(to_insert_many_participants)
         participants.execute()
@@ -1,11 +1,42 @@
-import os.path, logging
+import os.path, logging, json
 from pyquery import PyQuery as pq
 from peewee import ForeignKeyField
-from src.download import open_or_download
+from src.download import download_pages, read_content
 from models.basemodel import BaseModel
 from peewee import (PrimaryKeyField, CharField, IntegerField)
 from src.season import BASE_URL, TEAMS_PATH, FIRST_SEASON, LAST_SEASON
 
+TEAM_NAMES_CACHE = os.path.join(TEAMS_PATH, 'names.json')
+INSERT_BATCH_SIZE = 500
+
+
+def club_page(team_acbid, s):
+    """
+    :param team_acbid: String
+    :param s: int, number of the season (1 is FIRST_SEASON)
+    :return: (file, url) of the club page of a team in a season.
+    """
+    filename = os.path.join(TEAMS_PATH, team_acbid + str(s) + '.html')
+    url = os.path.join(BASE_URL, 'club.php?cod_competicion=LACB&cod_edicion={}&id={}'.format(s, team_acbid))
+    return filename, url
+
+
+def load_team_names_cache():
+    """
+    :return: dict team_acbid -> {'names': {season number: name}, 'founded_year': int}
+    """
+    if os.path.isfile(TEAM_NAMES_CACHE):
+        with open(TEAM_NAMES_CACHE, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    return {}
+
+
+def save_team_names_cache(cache):
+    tmp_path = TEAM_NAMES_CACHE + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, TEAM_NAMES_CACHE)
+
 
 class Team(BaseModel):
     """
@@ -26,37 +57,76 @@ class Team(BaseModel):
         Note that we have a teamname for a single team and season, as those may change due to the sponsors.
         However, the same teams always have the same acbid so we can link them.
         Besides we will add the founded year.
+
+        The club pages are downloaded concurrently. The founded year is read first from the page of the last season,
+        so the seasons before the team was founded are not requested. The names found are kept in a cache within
+        TEAMS_PATH, so each page is only parsed once.
         :param season: int
         :return:
         """
-        teams_ids = season.get_teams_ids()
-        for team_acbid in teams_ids:
+        new_teams = []
+        for team_acbid in season.get_teams_ids():
             team, created = Team.get_or_create(**{'team_acbid': team_acbid})
             if created:  # If the team was not in our database before
-                teams_names = []  # Look for all historical team names and save them
-                for s in range(1, LAST_SEASON - FIRST_SEASON + 2):
-                    filename = os.path.join(TEAMS_PATH, team_acbid + str(s) + '.html')
-                    url = os.path.join(BASE_URL, 'club.php?cod_competicion=LACB&cod_edicion={}&id={}'.format(s, team_acbid))
-                    content = open_or_download(file_path=filename, url=url)
-                    doc = pq(content)
-                    team_name_season = doc('#portadadertop').eq(0).text().upper()
-                    if team_name_season != '':
-                        teams_names.append({'team_id': team.id, 'name': str(team_name_season), 'season': FIRST_SEASON + s - 1})
-                TeamName.insert_many(teams_names).on_conflict('IGNORE').execute()
+                new_teams.append(team)
+        if not new_teams:
+            return
+
+        cache = load_team_names_cache()
+        last_season = LAST_SEASON - FIRST_SEASON + 1
+        for team in new_teams:
+            cache.setdefault(team.team_acbid, {'names': {}, 'founded_year': None})
+        Team._crawl(cache, [(team.team_acbid, last_season) for team in new_teams])
+
+        pages = []
+        for team in new_teams:
+            entry = cache[team.team_acbid]
+            founded_year = entry['founded_year']
+            if founded_year is None:
+                founded_year = team.get_hardcoded_foundation_years(team.team_acbid)
+                if founded_year is not None:
+                    logging.info("Team {} doesn't have foundation year. Hardcoded with year: {}".format(team.team_acbid, founded_year))
+                else:
+                    logging.info("Team {} doesn't have foundation year. No matches found.".format(team.team_acbid))
+
+            if founded_year is not None:
+                team.founded_year = int(founded_year)
+                team.save()
+            first_season = max(1, int(founded_year) - FIRST_SEASON + 1) if founded_year is not None else 1
+            pages += [(team.team_acbid, s) for s in range(first_season, last_season)]
+        Team._crawl(cache, pages)
+        save_team_names_cache(cache)
+
+        teams_names = []  # Look for all historical team names and save them
+        for team in new_teams:
+            for s, team_name_season in cache[team.team_acbid]['names'].items():
+                if team_name_season != '':
+                    teams_names.append({'team_id': team.id, 'name': team_name_season, 'season': FIRST_SEASON + int(s) - 1})
+        for i in range(0, len(teams_names), INSERT_BATCH_SIZE):
+            TeamName.insert_many(teams_names[i:i + INSERT_BATCH_SIZE]).on_conflict('IGNORE').execute()
+
+    @staticmethod
+    def _crawl(cache, pages):
+        """
+        Download concurrently the club pages that are not in the cache yet, and add their names to it.
+
+        :param cache: dict, see load_team_names_cache
+        :param pages: list of (team_acbid, season number)
+        """
+        pages = [(team_acbid, s) for team_acbid, s in pages if str(s) not in cache[team_acbid]['names']]
+        download_pages([club_page(team_acbid, s) for team_acbid, s in pages])
+
+        for team_acbid, s in pages:
+            content = read_content(club_page(team_acbid, s)[0])
+            if content is None:  # it could not be downloaded, it will be requested again in the next run.
+                continue
+            doc = pq(content)
+            cache[team_acbid]['names'][str(s)] = str(doc('#portadadertop').eq(0).text().upper())
+            if doc('.titulojug').eq(0).text().startswith('Año de fundac'):
                 try:
-                    # Add the year of foundation (from last url content)
-                    if doc('.titulojug').eq(0).text().startswith('Año de fundac'):
-                        team.founded_year = int(doc('.datojug').eq(0).text())
-                        team.save()
-                except:
-                    founded_year=team.get_hardcoded_foundation_years(team_acbid)
-                    if founded_year!=None:
-                        team.founded_year=founded_year
-                        team.save()
-                        logging.info("Team {} doesn't have foundation year. Hardcoded with year: {}".format(team_acbid,founded_year))
-                    else:
-                        logging.info("Team {} doesn't have foundation year. No matches found.".format(team_acbid))
-                        pass
+                    cache[team_acbid]['founded_year'] = int(doc('.datojug').eq(0).text())
+                except ValueError:
+                    pass
 
     @staticmethod
     def get_hardcoded_foundation_years(team_acbid):
@@ -1,4 +1,4 @@
-import argparse, os, re,glob
+import argparse, os, glob, itertools, bisect
 from models.basemodel import db, reset_database, delete_records, create_schema
 from models.event import *
 from models.team import TeamName, Team
@@ -11,61 +11,52 @@ from ml.train import *
 from ml.predict import *
 from src.season import Season
 from src.advanced_statistics import *
-import pyquery
 from src.utils import get_driver_path, get_current_season
+from src.download import list_pages, read_content, page_exists
+from src.sync import SyncState
+from src.gaps import find_gaps, expected_games, expected_fibalivestats
+from src import raw_store, trim, replay, parse_cache
+from src.fibalivestats import PBP, SHOTCHART
+from src.http_client import get_client
+from src.manifest import get_manifest
+from src.ficha import extract_game, parse_games, is_blank_game, PARSER_VERSION as GAMES_PARSER_VERSION
+from src.pbp import extract_pbp, PARSER_VERSION as PBP_PARSER_VERSION
+from src.court import extract_shots, PARSER_VERSION as SHOTCHART_PARSER_VERSION
+from src.competition import LACB, CREY, get_competitions, download_season, games_path, events_path, shotchart_path
 import ast
 
-def download_games(season):
-    """
-    Download locally the games of a certain season
-    :param season: Season object.
-    """
-    Game.save_games(season)
-    Game.sanity_check(season)
+GAMES_PER_TRANSACTION = 100  # games written in each transaction by insert_games.
 
 
-def download_games_copa(season):
+def download_games(season, competition=LACB):
     """
     Download locally the games of a certain season
     :param season: Season object.
+    :param competition: Competition, see src/competition.py
     """
-    Game.save_games_copa(season)
-    Game.sanity_check_copa(season)
-
+    Game.save_games(season, competition=competition)
 
-def download_events(season,driver_path):
-    """
-    Download locally the events of a certain season
-    :param season: Season object.
-    """
-    Event.save_events(season,driver_path)
-    Event.sanity_check_events(driver_path,season)
 
-def download_events_copa(season,driver_path):
+def download_events(season,driver_path,backend='selenium',competition=LACB):
     """
     Download locally the events of a certain season
     :param season: Season object.
+    :param competition: Competition, see src/competition.py
     """
-    Event.save_events_copa(season,driver_path)
-    Event.sanity_check_events_copa(driver_path,season)
+    Event.save_events(season,driver_path,backend=backend,competition=competition)
+    if trim.is_enabled():  # pages saved before trimming was enabled
+        trim.trim_directory(events_path(season, competition), PBP)
 
 
-def download_shotchart(season,driver_path):
+def download_shotchart(season,driver_path,backend='selenium',competition=LACB):
     """
     Download locally the shotchart of a certain season
     :param season: Season object.
+    :param competition: Competition, see src/competition.py
     """
-    Shotchart.save_shotchart(season,driver_path)
-    Shotchart.sanity_check_shotchart(driver_path,season)
-
-
-def download_shotchart_copa(season,driver_path):
-    """
-    Download locally the shotchart of a certain season
-    :param season: Season object.
-    """
-    Shotchart.save_shotchart_copa(season,driver_path)
-    Shotchart.sanity_check_shotchart_copa(driver_path,season)
+    Shotchart.save_shotchart(season,driver_path,backend=backend,competition=competition)
+    if trim.is_enabled():  # pages saved before trimming was enabled
+        trim.trim_directory(shotchart_path(season, competition), SHOTCHART)
 
 
 def insert_teams(season):
@@ -79,80 +70,89 @@ def insert_teams(season):
         logger.info('All teams for the season are now in the database.\n')
 
 
-def insert_games(season):
+def insert_games(season, file_names=None, competition=LACB, workers=None):
     """
     Extract and insert the information regarding the games of a season.
     :param season: Season object.
+    :param file_names: list of the game files to insert, by default all of them.
+    :param competition: Competition, see src/competition.py
+    :param workers: int, number of processes that parse the game files while this one writes them in the database, in
+    transactions of GAMES_PER_TRANSACTION games. By default they are parsed in this process.
     """
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
-    with db.atomic():
+    if competition.phase is not None:  # the phases of the league are given by the number of the game.
+        return insert_cup_games(season, competition, file_names)
 
-        # Games iformation
-        logger.info('Retrieving all data from games and storing it.')
+    # Games iformation
+    logger.info('Retrieving all data from games and storing it.')
 
-        n_regular = season.get_number_games_regular_season()
+    n_regular = season.get_number_games_regular_season()
 
-        # Specific info for the playoffs
-        relegation_teams = season.get_relegation_teams()  # in some seasons there was a relegation playoff.
-        cont = 0
-        playoff_format = season.get_playoff_format()
+    # Specific info for the playoffs
+    relegation_teams = season.get_relegation_teams()  # in some seasons there was a relegation playoff.
+    cont = 0
+    playoff_format = season.get_playoff_format()
+    try:
+        quarter_finals_limit = 4 * playoff_format[0]
         try:
-            quarter_finals_limit = 4 * playoff_format[0]
-            try:
-                semifinals_limit = quarter_finals_limit + 2 * playoff_format[1]
-            except Exception as e:
-                # print(e)
-                pass
+            semifinals_limit = quarter_finals_limit + 2 * playoff_format[1]
         except Exception as e:
             # print(e)
             pass
+    except Exception as e:
+        # print(e)
+        pass
 
-        # For all games available
-        list_files=sorted(os.listdir(season.GAMES_PATH))
-        for file_name in [f for f in list_files if os.path.isfile(os.path.join(season.GAMES_PATH, f))]:
-            game_number = int(file_name.split("-")[0])
-            game_acbid = int(file_name.split("-")[1].split(".")[0])
-
-            # Check it was not in the database already (-u option)
-            query = Game.select().where(Game.game_acbid == game_acbid)
-            if not query:
-                pass
-            else:
-                continue
-
-            if game_number <= n_regular:  # Regular season
-                competition_phase = 'regular'
-                round_phase = None
-                try:
-                    with open(os.path.join(season.GAMES_PATH, file_name), 'r', encoding='utf-8') as f:
-                        raw_game = f.read()
-                        game = Game.create_instance(raw_game=raw_game, game_acbid=game_acbid,
+    # Check they were not in the database already (-u option)
+    pending = []
+    for file_name in list_pages(season.GAMES_PATH) if file_names is None else file_names:
+        game_acbid = int(file_name.split("-")[1].split(".")[0])
+        if not Game.select().where(Game.game_acbid == game_acbid):
+            pending.append(file_name)
+    previous_playoff = previous_playoff_games(season, n_regular, pending)
+
+    cache = parse_cache.open_cache(season.GAMES_PATH, GAMES_PARSER_VERSION)
+    games = ((file_name, int(file_name.split("-")[1].split(".")[0]), read_content(os.path.join(season.GAMES_PATH, file_name)))
+             for file_name in pending)
+    parsed_games = zip(pending, parse_games(games, workers, cache))
+
+    # For all games available
+    for _ in range(0, len(pending), GAMES_PER_TRANSACTION):
+        with db.atomic():
+            for file_name, (blank, game_record) in itertools.islice(parsed_games, GAMES_PER_TRANSACTION):
+                game_number = int(file_name.split("-")[0])
+                game_acbid = int(file_name.split("-")[1].split(".")[0])
+
+                if game_number <= n_regular:  # Regular season
+                    competition_phase = 'regular'
+                    round_phase = None
+                    try:
+                        if isinstance(game_record, Exception):
+                            raise game_record
+                        game = Game.create_instance(game_record=game_record, game_acbid=game_acbid,
                                                     season=season,
                                                     competition_phase=competition_phase,
                                                     round_phase=round_phase)
-                        Participant.create_instances(raw_game=raw_game, game=game)
-                except Exception as e:
-                    print(e)
-                    logger.info(
-                        "Game {} could not be inserted as it didn't exist or had some errors...".format(game_acbid))
-
-            else:  # Playoff
-                competition_phase = 'playoff'
-                round_phase = None
-                try:
-                    with open(os.path.join(season.GAMES_PATH, file_name), 'r', encoding='utf-8') as f:
-                        raw_game = f.read()
-
+                        Participant.create_instances(game_record=game_record, game=game)
+                    except Exception as e:
+                        print(e)
+                        logger.info(
+                            "Game {} could not be inserted as it didn't exist or had some errors...".format(game_acbid))
+
+                else:  # Playoff
+                    competition_phase = 'playoff'
+                    round_phase = None
+                    try:
                         # A playoff game might be blank if the series ends before the last game.
-                        if re.search(r'<title>ACB.COM</title>', raw_game) \
-                                and (re.search(r'"estverdel"> <', raw_game)
-                                     or re.search(r'<font style="font-size : 12pt;">0 |', raw_game)):
+                        if blank:
                             cont += 1
                             continue
+                        if isinstance(game_record, Exception):
+                            raise game_record
 
-                        game = Game.create_instance(raw_game=raw_game, game_acbid=game_acbid,
+                        game = Game.create_instance(game_record=game_record, game_acbid=game_acbid,
                                                     season=season,
                                                     competition_phase=competition_phase,
                                                     round_phase=round_phase)
@@ -165,9 +165,10 @@ def insert_games(season):
                         if (home_team_name or away_team_name) in relegation_teams:
                             game.competition_phase = 'relegation_playoff'
                         else:
-                            if cont < quarter_finals_limit:
+                            playoff_index = cont + bisect.bisect_left(previous_playoff, game_number)
+                            if playoff_index < quarter_finals_limit:
                                 game.round_phase = 'quarter_final'
-                            elif cont < semifinals_limit:
+                            elif playoff_index < semifinals_limit:
                                 game.round_phase = 'semifinal'
                             else:
                                 game.round_phase = 'final'
@@ -176,46 +177,55 @@ def insert_games(season):
                         game.save()
 
                         # Create the instances of Participant
-                        Participant.create_instances(raw_game=raw_game, game=game)
-                except Exception as e:
-                    print(e)
-                    logger.info("Game {} could not be inserted as it didn't exist or had some errors...".format(game_acbid))
+                        Participant.create_instances(game_record=game_record, game=game)
+                    except Exception as e:
+                        print(e)
+                        logger.info("Game {} could not be inserted as it didn't exist or had some errors...".format(game_acbid))
+    cache.save()
 
 
-def insert_games_copa(season):
+def previous_playoff_games(season, n_regular, pending):
     """
-    Extract and insert the information regarding the games of a season.
+    The playoff games of previous runs count for the rounds of the pending ones: the games inserted, but the ones of
+    the relegation playoff, and the blank pages, that are never inserted.
+
+    :param season: Season object.
+    :param n_regular: int, number of games of the regular season.
+    :param pending: list of the game files to insert.
+    :return: sorted list of the numbers of those games.
+    """
+    numbers = [game.game_acbid % 1000 for game in Game.select(Game.game_acbid).where(
+        (Game.season == season.season) & (Game.competition_phase == 'playoff'))]
+    inserted = {game.game_acbid for game in Game.select(Game.game_acbid).where(Game.season == season.season)}
+    pending = set(pending)
+    for file_name in list_pages(season.GAMES_PATH):
+        game_number = int(file_name.split("-")[0])
+        game_acbid = int(file_name.split("-")[1].split(".")[0])
+        if game_number > n_regular and file_name not in pending and game_acbid not in inserted:
+            content = read_content(os.path.join(season.GAMES_PATH, file_name))
+            if content is not None and is_blank_game(content):
+                numbers.append(game_number)
+    return sorted(numbers)
+
+
+def insert_cup_games(season, competition=CREY, file_names=None):
+    """
+    Extract and insert the information regarding the games of a cup, all of them in the same phase.
     :param season: Season object.
+    :param competition: Competition, see src/competition.py
+    :param file_names: list of the game files to insert, by default all of them.
     """
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
+    cache = parse_cache.open_cache(games_path(season, competition), GAMES_PARSER_VERSION)
     with db.atomic():
 
         # Games iformation
-        logger.info('Retrieving all data from games and storing it.')
-
-        n_regular = season.get_number_games_regular_season()
-
-        # Specific info for the playoffs
-        relegation_teams = season.get_relegation_teams()  # in some seasons there was a relegation playoff.
-        cont = 0
-        playoff_format = season.get_playoff_format()
-        try:
-            quarter_finals_limit = 4 * playoff_format[0]
-            try:
-                semifinals_limit = quarter_finals_limit + 2 * playoff_format[1]
-            except Exception as e:
-                # print(e)
-                pass
-        except Exception as e:
-            # print(e)
-            pass
+        logger.info('Retrieving all data from games of {} and storing it.'.format(competition.code))
 
         # For all games available
-        list_files=sorted(os.listdir(season.GAMES_COPA_PATH))
-        for file_name in list_files:
-            game_number = int(file_name.split("-")[0])
+        for file_name in list_pages(games_path(season, competition)) if file_names is None else file_names:
             game_acbid = int(file_name.split("-")[1].split(".")[0])
 
             # Check it was not in the database already (-u option)
@@ -225,18 +235,18 @@ def insert_games_copa(season):
             else:
                 continue
 
-            competition_phase = 'cup'
             try:
-                with open(os.path.join(season.GAMES_COPA_PATH, file_name), 'r', encoding='utf-8') as f:
-                    raw_game = f.read()
-                    game = Game.create_instance(raw_game=raw_game, game_acbid=game_acbid,
-                                                season=season,
-                                                competition_phase=competition_phase)
-                    Participant.create_instances(raw_game=raw_game, game=game)
+                raw_game = read_content(os.path.join(games_path(season, competition), file_name))
+                game_record = cache.parse(file_name, raw_game, lambda content: extract_game(content, game_acbid))
+                game = Game.create_instance(game_record=game_record, game_acbid=game_acbid,
+                                            season=season,
+                                            competition_phase=competition.phase)
+                Participant.create_instances(game_record=game_record, game=game)
             except Exception as e:
                 print(e)
                 logger.info(
                     "Game {} could not be inserted as it didn't exist or had some errors...".format(game_acbid))
+    cache.save()
 
 
 def update_games():
@@ -245,7 +255,6 @@ def update_games():
     """
     # Download actor's page.
     Actor.save_actors()
-    Actor.sanity_check()
 
     with db.atomic():
         try:
@@ -268,60 +277,12 @@ def update_events():
     Event._check_rosters()
 
 
-def insert_events(season):
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
-    year=season.season
-
-    logger.info('Retrieving all data from events and storing it.')
-    events_game_errors = {}
-    if year >= 2016:
-        for game_id_file in [f for f in os.listdir(season.EVENTS_PATH) if os.path.isfile(os.path.join(season.EVENTS_PATH, f))]:
-            with open('./data/{}/events/{}'.format(season.season,game_id_file), 'r', encoding='utf-8') as f:
-                game_event_acbid = os.path.splitext(game_id_file)[0]
-                game_acbid=game_event_acbid.split("-")[0]
-                events_game_acbid = game_event_acbid.split("-")[1]
-                content = f.read()
-                doc = pyquery.PyQuery(content)
-                playbyplay = doc('#playbyplay')
-                query_teams = Game.get(Game.game_acbid == game_acbid)
-                team_home_id = query_teams.team_home_id
-                team_away_id = query_teams.team_away_id
-
-                try:
-                    query = Event.select().where(Event.events_game_acbid == events_game_acbid)
-                    if not query:
-
-                        game_id = Game.get(Game.game_acbid == game_acbid).id
-                        query_actors_home = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (Participant.team == team_home_id))
-                        actors_home = dict()
-                        for q in query_actors_home:
-                            actors_home[q.display_name] = q.actor.id
-
-                        query_actors_away = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (Participant.team == team_away_id))
-                        actors_away = dict()
-                        for q in query_actors_away:
-                            actors_away[q.display_name] = q.actor.id
-
-                        events_with_errors=Event.scrap_and_insert(events_game_acbid, game_acbid, playbyplay, team_home_id, team_away_id, actors_home, actors_away)
-                        logger.info('Finish game {} with {} errors.'.format(game_acbid, events_with_errors))
-                        if events_with_errors>0:
-                            events_game_errors[game_acbid] = events_with_errors
-                    else:
-                        continue
-                except Exception as e:
-                    print(e, game_id_file)
-
-        logger.info('Game events with errors in year {}: {}.'.format(year,events_game_errors))
-
-    else:
-        pass
-
-
-def insert_events_copa(season):
+def insert_events(season, file_names=None, competition=LACB):
+    """
+    :param season: Season object.
+    :param file_names: list of the event files to insert, by default all of them.
+    :param competition: Competition, see src/competition.py
+    """
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
@@ -330,44 +291,46 @@ def insert_events_copa(season):
     logger.info('Retrieving all data from events and storing it.')
     events_game_errors = {}
     if year >= 2016:
-        for game_id_file in os.listdir(season.EVENTS_PATH_COPA):
-            with open('./data/{}/events/copa/{}'.format(season.season,game_id_file), 'r', encoding='utf-8') as f:
-                game_event_acbid = os.path.splitext(game_id_file)[0]
-                game_acbid=game_event_acbid.split("-")[0]
-                events_game_acbid = game_event_acbid.split("-")[1]
-                content = f.read()
-                doc = pyquery.PyQuery(content)
-                playbyplay = doc('#playbyplay')
+        cache = parse_cache.open_cache(events_path(season, competition), PBP_PARSER_VERSION)
+        for game_id_file in list_pages(events_path(season, competition)) if file_names is None else file_names:
+            game_event_acbid = os.path.splitext(game_id_file)[0]
+            game_acbid=game_event_acbid.split("-")[0]
+            events_game_acbid = game_event_acbid.split("-")[1]
+            try:
                 query_teams = Game.get(Game.game_acbid == game_acbid)
                 team_home_id = query_teams.team_home_id
                 team_away_id = query_teams.team_away_id
 
-                try:
-                    query = Event.select().where(Event.events_game_acbid == events_game_acbid)
-                    if not query:
-
-                        game_id = Game.get(Game.game_acbid == game_acbid).id
-                        query_actors_home = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (Participant.team == team_home_id))
-                        actors_home = dict()
-                        for q in query_actors_home:
-                            actors_home[q.display_name] = q.actor.id
-
-                        query_actors_away = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (Participant.team == team_away_id))
-                        actors_away = dict()
-                        for q in query_actors_away:
-                            actors_away[q.display_name] = q.actor.id
-
-                        events_with_errors=Event.scrap_and_insert(events_game_acbid, game_acbid, playbyplay, team_home_id, team_away_id, actors_home, actors_away)
-                        logger.info('Finish game {} with {} errors.'.format(game_acbid, events_with_errors))
-                        if events_with_errors>0:
-                            events_game_errors[game_acbid] = events_with_errors
-                    else:
-                        continue
-                except Exception as e:
-                    print(e, game_id_file)
+                query = Event.select().where(Event.events_game_acbid == events_game_acbid)
+                if not query:
+                    content = read_content(os.path.join(events_path(season, competition), game_id_file))
+                    if content is None:
+                        raise FileNotFoundError('The page was not saved')
+                    playbyplay = cache.parse(game_id_file, content, extract_pbp)
+
+                    game_id = Game.get(Game.game_acbid == game_acbid).id
+                    query_actors_home = Participant.select(Participant.actor, Participant.display_name).where(
+                        (Participant.game == game_id) & (Participant.actor.is_null(False)) & (Participant.team == team_home_id))
+                    actors_home = dict()
+                    for q in query_actors_home:
+                        actors_home[q.display_name] = q.actor.id
+
+                    query_actors_away = Participant.select(Participant.actor, Participant.display_name).where(
+                        (Participant.game == game_id) & (Participant.actor.is_null(False)) & (Participant.team == team_away_id))
+                    actors_away = dict()
+                    for q in query_actors_away:
+                        actors_away[q.display_name] = q.actor.id
+
+                    events_with_errors=Event.scrap_and_insert(events_game_acbid, game_acbid, playbyplay, team_home_id, team_away_id, actors_home, actors_away)
+                    logger.info('Finish game {} with {} errors.'.format(game_acbid, events_with_errors))
+                    if events_with_errors>0:
+                        events_game_errors[game_acbid] = events_with_errors
+                else:
+                    continue
+            except Exception as e:
+                print(e, game_id_file)
 
+        cache.save()
         logger.info('Game events with errors in year {}: {}.'.format(year,events_game_errors))
 
     else:
@@ -410,7 +373,12 @@ def insert_roster():
             Roster.create(**roster)
 
 
-def insert_shotchart(season):
+def insert_shotchart(season, file_names=None, competition=LACB):
+    """
+    :param season: Season object.
+    :param file_names: list of the shotchart files to insert, by default all of them.
+    :param competition: Competition, see src/competition.py
+    """
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
@@ -419,93 +387,167 @@ def insert_shotchart(season):
     logger.info('Retrieving all data from shotcharts and storing it.')
 
     if year >= 2016:
-        for game_id_file in [f for f in os.listdir(season.SHOTCHART_PATH) if os.path.isfile(os.path.join(season.SHOTCHART_PATH, f))]:
-            with open('./data/{}/shotchart/{}'.format(season.season,game_id_file), 'r', encoding='utf-8') as f:
-                game_shotchart_acbid = os.path.splitext(game_id_file)[0]
-                game_acbid=game_shotchart_acbid.split("-")[0]
-                shotchart_game_acbid = game_shotchart_acbid.split("-")[1]
-                content = f.read()
-                doc = pyquery.PyQuery(content)
-                shotchart_data = doc('#shotchart_data')
+        cache = parse_cache.open_cache(shotchart_path(season, competition), SHOTCHART_PARSER_VERSION)
+        for game_id_file in list_pages(shotchart_path(season, competition)) if file_names is None else file_names:
+            game_shotchart_acbid = os.path.splitext(game_id_file)[0]
+            game_acbid=game_shotchart_acbid.split("-")[0]
+            shotchart_game_acbid = game_shotchart_acbid.split("-")[1]
+            try:
                 query_teams = Game.get(Game.game_acbid == game_acbid)
                 team_home_id = query_teams.team_home_id
                 team_away_id = query_teams.team_away_id
 
-                try:
-                    query = Shotchart.select().where(Shotchart.shotchart_game_acbid == shotchart_game_acbid)
-                    if not query:
-
-                        game_id = Game.get(Game.game_acbid == game_acbid).id
-                        query_actors_home = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (
-                                        Participant.team == team_home_id))
-                        actors_home = dict()
-                        for q in query_actors_home:
-                            actors_home[q.display_name] = q.actor.id
-
-                        query_actors_away = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (
-                                        Participant.team == team_away_id))
-                        actors_away = dict()
-                        for q in query_actors_away:
-                            actors_away[q.display_name] = q.actor.id
-
-                        Shotchart.scrap_and_insert(shotchart_game_acbid, game_acbid, shotchart_data, team_home_id, team_away_id, actors_home, actors_away)
-                    else:
-                        continue
-                except Exception as e:
-                    print(e,game_id_file)
+                query = Shotchart.select().where(Shotchart.shotchart_game_acbid == shotchart_game_acbid)
+                if not query:
+                    content = read_content(os.path.join(shotchart_path(season, competition), game_id_file))
+                    if content is None:
+                        raise FileNotFoundError('The page was not saved')
+                    shots = cache.parse(game_id_file, content, extract_shots)
+
+                    game_id = Game.get(Game.game_acbid == game_acbid).id
+                    query_actors_home = Participant.select(Participant.actor, Participant.display_name).where(
+                        (Participant.game == game_id) & (Participant.actor.is_null(False)) & (
+                                    Participant.team == team_home_id))
+                    actors_home = dict()
+                    for q in query_actors_home:
+                        actors_home[q.display_name] = q.actor.id
+
+                    query_actors_away = Participant.select(Participant.actor, Participant.display_name).where(
+                        (Participant.game == game_id) & (Participant.actor.is_null(False)) & (
+                                    Participant.team == team_away_id))
+                    actors_away = dict()
+                    for q in query_actors_away:
+                        actors_away[q.display_name] = q.actor.id
+
+                    Shotchart.scrap_and_insert(shotchart_game_acbid, game_acbid, shots, team_home_id, team_away_id, actors_home, actors_away)
+                else:
+                    continue
+            except Exception as e:
+                print(e,game_id_file)
+        cache.save()
     else:
         pass
 
 
-def insert_shotchart_copa(season):
+def insert_season(season, competitions=(LACB,), workers=None):
+    """
+    Extract and insert the information of several competitions of a season. The games of all the competitions are
+    inserted before their events, which need the participants of the games.
+    :param season: Season object.
+    :param competitions: list of Competition
+    :param workers: int, number of processes that parse the games, see insert_games.
+    """
+    insert_teams(season)
+    for competition in competitions:
+        insert_games(season, competition=competition, workers=workers)
+    if season.season >= 2016:
+        for competition in competitions:
+            insert_events(season, competition=competition)
+        update_events()
+        insert_roster()
+        for competition in competitions:
+            insert_shotchart(season, competition=competition)
+
+
+def sync_season(season, driver_path, backend='selenium'):
+    """
+    Download and insert only the journeys not completely ingested by the previous syncs of the season, up to the
+    current one (see src/sync.py).
+    :param season: Season object.
+    """
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
-    year=season.season
+    state = SyncState(season)
+    first_journey, last_journey = state.pending_journeys(season.get_current_journey())
+    if first_journey > last_journey:
+        logger.info('Season {} is up to date (journey {}).'.format(season.season, state.last_journey))
+        return
+
+    logger.info('Syncing journeys {} to {} of season {}...'.format(first_journey, last_journey, season.season))
+    journeys = state.new_games(first_journey, last_journey)
+    game_ids = [game_acbid for _, journey_game_ids, _ in journeys for game_acbid in journey_game_ids]
+    game_events_ids = {}
+    for _, _, journey_game_events_ids in journeys:
+        game_events_ids.update(journey_game_events_ids)
+    Game.save_games(season, game_ids)
+    if game_events_ids:
+        Event.save_events(season, driver_path, backend=backend, fibalivestats_ids=game_events_ids)
+
+    insert_teams(season)
+    insert_games(season, [str(int(game_acbid) % 1000) + "-" + str(game_acbid) + '.html' for game_acbid in game_ids])
+    if game_events_ids:
+        fibalivestats_files = [str(game_acbid) + "-" + str(fls_id) + '.html' for fls_id, game_acbid in game_events_ids.items()]
+        insert_events(season, [f for f in fibalivestats_files if page_exists(os.path.join(season.EVENTS_PATH, f))])
+        update_events()
+        insert_shotchart(season, [f for f in fibalivestats_files if page_exists(os.path.join(season.SHOTCHART_PATH, f))])
+    update_games()
 
-    logger.info('Retrieving all data from shotcharts and storing it.')
+    state.advance(journeys, journey_ingested)
 
-    if year >= 2016:
-        for game_id_file in os.listdir(season.EVENTS_PATH_COPA):
-            with open('./data/{}/shotchart/copa/{}'.format(season.season,game_id_file), 'r', encoding='utf-8') as f:
-                game_shotchart_acbid = os.path.splitext(game_id_file)[0]
-                game_acbid=game_shotchart_acbid.split("-")[0]
-                shotchart_game_acbid = game_shotchart_acbid.split("-")[1]
-                content = f.read()
-                doc = pyquery.PyQuery(content)
-                shotchart_data = doc('#shotchart_data')
-                query_teams = Game.get(Game.game_acbid == game_acbid)
-                team_home_id = query_teams.team_home_id
-                team_away_id = query_teams.team_away_id
 
+def journey_ingested(game_ids, game_events_ids):
+    """
+    :param game_ids: list of the game acbids of a journey.
+    :param game_events_ids: dict fls_id -> game acbid of the journey.
+    :return: bool, all the games of the journey, and their play-by-play and shotchart, are in the database.
+    """
+    game_ids = set(int(game_acbid) for game_acbid in game_ids)
+    if Game.select().where(Game.game_acbid << list(game_ids)).count() < len(game_ids):
+        return False
+    if not game_events_ids:
+        return True
+
+    fls_ids = [int(fls_id) for fls_id in game_events_ids]
+    events = set(q.events_game_acbid for q in Event.select(Event.events_game_acbid).where(Event.events_game_acbid << fls_ids).distinct())
+    shotcharts = set(q.shotchart_game_acbid for q in Shotchart.select(Shotchart.shotchart_game_acbid).where(Shotchart.shotchart_game_acbid << fls_ids).distinct())
+    return len(events) == len(fls_ids) and len(shotcharts) == len(fls_ids)
+
+
+def repair_season(season, driver_path, backend='selenium', competition=LACB):
+    """
+    Download and insert only what is missing for a season, according to the gap detector (see src/gaps.py).
+    :param season: Season object.
+    :param competition: Competition, see src/competition.py
+    """
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    gaps = find_gaps(season, competition)
+    games = expected_games(season, competition)
+    if gaps['ficha'].download:
+        Game.save_games(season, gaps['ficha'].download, competition=competition)
+    fibalivestats_ids = expected_fibalivestats(season, competition)
+    missing_fibalivestats = set(gaps['pbp'].download) | set(gaps['shotchart'].download)
+    if missing_fibalivestats:
+        # The play-by-play and the shotchart of a game are captured together.
+        Event.save_events(season, driver_path, backend=backend, competition=competition,
+                          fibalivestats_ids={fls_id: fibalivestats_ids[fls_id] for fls_id in missing_fibalivestats})
+
+    gaps = find_gaps(season, competition)
+    if gaps['ficha'].insert:
+        insert_teams(season)
+        insert_games(season, [os.path.basename(games[game_acbid][0]) for game_acbid in gaps['ficha'].insert],
+                     competition=competition)
+
+    if gaps['participants'].insert:
+        with db.atomic():
+            for game in Game.select().where(Game.game_acbid << gaps['participants'].insert):
                 try:
-                    query = Shotchart.select().where(Shotchart.shotchart_game_acbid == shotchart_game_acbid)
-                    if not query:
-
-                        game_id = Game.get(Game.game_acbid == game_acbid).id
-                        query_actors_home = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (
-                                        Participant.team == team_home_id))
-                        actors_home = dict()
-                        for q in query_actors_home:
-                            actors_home[q.display_name] = q.actor.id
-
-                        query_actors_away = Participant.select(Participant.actor, Participant.display_name).where(
-                            (Participant.game == game_id) & (Participant.actor.is_null(False)) & (
-                                        Participant.team == team_away_id))
-                        actors_away = dict()
-                        for q in query_actors_away:
-                            actors_away[q.display_name] = q.actor.id
-
-                        Shotchart.scrap_and_insert(shotchart_game_acbid, game_acbid, shotchart_data, team_home_id, team_away_id, actors_home, actors_away)
-                    else:
-                        continue
+                    game_record = extract_game(read_content(games[game.game_acbid][0]), game.game_acbid)
+                    Participant.create_instances(game_record=game_record, game=game)
                 except Exception as e:
-                    print(e,game_id_file)
-    else:
-        pass
+                    print(e)
+                    logger.info("The participants of game {} could not be inserted...".format(game.game_acbid))
+
+    gaps = find_gaps(season, competition)  # the events need the games inserted above.
+    if gaps['pbp'].insert:
+        insert_events(season, [str(fibalivestats_ids[fls_id]) + "-" + str(fls_id) + '.html' for fls_id in gaps['pbp'].insert],
+                      competition=competition)
+        update_events()
+    if gaps['shotchart'].insert:
+        insert_shotchart(season, [str(fibalivestats_ids[fls_id]) + "-" + str(fls_id) + '.html' for fls_id in gaps['shotchart'].insert],
+                         competition=competition)
 
 
 def main(args):
@@ -528,6 +570,28 @@ def main(args):
         logger.error("USAGE: use --start YEAR and --end YEAR options to specify the seasons properly or -u for the current season only.")
         exit(-1)
 
+    competitions = get_competitions(args.competitions)
+
+    if args.retry_quarantined:  # Download again the pages quarantined in previous runs
+        logger.info('{} quarantined pages released'.format(get_manifest().clear_quarantine()))
+
+    if args.rawstore:  # Keep the raw pages compressed in the raw store
+        raw_store.enable()
+
+    if args.replay:  # Serve the downloads from the pages recorded in another working folder
+        replay.enable(args.replay, args.replay_latency, args.replay_jitter, args.replay_errors, args.replay_seed)
+        if args.backend in (None, 'http'):  # the livestats feed is not recorded, only the pages.
+            args.backend = 'replay'
+
+    if args.backend is None:  # the pages built from the livestats feed are not checked against the rendered ones yet.
+        args.backend = 'selenium'
+
+    if args.parsecache:  # Reuse the records parsed from the pages in previous inserts
+        parse_cache.enable()
+
+    if args.trim:  # Keep only the fragment of the play-by-play and shotchart pages
+        trim.enable(keep_full=args.keep_full)
+
     if args.r:  # Reset the database and create the schema
         reset_database()
         create_schema()
@@ -543,22 +607,13 @@ def main(args):
         for year in reversed(range(first_season, last_season + 1)):
             logger.info('Retrieving data for season '+str(year)+'...\n')
             season = Season(year)
-            download_games(season)
-            if year >= 2016:
-                download_events(season,driver_path)
-                download_shotchart(season,driver_path)
+            download_season(season, competitions, driver_path, args.backend)
 
     if args.i:  # Extract and insert the information in the database.
         for year in reversed(range(first_season, last_season + 1)):
             logger.info('Inserting data into database for season '+str(year)+'...\n')
             season = Season(year)
-            insert_teams(season)
-            insert_games(season)
-            if year >= 2016:
-                insert_events(season)
-                update_events()
-                insert_roster()
-                insert_shotchart(season)
+            insert_season(season, competitions, args.workers)
 
         # Update missing info about actors and participants.
         update_games()
@@ -570,15 +625,17 @@ def main(args):
         if not driver_path:
             driver_path = get_driver_path(driver_path)
 
-        #download_games(season)
-        #download_events(season, driver_path)
-        #download_shotchart(season,driver_path)
-        insert_teams(season)
-        insert_games(season)
-        insert_events(season)
-        # insert_roster()
-        update_events()
-        insert_shotchart(season)
+        sync_season(season, driver_path, args.backend)
+
+    if args.repair:  # Download and insert only the games missing in the seasons
+        driver_path = args.driver_path
+        if not driver_path:
+            driver_path = get_driver_path(driver_path)
+
+        for year in reversed(range(first_season, last_season + 1)):
+            logger.info('Repairing season '+str(year)+'...\n')
+            for competition in competitions:
+                repair_season(Season(year), driver_path, args.backend, competition)
         update_games()
 
     if args.a:  # Calculate advanced statistics
@@ -591,15 +648,18 @@ def main(args):
 
         season = Season(int(args.copa))
 
-        download_games_copa(season)
-        download_events_copa(season, driver_path)
-        download_shotchart_copa(season,driver_path)
-        insert_games_copa(season)
-        insert_events_copa(season)
+        download_season(season, [CREY], driver_path, args.backend)
+        insert_games(season, competition=CREY)
+        insert_events(season, competition=CREY)
         update_events()
-        insert_shotchart_copa(season)
+        insert_shotchart(season, competition=CREY)
         update_games()
 
+    if args.d or args.u or args.copa:
+        get_client().log_report()
+        if replay.get_server():
+            replay.get_server().log_report()
+
     from_year = 2016
     to_year = 2018
     streak_days_long = 100
@@ -651,5 +711,19 @@ if __name__ == "__main__":
     parser.add_argument("--end", action='store', dest="last_season", default=2018, type=int)
     parser.add_argument("--driverpath", action='store', dest="driver_path", default=False)
     parser.add_argument("--copa", action='store', dest="copa", default=False)
+    parser.add_argument("--workers", action='store', dest="workers", default=None, type=int) #Processes that parse the games with -i
+    parser.add_argument("--competitions", action='store', dest="competitions", default='LACB') #Competitions downloaded and inserted with -d and -i, e.g. LACB,CREY
+    parser.add_argument("--rawstore", action='store_true', default=False) #Compressed raw page store
+    parser.add_argument("--backend", action='store', dest="backend", default=None, choices=['http', 'replay', 'selenium']) #Fetch backend of the fibalivestats pages, selenium by default
+    parser.add_argument("--parsecache", action='store_true', default=False) #Cache the records parsed from the pages
+    parser.add_argument("--retry-quarantined", action='store_true', dest="retry_quarantined", default=False) #Download again the quarantined pages
+    parser.add_argument("--repair", action='store_true', default=False) #Fetch and insert only the gaps of the seasons
+    parser.add_argument("--trim", action='store_true', default=False) #Keep only the fragment of pbp/shotchart pages
+    parser.add_argument("--keep-full", action='store_true', dest="keep_full", default=False) #Keep also the full pages when trimming
+    parser.add_argument("--replay", action='store', dest="replay", default=False) #Working folder whose recorded pages are served
+    parser.add_argument("--replay-latency", action='store', dest="replay_latency", default=0.0, type=float) #Seconds added to each request
+    parser.add_argument("--replay-jitter", action='store', dest="replay_jitter", default=0.0, type=float) #Random seconds added or subtracted
+    parser.add_argument("--replay-errors", action='store', dest="replay_errors", default=0.0, type=float) #Fraction of requests answered with 503
+    parser.add_argument("--replay-seed", action='store', dest="replay_seed", default=None, type=int) #Seed of the latencies and errors
 
     main(parser.parse_args())
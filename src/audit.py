@@ -0,0 +1,163 @@
+"""
+Structural validation of the downloaded pages.
+
+A page is accepted when the fragment read by the parsers is present and not empty: the two statistics tables of a
+game, the actions of a play-by-play or the shots of a shotchart. The pages are not parsed, the markers are looked up
+in the raw bytes. The kind of a page is given by its folder (see key_from_path in src/raw_store.py).
+
+The pages are validated when they are downloaded, and the verdict is stored in the manifest. The audit of a folder
+is only needed for the pages saved before, and it remembers the files that passed by mtime, size and hash, so later
+audits only scan the files that are new or have changed since. A file with the same mtime and size is only hashed,
+to catch the pages rewritten in place.
+"""
+import os
+import re
+import hashlib
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from src.manifest import get_manifest
+from src.raw_store import key_from_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AUDIT_WORKERS = os.cpu_count() or 1
+# Below this number of files it is faster to scan them in the current process than to start the pool.
+PARALLEL_THRESHOLD = 64
+CHUNK_SIZE = 32
+
+NOT_FOUND_TITLE = b'404 Not Found'
+TITLE_REGEX = re.compile(rb'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+VALID = 'valid'
+BLANK = 'blank'
+NOT_FOUND = 'not found'
+
+# kind -> list of (marker, minimum number of occurrences)
+STRUCTURE = {
+    'games': [(b'<table class="estadisticas', 2)],
+    'events': [(b'id="playbyplay"', 1), (b'class="pbpa', 1)],
+    'shotchart': [(b'id="shotchart_data"', 1), (b'sc_shot', 1)],
+}
+# The pages of the cup (see src/competition.py) have the same structure.
+STRUCTURE['games_copa'] = STRUCTURE['games']
+STRUCTURE['events_copa'] = STRUCTURE['events']
+STRUCTURE['shotchart_copa'] = STRUCTURE['shotchart']
+
+# A playoff game might be blank if the series ends before the last game. It is kept, as it counts for the rounds.
+# The same pattern is used by src/ficha.py, on the text of the pages.
+BLANK_GAME_PATTERN = r'<title>ACB.COM</title>.*("estverdel"> <|<font style="font-size : 12pt;">0 \|)'
+BLANK_GAME_REGEX = re.compile(BLANK_GAME_PATTERN.encode('utf-8'), re.DOTALL)
+
+PageScan = namedtuple('PageScan', ['file_path', 'mtime', 'size', 'hash', 'verdict'])
+AuditResult = namedtuple('AuditResult', ['not_found', 'invalid', 'scanned', 'cached'])
+
+
+def page_kind(file_path):
+    """
+    :param file_path: String
+    :return: String, e.g. 'games' or 'events'
+    """
+    return key_from_path(file_path)[0]
+
+
+def page_title(data):
+    """
+    :param data: bytes
+    :return: bytes, the title of the page.
+    """
+    match = TITLE_REGEX.search(data)
+    return match.group(1).strip() if match else b''
+
+
+def check_page(kind, data):
+    """
+    :param kind: String
+    :param data: bytes or String, content of the page.
+    :return: String, VALID, BLANK, NOT_FOUND or the description of what is missing.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if page_title(data) == NOT_FOUND_TITLE:
+        return NOT_FOUND
+    if kind == 'games' and BLANK_GAME_REGEX.search(data):
+        return BLANK
+
+    for marker, occurrences in STRUCTURE.get(kind, []):
+        if data.count(marker) < occurrences:
+            return 'missing {}'.format(marker.decode('utf-8'))
+    return VALID
+
+
+def is_valid(verdict):
+    return verdict in (VALID, BLANK)
+
+
+def file_hash(file_path):
+    """
+    :param file_path: String
+    :return: String, sha1 of the content of the file.
+    """
+    with open(file_path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def scan_page(file_path):
+    """
+    Byte-level validation of a saved page.
+
+    :param file_path: String
+    :return: PageScan
+    """
+    stat = os.stat(file_path)
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    return PageScan(file_path, stat.st_mtime, stat.st_size, hashlib.sha1(data).hexdigest(),
+                    check_page(page_kind(file_path), data))
+
+
+def audit(directory, workers=AUDIT_WORKERS):
+    """
+    Validate the pages of a directory, only scanning the files that changed since they were validated.
+
+    :param directory: String
+    :param workers: int, number of processes.
+    :return: AuditResult with the file names of the 404 pages and of the pages without the expected structure.
+    """
+    manifest = get_manifest()
+    rule = 'structure'
+    validated = manifest.audited(rule)
+
+    pending = []
+    cached = 0
+    for file_name in sorted(os.listdir(directory)):
+        file_path = os.path.join(directory, file_name)
+        if not file_name.endswith('.html') or not os.path.isfile(file_path):
+            continue
+        stat = os.stat(file_path)
+        known = validated.get(file_path)
+        if known and known[0] == stat.st_mtime and known[1] == stat.st_size and known[2] == file_hash(file_path):
+            cached += 1
+        else:
+            pending.append(file_path)
+
+    if len(pending) < PARALLEL_THRESHOLD or workers <= 1:
+        scans = [scan_page(file_path) for file_path in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            scans = list(executor.map(scan_page, pending, chunksize=CHUNK_SIZE))
+
+    not_found, invalid, valid = [], [], []
+    for scan in scans:
+        if scan.verdict == NOT_FOUND:
+            not_found.append(os.path.basename(scan.file_path))
+        elif not is_valid(scan.verdict):
+            invalid.append(os.path.basename(scan.file_path))
+        else:
+            valid.append((scan.file_path, scan.mtime, scan.size, scan.hash))
+    manifest.record_audited(rule, valid)
+
+    logger.info('Audit of {}: {} files scanned, {} unchanged, {} not found, {} invalid'.format(
+        directory, len(scans), cached, len(not_found), len(invalid)))
+    return AuditResult(not_found, invalid, len(scans), cached)
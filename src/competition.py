@@ -0,0 +1,132 @@
+"""
+Competitions whose games are ingested, as job types of a single pipeline.
+
+A competition gives the code of its game pages (fichas/<code><acbid>.php) and of its journeys in historico.php, the
+phase of its games in the database (None for the league, whose phases are given by the number of the game) and the
+attributes of Season with its folders. The jobs of all the competitions of a season are downloaded together: the
+game pages by one download pool, while one driver pool captures the fibalivestats pages, alternating the games of
+the competitions.
+"""
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from src.season import BASE_URL
+from src.download import download_pages
+from src.driver_pool import DriverPool, DRIVER_POOL_SIZE, fibalivestats_targets
+from src.fibalivestats import PBP, SHOTCHART, get_backend
+from src.utils import get_current_season
+from src import trim
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Competition = namedtuple('Competition', ['code', 'phase', 'games_path', 'events_path', 'shotchart_path'])
+
+LACB = Competition('LACB', None, 'GAMES_PATH', 'EVENTS_PATH', 'SHOTCHART_PATH')
+CREY = Competition('CREY', 'cup', 'GAMES_COPA_PATH', 'EVENTS_PATH_COPA', 'SHOTCHART_PATH_COPA')
+COMPETITIONS = {competition.code: competition for competition in (LACB, CREY)}
+
+
+def get_competitions(codes):
+    """
+    :param codes: String, comma separated codes, e.g. 'LACB,CREY'
+    :return: list of Competition
+    """
+    try:
+        return [COMPETITIONS[code.strip().upper()] for code in codes.split(',') if code.strip()]
+    except KeyError as e:
+        raise ValueError('Unknown competition: {}'.format(e.args[0]))
+
+
+def games_path(season, competition):
+    return getattr(season, competition.games_path)
+
+
+def events_path(season, competition):
+    return getattr(season, competition.events_path)
+
+
+def shotchart_path(season, competition):
+    return getattr(season, competition.shotchart_path)
+
+
+def game_url(competition, game_acbid):
+    return BASE_URL + "/fichas/{}{}.php".format(competition.code, game_acbid)
+
+
+def game_file_name(game_acbid):
+    return str(int(game_acbid) % 1000) + "-" + str(game_acbid) + '.html'
+
+
+def game_ids(season, competition):
+    """
+    :param season: Season object.
+    :param competition: Competition
+    :return: list of game acbids of the competition, only the journeys already played for the current season.
+    """
+    if season.season == get_current_season():
+        return list(season.get_current_game_events_ids(competition.code).values())
+    return season.get_game_ids(competition.code)
+
+
+def fibalivestats_ids(season, competition):
+    """
+    :param season: Season object.
+    :param competition: Competition
+    :return: dict fls_id -> game acbid, empty for the seasons without play-by-play.
+    """
+    if season.season < 2016:
+        return {}
+    if season.season == get_current_season():
+        return season.get_current_game_events_ids(competition.code)
+    return season.get_game_events_ids(competition.code)
+
+
+def game_jobs(season, competition, game_ids_list=None):
+    """
+    :param season: Season object.
+    :param competition: Competition
+    :param game_ids_list: list of game acbids, by default all the games of the competition.
+    :return: list of (file, url)
+    """
+    if game_ids_list is None:
+        game_ids_list = game_ids(season, competition)
+    return [(os.path.join(games_path(season, competition), game_file_name(game_acbid)), game_url(competition, game_acbid))
+            for game_acbid in game_ids_list]
+
+
+def download_season(season, competitions, driver_path, backend='selenium', pool_size=DRIVER_POOL_SIZE):
+    """
+    Download the games, play-by-play and shotcharts of several competitions of a season in a single pass. The game
+    pages are downloaded while the drivers capture the fibalivestats pages.
+
+    :param season: Season object.
+    :param competitions: list of Competition
+    :param driver_path: String
+    :param backend: String, 'selenium', 'http' to build the pages without browser when possible, or 'replay'
+    :param pool_size: int, number of drivers.
+    """
+    jobs = []
+    groups = []
+    for competition in competitions:
+        jobs += game_jobs(season, competition)
+        ids = fibalivestats_ids(season, competition)
+        if ids:
+            groups.append((list(ids.items()), fibalivestats_targets(events_path(season, competition),
+                                                                    shotchart_path(season, competition))))
+
+    logger.info('Downloading {} games and {} fibalivestats games of season {} ({})...'.format(
+        len(jobs), sum(len(group_jobs) for group_jobs, _ in groups), season.season,
+        ', '.join(competition.code for competition in competitions)))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        games = executor.submit(download_pages, jobs)
+        if groups:
+            DriverPool(driver_path, size=pool_size, backend=get_backend(backend)).run_groups(groups)
+        downloaded = games.result()
+    logger.info('Download finished! (new {} games)\n'.format(downloaded))
+
+    if trim.is_enabled() and groups:  # pages saved before trimming was enabled
+        for competition in competitions:
+            trim.trim_directory(events_path(season, competition), PBP)
+            trim.trim_directory(shotchart_path(season, competition), SHOTCHART)
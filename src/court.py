@@ -0,0 +1,162 @@
+"""
+Court geometry of the shotcharts of fibalivestats.
+
+Each shot of a shotchart page is a span whose style places it on the picture of the whole court, in percentages from
+the bottom-left corner, and whose class gives the colour of the team (white for the home team), the result and the
+period. extract_shots() reads all the spans of a page in one pass into a ShotBatch of arrays, and court_geometry()
+computes with array operations the position of every shot on a half court attacked from the left, in percentages
+and in metres, and its distance to the basket.
+
+The functions only take arrays, so they can be used both when the shotcharts are inserted and to compute new
+geometry columns from the positions already stored.
+"""
+from collections import namedtuple
+import numpy as np
+import lxml.html
+from lxml import etree
+
+COURT_LENGTH = 28.0  # metres
+COURT_WIDTH = 15.0
+BASKET_LEFT = 1.575  # metres from the baseline
+BASKET_BOTTOM = 7.5
+
+PARSER_VERSION = 1  # to be increased when the records change, see src/parse_cache.py
+
+PERIODS = {'sc_per1': 1, 'sc_per2': 2, 'sc_per3': 3, 'sc_per4': 4, 'sc_perot': 'OT'}
+
+ShotBatch = namedtuple('ShotBatch', ['colour', 'scored', 'period', 'team', 'bottom_px', 'left_px', 'jersey', 'name',
+                                     'shot_txt'])
+"""
+:param colour: list of String, 'white' (home team) or 'black' (away team).
+:param scored: list of int, 1 if the shot was made, 0 if missed, None if unknown.
+:param period: list, 1 to 4 or 'OT'
+:param team: list of String, the class of the team, 'sc_tn1' or 'sc_tn2'.
+:param bottom_px: numpy array, percentage of the height of the court.
+:param left_px: numpy array, percentage of the length of the court.
+:param jersey: list of String
+:param name: list of String, display name of the player.
+:param shot_txt: list of String, e.g. '2PT bandeja'
+"""
+
+Geometry = namedtuple('Geometry', ['left_px_adjust', 'bottom_px_adjust', 'left_m_adjust', 'bottom_m_adjust',
+                                   'distance'])
+
+SPANS = etree.XPath("//*[@id='shotchart_data']/descendant-or-self::span")
+
+
+def extract_shots(content):
+    """
+    Read the shots of a shotchart page. A span without class keeps the colour and the team of the previous one, and a
+    span without title its player and shot.
+
+    :param content: String, a shotchart page.
+    :return: ShotBatch
+    """
+    columns = {field: [] for field in ShotBatch._fields}
+    colour = team = jersey = display_name = shot_txt = None
+    for span in SPANS(lxml.html.fromstring(content)):
+        scored = period = None
+        if span.get('class'):
+            classes = span.get('class').split(" ")
+            colour, result = classes[1].split("_")[:2] if '_' in classes[1] else (classes[1], None)
+            scored = 1 if result == 'made' else 0 if result == 'missed' else None
+            period = PERIODS.get(classes[2], classes[2])
+            team = classes[4]
+
+        if not span.get('style'):
+            continue
+        style = span.get('style').split(" ")
+        bottom_px = float(style[1].split("%")[0])
+        left_px = float(style[3].split("%")[0])
+
+        if span.get('title'):
+            title = span.get('title').split(",")
+            if title[0] == '':
+                title.remove(title[0])
+            jersey = title[0].strip()
+            display_name = title[1].strip()
+            shot_txt = title[2].strip()
+
+        for field, value in zip(ShotBatch._fields, (colour, scored, period, team, bottom_px, left_px, jersey,
+                                                    display_name, shot_txt)):
+            columns[field].append(value)
+
+    columns['bottom_px'] = np.array(columns['bottom_px'], dtype=float)
+    columns['left_px'] = np.array(columns['left_px'], dtype=float)
+    return ShotBatch(**columns)
+
+
+def home_attacks_left(left_px, team):
+    """
+    The side attacked by each team in the first half is given by the first shot of the game.
+
+    :param left_px: numpy array
+    :param team: list of String
+    :return: bool
+    """
+    return (left_px[0] < 50.0) == (team[0] == 'sc_tn1')
+
+
+def normalise(left_px, bottom_px, is_white, first_half, home_attack_left):
+    """
+    Positions of the shots as if every team attacked the left basket. The sides are swapped at half time.
+
+    :param left_px: numpy array
+    :param bottom_px: numpy array
+    :param is_white: numpy array of bool, the shot is of the home team.
+    :param first_half: numpy array of bool
+    :param home_attack_left: bool, the home team attacks the left basket in the first half.
+    :return: (left_px_adjust, bottom_px_adjust)
+    """
+    flip = (is_white != home_attack_left) == first_half
+    return np.where(flip, 100.0 - left_px, left_px), np.where(flip, 100.0 - bottom_px, bottom_px)
+
+
+def fix_two_pointers(left_px_adjust, bottom_px_adjust, is_two):
+    """
+    acb places some two pointers on the wrong half of the court: they are moved to the other one.
+
+    :param left_px_adjust: numpy array, the positions given by normalise().
+    :param bottom_px_adjust: numpy array
+    :param is_two: numpy array of bool, the shot is a two pointer.
+    :return: (left_px_adjust, bottom_px_adjust)
+    """
+    wrong = is_two & (left_px_adjust > 50.0)
+    return (np.where(wrong, 100.0 - left_px_adjust, left_px_adjust),
+            np.where(wrong, 100.0 - bottom_px_adjust, bottom_px_adjust))
+
+
+def to_metres(left_px_adjust, bottom_px_adjust):
+    """
+    :return: (left_m_adjust, bottom_m_adjust)
+    """
+    return left_px_adjust * COURT_LENGTH / 100, bottom_px_adjust * COURT_WIDTH / 100
+
+
+def distance_to_basket(left_m, bottom_m):
+    return np.hypot(left_m - BASKET_LEFT, bottom_m - BASKET_BOTTOM)
+
+
+def court_geometry(batch, is_two=None):
+    """
+    :param batch: ShotBatch
+    :param is_two: numpy array of bool, the shots that are two pointers. If given they are kept in the half court of
+    the basket they attack.
+    :return: Geometry, with a numpy array for each column.
+    """
+    if not len(batch.left_px):
+        empty = np.empty(0)
+        return Geometry(empty, empty, empty, empty, empty)
+
+    colour = np.array(batch.colour)
+    if not np.all((colour == 'white') | (colour == 'black')):
+        raise ValueError('Unknown team colours in the shotchart: {}'.format(sorted(set(batch.colour))))
+    first_half = np.array([period in (1, 2) for period in batch.period])
+
+    left_px_adjust, bottom_px_adjust = normalise(batch.left_px, batch.bottom_px, colour == 'white', first_half,
+                                                 home_attacks_left(batch.left_px, batch.team))
+    if is_two is not None:
+        left_px_adjust, bottom_px_adjust = fix_two_pointers(left_px_adjust, bottom_px_adjust, is_two)
+    left_m_adjust, bottom_m_adjust = to_metres(left_px_adjust, bottom_px_adjust)
+    return Geometry(left_px_adjust, bottom_px_adjust, left_m_adjust, bottom_m_adjust,
+                    distance_to_basket(left_m_adjust, bottom_m_adjust))
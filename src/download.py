@@ -1,47 +1,234 @@
-import requests
 import os
+import json
 import logging
-from pyquery import PyQuery as pq
-from src.utils import create_driver
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from src.fibalivestats import PBP, SHOTCHART, PAGE_URLS
+from src import raw_store
+from src.manifest import get_manifest
+from src.http_client import get_client, wire_bytes
+from src.throttle import MAX_LIMIT
+from src.audit import audit, check_page, is_valid, page_kind
+from tools.exceptions import DownloadException, InvalidPageException
 import os
 import time
+import random
 from src.utils import logger
 
+DOWNLOAD_CONCURRENCY = MAX_LIMIT  # the adaptive controller limits the requests to each host.
+CHUNK_SIZE = 64 * 1024
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_STATUS = (429, 500, 502, 503, 504)
+REFETCH_ATTEMPTS = 3
 
-def get_page(url, cookies=None):
+
+def with_retries(fetch, url, *args, **kwargs):
     """
-    Get data from URL.
+    Call fetch(url, ...) retrying with exponential backoff (and some jitter) when it fails.
 
+    :param fetch: function, it must raise an exception when the download fails.
     :param url: String
+    :return: (result of fetch, number of attempts)
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return fetch(url, *args, **kwargs), attempt
+        except InvalidPageException:  # the server answered, asking again would not change the page.
+            raise
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS:
+                raise DownloadException('{} failed after {} attempts: {}'.format(url, attempt, e))
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.warning('Attempt {} to download {} failed ({}). Retrying in {:.1f}s...'.format(attempt, url, e, delay))
+            time.sleep(delay)
+
+
+def _request(url, cookies=None, headers=None):
+    response = get_client().get(url, cookies=cookies, headers=headers)
+    if response.status_code in RETRY_STATUS:
+        raise DownloadException('HTTP {}'.format(response.status_code))
+    return response
+
+
+def get_page(url, cookies=None, file_path=None, revalidate=True):
+    """
+    Get data from URL, retrying with backoff on network errors. Every download is recorded in the manifest.
+
+    When a file_path is given the new page is saved in it. If revalidate is set the request is conditional: the
+    validators (ETag/Last-Modified) stored next to the file are sent, and if the server answers 304 Not Modified the
+    local copy is returned without transferring the page again.
+
+    :param url: String
+    :param file_path: String
+    :param revalidate: bool
     :return: content of the page
     """
+    revalidate = revalidate and file_path
+    headers = {}
+    meta = load_cache_meta(file_path) if revalidate and page_exists(file_path) else None
+    if meta and meta.get('url') != url:  # the file was saved from another page, e.g. the next journey.
+        meta = None
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
 
     try:
-        if cookies:
-            content = requests.request("GET", url, cookies=cookies).text
-        else:
-            content = requests.request("GET", url).text
+        response, attempts = with_retries(_request, url, cookies=cookies, headers=headers)
+    except DownloadException as e:
+        logger.error("Fail to download url: {}".format(url))
+        logger.error("Error: {}".format(e))
+        get_manifest().record_failure(url, file_path, e, attempts=MAX_ATTEMPTS)
+        raise
 
+    if meta and response.status_code == 304:
+        logger.debug("Not modified: {}".format(url))
+        return read_content(file_path)
+
+    content = response.text
+    if not file_path:
+        get_manifest().record_success(url, file_path, content, response.status_code, attempts)
+        return content
+
+    verdict = check_page(page_kind(file_path), content)
+    if not is_valid(verdict):
+        logger.error("Invalid page {} ({}), it is not saved".format(url, verdict))
+        get_manifest().record_invalid(url, file_path, content, verdict, attempts)
         return content
+
+    save_content(file_path, content)
+    if revalidate:
+        save_cache_meta(file_path, url, response.headers)
+    get_manifest().record_success(url, file_path, content, response.status_code, attempts, verdict)
+    return content
+
+
+def get_file(url):
+    """
+    Get a binary file (e.g. a photo) from URL, retrying with backoff on network errors.
+
+    :param url: String
+    :return: bytes
+    """
+    try:
+        response, attempts = with_retries(_request, url)
+        response.raise_for_status()
     except Exception as e:
-        logger.error("Fail to download url: {}".format(url))
-        logger.error("Error: {}".format(e), exc_info=True)
-        exit(-1)
+        get_manifest().record_failure(url, None, e, attempts=MAX_ATTEMPTS)
+        raise
+    get_manifest().record_success(url, None, response.content, response.status_code, attempts)
+    return response.content
+
+
+def cache_meta_path(file_path):
+    """
+    Path of the file with the HTTP validators of a saved page.
+
+    :param file_path: String
+    :return: String
+    """
+    return file_path + '.meta'
+
+
+def load_cache_meta(file_path):
+    """
+    Load the HTTP validators stored for a saved page.
+
+    :param file_path: String
+    :return: dict or None if there are not validators.
+    """
+    try:
+        with open(cache_meta_path(file_path), 'r', encoding="utf-8") as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return None
+
+
+def save_cache_meta(file_path, url, headers):
+    """
+    Store the HTTP validators of a page next to the saved file.
+
+    :param file_path: String
+    :param url: String
+    :param headers: response headers
+    """
+    meta = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+    if not meta['etag'] and not meta['last_modified']:
+        if os.path.isfile(cache_meta_path(file_path)):
+            os.remove(cache_meta_path(file_path))
+        return
+    with open(cache_meta_path(file_path), 'w', encoding="utf-8") as file:
+        json.dump(meta, file)
 
 
 def save_content(file_path, content):
     """
-    Saves the content to a file in the path provided.
+    Saves the content to a file in the path provided, or to the raw store when it is enabled.
 
     :param file_path: String
     :param content: String
     :return: content of the page
     """
+    store = raw_store.get_store()
+    if store is not None:
+        store.put(raw_store.key_from_path(file_path), content)
+        return content
+
     with open(file_path, 'w', encoding="utf-8") as file:
         file.write(content)
         return content
 
 
+def read_content(file_path):
+    """
+    Reads a saved page, either from its file or from the raw store.
+
+    :param file_path: String
+    :return: content of the page, or None if it has not been saved.
+    """
+    if os.path.isfile(file_path):
+        with open(file_path, 'r', encoding="utf-8") as file:
+            return file.read()
+
+    store = raw_store.get_store()
+    if store is not None:
+        return store.get(raw_store.key_from_path(file_path))
+    return None
+
+
+def page_exists(file_path):
+    """
+    Checks if a page has been saved, either as a file or in the raw store.
+
+    :param file_path: String
+    :return: bool
+    """
+    if os.path.isfile(file_path):
+        return True
+
+    store = raw_store.get_store()
+    return store is not None and store.blob(raw_store.key_from_path(file_path)) is not None
+
+
+def list_pages(directory):
+    """
+    Lists the names of the pages saved in a directory, either as files or in the raw store.
+
+    :param directory: String
+    :return: sorted list of file names.
+    """
+    names = set(f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)) and f.endswith('.html'))
+
+    store = raw_store.get_store()
+    if store is not None:
+        kind, season = raw_store.key_from_directory(directory)
+        names.update(acbid + '.html' for acbid in store.acbids(kind, season))
+    return sorted(names)
+
+
 def open_or_download(file_path, url, cookies=None):
     """
     Open or download a file.
@@ -50,29 +237,177 @@ def open_or_download(file_path, url, cookies=None):
     :param url: String
     :return: content of the file.
     """
-    if os.path.isfile(file_path):
-        with open(file_path, 'r', encoding="utf-8") as file:
-            return file.read()
+    content = read_content(file_path)
+    if content is not None:
+        return content
     else:
-        html_file = get_page(url, cookies=cookies)
-        return save_content(file_path, html_file)
+        return get_page(url, cookies=cookies, file_path=file_path, revalidate=False)
 
 
 def download(file_path, url):
     """
-    Open or download a file.
+    Download a file again, unless the server confirms that the local copy is still up to date.
 
     :param file_path: String
     :param url: String
     :return: content of the file.
     """
-    if os.path.isfile(file_path):
-        os.remove(file_path)
-        html_file = get_page(url)
-        return save_content(file_path, html_file)
+    return get_page(url, file_path=file_path)
+
+
+def stream_to_file(file_path, url, cookies=None):
+    """
+    Download a page writing it to disk chunk by chunk.
+
+    The content is written to a temporary file which is moved into place once complete and validated (see
+    src/audit.py), so an interrupted download or an invalid page never replaces the file.
+
+    :param file_path: String
+    :param url: String
+    :return: (content of the page, verdict of the validation)
+    """
+    tmp_path = file_path + '.part'
+    client = get_client()
+    with client.get(url, cookies=cookies, stream=True) as response:
+        if response.status_code in RETRY_STATUS:
+            raise DownloadException('HTTP {}'.format(response.status_code))
+        if response.encoding is None:
+            response.encoding = response.apparent_encoding
+        chunks = response.iter_content(CHUNK_SIZE, decode_unicode=True)
+
+        store = raw_store.get_store()
+        if store is not None:  # blobs are written at once, once the page is complete.
+            content = ''.join(chunks)
+        else:
+            parts = []
+            try:
+                with open(tmp_path, 'w', encoding="utf-8") as file:
+                    for chunk in chunks:
+                        file.write(chunk)
+                        parts.append(chunk)
+            except BaseException:  # e.g. a broken connection: the partial page is not kept.
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            content = ''.join(parts)
+        n_bytes = len(content.encode('utf-8'))
+        client.add_bytes(url, n_bytes, wire_bytes(response, n_bytes))
+
+    verdict = check_page(page_kind(file_path), content)
+    if not is_valid(verdict):
+        if store is None:
+            os.remove(tmp_path)
+        raise InvalidPageException(verdict, content)
+
+    if store is not None:
+        save_content(file_path, content)
     else:
-        html_file = get_page(url)
-        return save_content(file_path, html_file)
+        os.replace(tmp_path, file_path)
+    return content, verdict
+
+
+async def _download_pages(jobs, concurrency, cookies):
+    """
+    Download the jobs with at most `concurrency` requests in flight. The requests to each host are further limited
+    by the adaptive controller of the HTTP client (see src/throttle.py).
+
+    :param jobs: list of (file_path, url)
+    :param concurrency: int
+    :return: number of pages downloaded
+    """
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency)
+    manifest = get_manifest()
+
+    def fetch_and_record(file_path, url):
+        try:
+            (content, verdict), attempts = with_retries(stream_to_file, url, file_path, cookies)
+        except InvalidPageException as e:
+            manifest.record_invalid(url, file_path, e.content, e.verdict)
+            raise
+        except DownloadException as e:
+            manifest.record_failure(url, file_path, e, attempts=MAX_ATTEMPTS)
+            raise
+        manifest.record_success(url, file_path, content, attempts=attempts, verdict=verdict)
+
+    async def fetch(file_path, url):
+        async with limit:
+            try:
+                await loop.run_in_executor(executor, fetch_and_record, file_path, url)
+                return 1
+            except Exception as e:
+                logger.error("Fail to download url: {}".format(url))
+                logger.error("Error: {}".format(e))
+                return 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = await asyncio.gather(*[fetch(file_path, url) for file_path, url in jobs])
+    return sum(results)
+
+
+def saved_pages(jobs):
+    """
+    Pages of the jobs that are already saved and valid, according to the manifest.
+
+    Pages saved before the manifest existed are looked up once on disk, validated and recorded, so later runs do not
+    need to check the files again.
+
+    :param jobs: list of (file_path, url)
+    :return: dict file_path -> verdict
+    """
+    manifest = get_manifest()
+    saved = manifest.verdicts(file_path for file_path, _ in jobs)
+
+    for file_path, url in jobs:
+        if file_path in saved:
+            continue
+        content = read_content(file_path)
+        verdict = check_page(page_kind(file_path), content) if content is not None else None
+        if verdict is not None and is_valid(verdict):
+            manifest.record_success(url, file_path, content, attempts=0, verdict=verdict)
+            saved[file_path] = verdict
+    return saved
+
+
+def pending_jobs(jobs):
+    """
+    Jobs whose page has not been downloaded yet, or was invalid. See saved_pages. The quarantined pages are left out
+    until the quarantine is cleared (see Manifest.clear_quarantine).
+
+    :param jobs: list of (file_path, url)
+    :return: list of (file_path, url)
+    """
+    manifest = get_manifest()
+    manifest.expect(jobs)
+    saved = saved_pages(jobs)
+    quarantined = manifest.quarantined()
+    pending = [(file_path, url) for file_path, url in jobs if file_path not in saved]
+    skipped = [url for _, url in pending if url in quarantined]
+    if skipped:
+        logger.info('{} quarantined pages are skipped'.format(len(skipped)))
+    return [(file_path, url) for file_path, url in pending if url not in quarantined]
+
+
+def download_pages(jobs, concurrency=DOWNLOAD_CONCURRENCY, cookies=None):
+    """
+    Download a batch of pages concurrently. Pages already downloaded are skipped, so an interrupted run resumes
+    where it stopped.
+
+    :param jobs: list of (file_path, url)
+    :param concurrency: int
+    :return: number of pages downloaded
+    """
+    pending = pending_jobs(jobs)
+    if not pending:
+        logger.info('All {} pages were already downloaded'.format(len(jobs)))
+        return 0
+
+    start = time.time()
+    downloaded = asyncio.run(_download_pages(pending, concurrency, cookies))
+    elapsed = time.time() - start
+    logger.info('Downloaded {}/{} pages in {:.1f}s ({:.2f} pages/s)'.format(
+        downloaded, len(pending), elapsed, downloaded / elapsed if elapsed else 0.0))
+    return downloaded
 
 
 def validate_dir(folder):
@@ -96,21 +431,10 @@ def sanity_check(directory_name, logging_level=logging.INFO):
     logging.basicConfig(level=logging_level)
     logger = logging.getLogger(__name__)
 
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in os.listdir(directory):
-        with open(os.path.join(directory, file), encoding="utf-8") as f:
-            try:
-                raw_html = f.read()
-
-                doc = pq(raw_html)
-                if doc("title").text() == '404 Not Found':
-                    errors.append(os.fsdecode(file))
-            except:
-                pass
+    errors = audit(directory_name).not_found
 
     if errors: raise Exception('There are {} errors in the downloads!'.format(len(errors)))
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
+    logger.info('Sanity check of {} correctly finished!\n'.format(directory_name))
     return errors
 
 
@@ -124,74 +448,72 @@ def sanity_check_game(directory_name, logging_level=logging.INFO):
     logging.basicConfig(level=logging_level)
     logger = logging.getLogger(__name__)
 
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]:
-        with open(os.path.join(directory, file), encoding="utf-8") as f:
-            raw_html = f.read()
-
-            doc = pq(raw_html)
-            if doc("title").text() == '404 Not Found':
-                errors.append(os.fsdecode(file))
-
-            filename=file.decode("utf-8")
-            statinfo2=os.stat(directory_name+filename)
-            f.close()
-            if statinfo2.st_size < 20000:
-                logger.info('The game ' + filename +' data is not correct. Missing data. Deleting game html...')
-                try:
-                    os.remove(directory_name+filename)
-                    logger.info('game ' + filename + ' deleted...')
-                    continue
-
-                except:
-                    logger.info('game ' + filename + ' cannot be deleted...')
+    result = audit(directory_name)
+    errors = result.not_found
+
+    for filename in result.not_found + result.invalid:
+        logger.info('The game ' + filename +' data is not correct. Missing data. Deleting game html...')
+        try:
+            os.remove(os.path.join(directory_name, filename))
+            logger.info('game ' + filename + ' deleted...')
+        except:
+            logger.info('game ' + filename + ' cannot be deleted...')
 
     if errors:
         raise Exception('There were {} errors in the downloads!'.format(len(errors)))
 
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
+    logger.info('Sanity check of {} correctly finished!\n'.format(directory_name))
     return errors
 
 
-def sanity_check_game_copa(directory_name, logging_level=logging.INFO):
+def refetch_invalid_pages(driver_path, directory_name, kind, max_attempts=REFETCH_ATTEMPTS, logging_level=logging.INFO):
     """
-    Checks if thes file within a directoy have been correctly downloaded
+    Capture again the fibalivestats pages of a directory that do not pass the audit, with a single pool of drivers.
+    The pages captured since they are validated on write always pass it, so this is only needed for older archives.
 
+    Each page is captured at most max_attempts times. The pages that are still invalid after that are quarantined in
+    the manifest and left out of the directory, so a broken game never blocks the run.
+
+    :param driver_path: String
     :param directory_name: String
+    :param kind: String, PBP or SHOTCHART
+    :param max_attempts: int
     :param logging_level: logging object
+    :return: list with the file names of the quarantined pages.
     """
+    from src.driver_pool import DriverPool
     logging.basicConfig(level=logging_level)
     logger = logging.getLogger(__name__)
 
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in os.listdir(directory):
-        with open(os.path.join(directory, file), encoding="utf-8") as f:
-            raw_html = f.read()
-
-            doc = pq(raw_html)
-            if doc("title").text() == '404 Not Found':
-                errors.append(os.fsdecode(file))
-
-            filename=file.decode("utf-8")
-            statinfo2=os.stat(directory_name+filename)
-            f.close()
-            if statinfo2.st_size < 20000:
-                logger.info('The game ' + filename +' data is not correct. Missing data. Deleting game html...')
-                try:
-                    os.remove(directory_name+filename)
-                    logger.info('game ' + filename + ' deleted...')
-                    continue
-
-                except:
-                    logger.info('game ' + filename + ' cannot be deleted...')
-
-    if errors:
-        raise Exception('There were {} errors in the downloads!'.format(len(errors)))
-
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
-    return errors
+    result = audit(directory_name)
+    invalid = result.not_found + result.invalid
+    if not invalid:
+        logger.info('Sanity check of {} correctly finished!\n'.format(directory_name))
+        return []
+
+    jobs = []
+    for filename in invalid:
+        logger.info(filename + ' was not properly downladed. Missing data.')
+        os.remove(os.path.join(directory_name, filename))  # the pool only captures the missing pages.
+        game_acbid, fls_id = os.path.splitext(filename)[0].split('-', 1)
+        jobs.append((fls_id, game_acbid))
+
+    pool = DriverPool(driver_path, max_attempts=max_attempts)
+    failed = pool.run(jobs, [(kind, directory_name)])
+
+    manifest = get_manifest()
+    quarantined = []
+    for fls_id, game_acbid in failed:
+        filename = str(game_acbid) + "-" + str(fls_id) + ".html"
+        manifest.quarantine(PAGE_URLS[kind].format(fls_id), os.path.join(directory_name, filename),
+                            'invalid after {} attempts'.format(max_attempts))
+        quarantined.append(filename)
+
+    logger.info('Sanity check of {} finished: {} invalid pages, {} captured again, {} quarantined\n'.format(
+        directory_name, len(invalid), len(invalid) - len(quarantined), len(quarantined)))
+    if quarantined:
+        logger.warning('Quarantined pages: {}'.format(', '.join(sorted(quarantined))))
+    return quarantined
 
 
 def sanity_check_events(driver_path,directory_name, logging_level=logging.INFO):
@@ -201,58 +523,8 @@ def sanity_check_events(driver_path,directory_name, logging_level=logging.INFO):
     :param directory_name: String
     :param logging_level: logging object
     """
-    logging.basicConfig(level=logging_level)
-    logger = logging.getLogger(__name__)
+    return refetch_invalid_pages(driver_path, directory_name, PBP, logging_level=logging_level)
 
-    driver = create_driver(driver_path)
-
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]:
-        with open(os.path.join(directory, file), encoding="utf-8") as f:
-            raw_html = f.read()
-
-            doc = pq(raw_html)
-            if doc("title").text() == '404 Not Found':
-                errors.append(os.fsdecode(file))
-
-            filename=file.decode("utf-8")
-            statinfo=os.stat(directory_name+filename)
-
-            #we assume that the event files with a size lower than 100kB need to be revised and download again.
-            if statinfo.st_size <100000:
-                logger.info(filename+' was not properly downladed. Missing data.')
-                game_event_id = os.path.splitext(filename)[0]
-                event_id=game_event_id.split("-")[1]
-                eventURL = "http://www.fibalivestats.com/u/ACBS/{}/pbp.html".format(event_id)
-                driver.get(eventURL)
-                html = driver.page_source
-                time.sleep(1)
-                save_content(directory_name+filename, html)
-                errors.append(filename)
-
-            statinfo2=os.stat(directory_name+filename)
-            f.close()
-            if statinfo2.st_size < 250000:
-                logger.info('The game-event ' + filename +' data is not correct. Missing data. Deleting game-event...')
-                try:
-                    os.remove(directory_name+filename)
-                    logger.info('game-event ' + filename + ' deleted...')
-                    continue
-
-                except:
-                    logger.info('game-event ' + filename + ' cannot be deleted...')
-                    continue
-
-    #recursive call to sanity_check to check if there are more errors with the html
-    if errors:
-        logger.info('There were {} errors in the downloads!'.format(len(errors)))
-        sanity_check_events(driver_path,directory_name, logging_level=logging.INFO)
-
-    driver.close()
-    driver.quit()
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
-    return errors
 
 def sanity_check_shotchart(driver_path,directory_name, logging_level=logging.INFO):
     """
@@ -261,115 +533,4 @@ def sanity_check_shotchart(driver_path,directory_name, logging_level=logging.INF
     :param directory_name: String
     :param logging_level: logging object
     """
-    logging.basicConfig(level=logging_level)
-    logger = logging.getLogger(__name__)
-
-    driver = create_driver(driver_path)
-
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]:
-        with open(os.path.join(directory, file), encoding="utf-8") as f:
-            raw_html = f.read()
-
-            doc = pq(raw_html)
-            if doc("title").text() == '404 Not Found':
-                errors.append(os.fsdecode(file))
-
-            filename=file.decode("utf-8")
-            statinfo=os.stat(directory_name+filename)
-
-            #we assume that the shotchart files with a size lower than 69kB need to be revised and download again.
-            if statinfo.st_size <69000:
-                logger.info(filename+' was not properly downladed. Missing data.')
-                game_shotchart_id = os.path.splitext(filename)[0]
-                shotchart_id=game_shotchart_id.split("-")[1]
-                shotchartURL = "http://www.fibalivestats.com/u/ACBS/{}/sc.html".format(shotchart_id)
-                driver.get(shotchartURL)
-                html = driver.page_source
-                time.sleep(1)
-                save_content(directory_name+filename, html)
-                errors.append(filename)
-
-            statinfo2=os.stat(directory_name+filename)
-            f.close()
-            if statinfo2.st_size < 69000:
-                logger.info('The game-shotchart ' + filename +' data is not correct. Missing data. Deleting game-shotchart...')
-                try:
-                    os.remove(directory_name+filename)
-                    logger.info('game-shotchart ' + filename + ' deleted...')
-                    continue
-
-                except:
-                    logger.info('game-shotchart ' + filename + ' cannot be deleted...')
-                    continue
-
-    #recursive call to sanity_check to check if there are more errors with the html
-    if errors:
-        logger.info('There were {} errors in the downloads!'.format(len(errors)))
-        sanity_check_shotchart(driver_path,directory_name, logging_level=logging.INFO)
-
-    driver.close()
-    driver.quit()
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
-    return errors
-
-def sanity_check_shotchart_copa(driver_path,directory_name, logging_level=logging.INFO):
-    """
-    Checks if thes file within a directoy have been correctly downloaded
-
-    :param directory_name: String
-    :param logging_level: logging object
-    """
-    logging.basicConfig(level=logging_level)
-    logger = logging.getLogger(__name__)
-
-    driver = create_driver(driver_path)
-
-    errors = []
-    directory = os.fsencode(directory_name)
-    for file in os.listdir(directory):
-        with open(os.path.join(directory, file), encoding="utf-8") as f:
-            raw_html = f.read()
-
-            doc = pq(raw_html)
-            if doc("title").text() == '404 Not Found':
-                errors.append(os.fsdecode(file))
-
-            filename=file.decode("utf-8")
-            statinfo=os.stat(directory_name+filename)
-
-            #we assume that the shotchart files with a size lower than 69kB need to be revised and download again.
-            if statinfo.st_size <69000:
-                logger.info(filename+' was not properly downladed. Missing data.')
-                game_shotchart_id = os.path.splitext(filename)[0]
-                shotchart_id=game_shotchart_id.split("-")[1]
-                shotchartURL = "http://www.fibalivestats.com/u/ACBS/{}/sc.html".format(shotchart_id)
-                driver.get(shotchartURL)
-                html = driver.page_source
-                time.sleep(1)
-                save_content(directory_name+filename, html)
-                errors.append(filename)
-
-            statinfo2=os.stat(directory_name+filename)
-            f.close()
-            if statinfo2.st_size < 69000:
-                logger.info('The game-shotchart ' + filename +' data is not correct. Missing data. Deleting game-shotchart...')
-                try:
-                    os.remove(directory_name+filename)
-                    logger.info('game-shotchart ' + filename + ' deleted...')
-                    continue
-
-                except:
-                    logger.info('game-shotchart ' + filename + ' cannot be deleted...')
-                    continue
-
-    #recursive call to sanity_check to check if there are more errors with the html
-    if errors:
-        logger.info('There were {} errors in the downloads!'.format(len(errors)))
-        sanity_check_shotchart(driver_path,directory_name, logging_level=logging.INFO)
-
-    driver.close()
-    driver.quit()
-    logger.info('Sanity check of {} correctly finished!\n'.format(os.fsdecode(directory)))
-    return errors
\ No newline at end of file
+    return refetch_invalid_pages(driver_path, directory_name, SHOTCHART, logging_level=logging_level)
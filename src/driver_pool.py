@@ -0,0 +1,190 @@
+import os
+import time
+import queue
+import itertools
+import logging
+import threading
+from src.download import save_content, page_exists
+from src.utils import create_driver
+from src.manifest import get_manifest
+from src.http_client import get_client
+from src.audit import check_page, is_valid, page_kind
+from src.trim import prepare_page
+from src.fibalivestats import PBP, SHOTCHART, PAGE_URLS, SeleniumBackend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DRIVER_POOL_SIZE = min(4, os.cpu_count() or 1)
+MAX_ATTEMPTS = 2
+
+
+def fibalivestats_targets(events_path, shotchart_path):
+    """
+    Pages of fibalivestats that are captured for each game, and the folder where they are saved.
+
+    :param events_path: String
+    :param shotchart_path: String
+    :return: list of (page kind, directory)
+    """
+    return [(PBP, events_path), (SHOTCHART, shotchart_path)]
+
+
+class DriverPool:
+    """
+    Pool of reusable headless browsers fed from a shared queue of (fls_id, game_acbid) jobs.
+
+    Each worker owns a driver and captures all the pages of a game in the same session. When a capture fails the
+    driver is thrown away and a fresh one is created for the next job, and the job is queued again.
+
+    If a backend is given (see src/fibalivestats.py) the pages are first requested to it, and the browser is only
+    started for the pages it could not build.
+
+    The captured pages are validated before saving them (see src/audit.py), and the jobs with invalid pages are
+    retried like any other failure. The pages quarantined in the manifest are not captured.
+    """
+
+    def __init__(self, driver_path, size=DRIVER_POOL_SIZE, max_attempts=MAX_ATTEMPTS, backend=None):
+        self.driver_path = driver_path
+        self.backend = backend
+        self.size = size
+        self.max_attempts = max_attempts
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.captured = 0
+        self.failed = []
+        self.recycled = 0
+        self.timings = []
+        self.quarantined = set()
+
+    def run(self, jobs, targets):
+        """
+        Capture the pages of every job.
+
+        :param jobs: list of (fls_id, game_acbid)
+        :param targets: list of (page kind, directory), see fibalivestats_targets
+        :return: list of the jobs that could not be captured
+        """
+        return self.run_groups([(jobs, targets)])
+
+    def run_groups(self, groups):
+        """
+        Capture the pages of several groups of jobs with the same drivers, e.g. the games of several competitions,
+        whose pages are saved in different folders. The jobs of the groups are queued alternately.
+
+        :param groups: list of (jobs, targets), see run
+        :return: list of the jobs that could not be captured
+        """
+        self.quarantined = get_manifest().quarantined()
+        targets_by_group = [targets for _, targets in groups]
+        for group_jobs in itertools.zip_longest(*[jobs for jobs, _ in groups]):
+            for job, targets in zip(group_jobs, targets_by_group):
+                if job is None:
+                    continue
+                fls_id, game_acbid = job
+                if self._missing(fls_id, game_acbid, targets):
+                    self.jobs.put((fls_id, game_acbid, targets, 1))
+
+        n_jobs = self.jobs.qsize()
+        logger.info('Capturing {} games with {} drivers...'.format(n_jobs, self.size))
+
+        start = time.time()
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(min(self.size, n_jobs))]
+        for worker in workers:
+            worker.start()
+        self.jobs.join()
+        for _ in workers:
+            self.jobs.put(None)
+        for worker in workers:
+            worker.join()
+
+        elapsed = time.time() - start
+        logger.info('Captured {} pages of {} games in {:.1f}s ({} drivers recycled, {} games failed)'.format(
+            self.captured, n_jobs, elapsed, self.recycled, len(self.failed)))
+        for kind in sorted({kind for targets in targets_by_group for kind, _ in targets}):
+            seconds = [t for k, _, t in self.timings if k == kind]
+            if seconds:
+                logger.info('{} pages rendered in the browser: {}, {:.2f}s mean, {:.2f}s max'.format(
+                    kind, len(seconds), sum(seconds) / len(seconds), max(seconds)))
+        return self.failed
+
+    def _missing(self, fls_id, game_acbid, targets):
+        return {kind: path for kind, path in self._files(fls_id, game_acbid, targets)
+                if not page_exists(path) and PAGE_URLS[kind].format(fls_id) not in self.quarantined}
+
+    def _files(self, fls_id, game_acbid, targets):
+        for kind, directory in targets:
+            yield kind, os.path.join(directory, str(game_acbid) + "-" + str(fls_id) + ".html")
+
+    def _capture(self, session, fls_id, game_acbid, targets):
+        """
+        Capture the missing pages of a game, first with the backend and then with the browser of the worker's
+        session, which is only started the first time it is needed.
+        """
+        missing = self._missing(fls_id, game_acbid, targets)
+        pages = {}
+        if self.backend is not None:
+            try:
+                pages = self.backend.capture(fls_id, list(missing))
+            except Exception as e:
+                logger.info('{} when building game {} without browser, falling back to selenium'.format(e, game_acbid))
+
+        remaining = [kind for kind in missing if kind not in pages]
+        if remaining:
+            if session['driver'] is None:
+                session['driver'] = create_driver(self.driver_path, proxy=get_client().proxy)
+            pages.update(SeleniumBackend(session['driver'], self.timings).capture(fls_id, remaining))
+
+        invalid = []
+        for kind, html in pages.items():
+            url = PAGE_URLS[kind].format(fls_id)
+            html = prepare_page(kind, fls_id, missing[kind], html)  # only the fragment, if trimming is enabled.
+            verdict = check_page(page_kind(missing[kind]), html)
+            if not is_valid(verdict):
+                get_manifest().record_invalid(url, missing[kind], html, verdict)
+                invalid.append(kind)
+                continue
+            save_content(missing[kind], html)
+            get_manifest().record_success(url, missing[kind], html, verdict=verdict)
+            with self.lock:
+                self.captured += 1
+
+        if invalid:
+            raise Exception('invalid {} pages'.format(', '.join(invalid)))
+
+    def _worker(self):
+        session = {'driver': None}
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+
+            fls_id, game_acbid, targets, attempt = job
+            try:
+                self._capture(session, fls_id, game_acbid, targets)
+            except Exception as e:
+                logger.info('{} when trying to retrieve game {} (attempt {})'.format(e, game_acbid, attempt))
+                self._recycle(session)
+                if attempt < self.max_attempts:
+                    self.jobs.put((fls_id, game_acbid, targets, attempt + 1))
+                else:
+                    for kind, path in self._missing(fls_id, game_acbid, targets).items():
+                        get_manifest().record_failure(PAGE_URLS[kind].format(fls_id), path, e, attempts=attempt)
+                    with self.lock:
+                        self.failed.append((fls_id, game_acbid))
+            finally:
+                self.jobs.task_done()
+
+        if session['driver'] is not None:
+            session['driver'].quit()
+
+    def _recycle(self, session):
+        if session['driver'] is not None:
+            try:
+                session['driver'].quit()
+            except Exception:
+                pass
+            session['driver'] = None
+            with self.lock:
+                self.recycled += 1
@@ -0,0 +1,323 @@
+import html
+import time
+import logging
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from src.http_client import get_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PBP_URL = "http://www.fibalivestats.com/u/ACBS/{}/pbp.html"
+SHOTCHART_URL = "http://www.fibalivestats.com/u/ACBS/{}/sc.html"
+DATA_URL = "https://fibalivestats.dcd.shared.geniussports.com/data/{}/data.json"
+
+PBP = 'pbp'
+SHOTCHART = 'sc'
+PAGE_URLS = {PBP: PBP_URL, SHOTCHART: SHOTCHART_URL}
+
+CAPTURE_TIMEOUT = 30
+CAPTURE_POLL = 0.25
+HTTP_TIMEOUT = 30
+
+# Elements that are present once the fragment read by the parsers has been rendered.
+READY_SELECTORS = {PBP: '#playbyplay .pbpa', SHOTCHART: '#shotchart_data .sc_shot'}
+
+# Pages built by the HttpBackend only contain the fragment read by the parsers, so they are much smaller than a
+# rendered page. The marker lets the sanity checks tell them apart.
+HTTP_PAGE_MARKER = '<meta name="generator" content="fibalivestats-http">'
+
+# Translation of the actions of the livestats feed into the Spanish legends shown in the rendered pages (see
+# legend_dict in models/event.py and shot_type_dict in models/shotchart.py). Only the legends known by the parsers are
+# produced: an action without a known legend raises an UnknownActionError, and DriverPool falls back to the browser
+# for that game.
+SHOT_NAMES = {
+    ('2pt', 'jumpshot'): '2PT tiro',
+    ('2pt', 'layup'): '2PT bandeja',
+    ('2pt', 'drivinglayup'): '2PT bandeja',
+    ('2pt', 'tipin'): '2PT palmeo',
+    ('2pt', 'dunk'): 'Mate',  # only 'Mate convertido' is a legend of the play-by-play.
+    ('2pt', 'alleyoop'): '2PT Alley-oop',  # only '2PT Alley-oop convertido' is a legend of the play-by-play.
+    ('2pt', 'hookshot'): 'BASKETBALL_ACTION_2PT_HOOKSHOT',
+    ('2pt', 'stepbackjumpshot'): 'BASKETBALL_ACTION_2PT_STEPBACKJUMPSHOT',
+    ('3pt', 'jumpshot'): '3PT',
+    ('3pt', 'stepbackjumpshot'): '3PT',
+    ('3pt', ''): '3PT',
+}
+
+ACTION_NAMES = {
+    ('assist', ''): 'Asistencia',
+    ('block', ''): 'Tapón',
+    ('steal', ''): 'Recuperación',
+    ('turnover', ''): 'Pérdida',
+    ('turnover', 'ballhandling'): 'Pérdida en el manejo del balón',
+    ('turnover', 'backcourt'): 'Pérdida por campo atrás',
+    ('turnover', '3sec'): 'Pérdida por 3 segundos',
+    ('turnover', '5sec'): 'Pérdida por 5 segundos',
+    ('turnover', '8sec'): 'Pérdida por 8 segundos',
+    ('turnover', 'shotclock'): 'Pérdida por 24 segundos',
+    ('turnover', 'offensive'): 'Pérdida por falta en ataque',
+    ('turnover', 'outofbounds'): 'Pérdida por fuera de banda',
+    ('turnover', 'badpass'): 'Pérdida por mal pase',
+    ('turnover', 'travel'): 'Pérdida por pasos',
+    ('turnover', 'offensivegoaltending'): 'Pérdida por interferencia en ataque',
+    ('turnover', 'doubledribble'): 'Pérdida por dobles',
+    ('timeout', 'full'): 'TIEMPO MUERTO',
+    ('timeout', 'commercial'): 'TIEMPO MUERTO TV',
+    ('timeout', 'short'): 'TIEMPO MUERTO CORTO',
+    ('timeout', 'official'): 'TIEMPO MUERTO ARBITRAJE',
+    ('jumpball', 'heldball'): 'Salto balón retenido',
+    ('jumpball', 'won'): 'Salto ganado',
+    ('jumpball', 'lost'): 'Salto perdido',
+    ('jumpball', 'unclearposs'): 'jumpball.unclearposs',
+    ('foul', 'personal'): 'Falta personal',
+    ('foul', 'offensive'): 'Falta en ataque',
+    ('foul', 'unsportsmanlike'): 'Falta antideportiva',
+    ('foul', 'technical'): 'Falta técnica',
+    ('foul', 'disqualifying'): 'Falta descalificante',
+    ('foul', 'benchTechnical'): 'Técnica al banquillo',
+    ('foul', 'coachTechnical'): 'Técnica al entrenador',
+    ('foulon', ''): 'Falta recibida',
+    ('rebound', 'offensive'): 'Rebote ofensivo',
+    ('rebound', 'defensive'): 'Rebote defensivo',
+    ('substitution', 'in'): 'Entra a pista',
+    ('substitution', 'out'): 'Se retira',
+    ('game', 'start'): 'COMIENZA EL PARTIDO',
+    ('game', 'end'): 'PARTIDO FINALIZADO',
+    ('period', 'start'): 'INICIO PERIODO',
+    ('period', 'end'): 'PERIODO FINALIZADO',
+}
+
+
+class UnknownActionError(ValueError):
+    pass
+
+
+def shot_name(action):
+    """
+    Name of a shot as written in the rendered pages, e.g. '2PT bandeja'.
+
+    :param action: dict from the livestats feed
+    :return: String
+    """
+    action_type = action.get('actionType', '')
+    sub_type = action.get('subType', '') or ''
+    if (action_type, sub_type) in SHOT_NAMES:
+        return SHOT_NAMES[(action_type, sub_type)]
+    if (action_type, '') in SHOT_NAMES:
+        return SHOT_NAMES[(action_type, '')]
+    raise UnknownActionError('Unknown shot: {} {}'.format(action_type, sub_type))
+
+
+def action_legend(action):
+    """
+    Legend of an action of the play-by-play as written in the rendered pages, e.g. 'Tiro libre 1/2 fallado'.
+
+    :param action: dict from the livestats feed
+    :return: String
+    """
+    from models.event import legend_dict  # models.event imports this module through src.driver_pool.
+
+    action_type = action.get('actionType', '')
+    sub_type = action.get('subType', '') or ''
+    result = ' convertido' if action.get('success') else ' fallado'
+
+    if action_type in ('2pt', '3pt'):
+        legend = shot_name(action) + result
+    elif action_type == 'freethrow':
+        made, attempts = sub_type.split('of') if 'of' in sub_type else (sub_type, '')
+        legend = 'Tiro libre {}/{}'.format(made, attempts) + result
+    else:
+        legend = ACTION_NAMES.get((action_type, sub_type), ACTION_NAMES.get((action_type, '')))
+
+    if legend not in legend_dict:
+        raise UnknownActionError('Unknown action: {} {} ({})'.format(action_type, sub_type, legend))
+    return legend
+
+
+def period_labels(action, period_key='period', type_key='periodType'):
+    """
+    Labels of the period of an action, as (text, css class suffix). E.g. ('P2', '2') or ('OT1', 'ot1').
+
+    :param action: dict from the livestats feed
+    :return: tuple
+    """
+    period = action.get(period_key)
+    if action.get(type_key) == 'OVERTIME':
+        return 'OT{}'.format(period), 'ot{}'.format(period)
+    return 'P{}'.format(period), str(period)
+
+
+def build_pbp_page(fls_id, data):
+    """
+    Build the #playbyplay fragment read by Event.scrap_and_insert from the livestats feed.
+
+    :param fls_id: String
+    :param data: dict, the livestats feed of the game
+    :return: String
+    """
+    rows = []
+    for action in data['pbp']:  # the feed is sorted from the last action to the first one, like the pages.
+        period_text, period_class = period_labels(action)
+        tno = action.get('tno') or 0
+        clock = action.get('gt', '00:00')
+        legend = html.escape(action_legend(action))
+
+        if action.get('pno'):
+            text = '{}, {}, {}'.format(action.get('shirtNumber', ''), html.escape(action.get('player', '')), legend)
+        else:
+            text = legend
+
+        rows.append('<div class="pbpa pbpt{} per_{}" id="{}">'
+                    '<div class="pbp-time">{} {}<span class="pbpsc">{}-{}</span></div>'
+                    '<div class="pbp-action">{}</div></div>'.format(tno, period_class, clock, period_text, clock,
+                                                                    action.get('s1', 0), action.get('s2', 0), text))
+
+    return _page(fls_id, '<div id="playbyplay">{}</div>'.format(''.join(rows)))
+
+
+def build_shotchart_page(fls_id, data):
+    """
+    Build the #shotchart_data fragment read by Shotchart.scrap_and_insert from the livestats feed.
+
+    :param fls_id: String
+    :param data: dict, the livestats feed of the game
+    :return: String
+    """
+    shots = []
+    for tno in ('1', '2'):
+        for shot in data['tm'][tno].get('shot', []):
+            shots.append((shot.get('actionNumber', 0), tno, shot))
+    shots.sort(key=lambda x: x[0])
+
+    spans = []
+    for _, tno, shot in shots:
+        color = 'white' if tno == '1' else 'black'
+        result = 'made' if shot.get('r') else 'missed'
+        period = 'ot' if shot.get('perType') == 'OVERTIME' else shot.get('per')
+        title = '{}, {}, {}'.format(shot.get('shirtNumber', ''), html.escape(shot.get('player', '')), shot_name(shot))
+        spans.append('<span class="sc_shot {}_{} sc_per{} sc_pno{} sc_tn{}" style="bottom: {}%; left: {}%;" '
+                     'title="{}"></span>'.format(color, result, period, shot.get('pno', ''), tno,
+                                                 shot.get('y'), shot.get('x'), title))
+
+    return _page(fls_id, '<div id="shotchart_data">{}</div>'.format(''.join(spans)))
+
+
+def _page(fls_id, fragment):
+    return '<html><head>{}<title>{}</title></head><body>{}</body></html>'.format(HTTP_PAGE_MARKER, fls_id, fragment)
+
+
+PAGE_BUILDERS = {PBP: build_pbp_page, SHOTCHART: build_shotchart_page}
+
+
+class HttpBackend:
+    """
+    Gets the livestats feed of a game over plain HTTP and builds the fragments of its pages, without a browser.
+
+    :param data_url: String, url template of the feed. It can point to a local stand-in server.
+    """
+
+    def __init__(self, data_url=DATA_URL, timeout=HTTP_TIMEOUT):
+        self.data_url = data_url
+        self.timeout = timeout
+
+    def capture(self, fls_id, kinds):
+        """
+        :param fls_id: String
+        :param kinds: list of page kinds (PBP, SHOTCHART)
+        :return: dict kind -> html
+        """
+        response = get_client().get(self.data_url.format(fls_id), timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return {kind: PAGE_BUILDERS[kind](fls_id, data) for kind in kinds}
+
+
+class PageBackend:
+    """
+    Gets the pages of a game as they were saved, over plain HTTP. Only useful through the replay server of
+    src/replay.py, which answers the page urls with the pages of its archive.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        self.timeout = timeout
+
+    def capture(self, fls_id, kinds):
+        """
+        :param fls_id: String
+        :param kinds: list of page kinds (PBP, SHOTCHART)
+        :return: dict kind -> html
+        """
+        pages = {}
+        for kind in kinds:
+            response = get_client().get(PAGE_URLS[kind].format(fls_id), timeout=self.timeout)
+            response.raise_for_status()
+            pages[kind] = response.text
+        return pages
+
+
+class FragmentReady:
+    """
+    Wait condition: the elements of the fragment are present and their number did not change since the last poll,
+    i.e. the page has finished rendering them.
+
+    :param selector: String, css selector
+    """
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.count = 0
+
+    def __call__(self, driver):
+        count = len(driver.find_elements(By.CSS_SELECTOR, self.selector))
+        ready = count > 0 and count == self.count
+        self.count = count
+        return ready
+
+
+class SeleniumBackend:
+    """
+    Renders the pages of a game in a browser and captures their source, as soon as the fragment is rendered.
+
+    :param driver: selenium webdriver
+    :param timings: list where (kind, fls_id, seconds) is appended for every page captured.
+    """
+
+    def __init__(self, driver, timings=None, timeout=CAPTURE_TIMEOUT):
+        self.driver = driver
+        self.timings = timings
+        self.timeout = timeout
+
+    def capture(self, fls_id, kinds):
+        """
+        :param fls_id: String
+        :param kinds: list of page kinds (PBP, SHOTCHART)
+        :return: dict kind -> html
+        """
+        pages = {}
+        for kind in kinds:
+            start = time.time()
+            self.driver.get(PAGE_URLS[kind].format(fls_id))
+            WebDriverWait(self.driver, self.timeout, poll_frequency=CAPTURE_POLL).until(
+                FragmentReady(READY_SELECTORS[kind]), 'the {} of {} was not rendered'.format(kind, fls_id))
+            pages[kind] = self.driver.page_source
+            if self.timings is not None:
+                self.timings.append((kind, fls_id, time.time() - start))
+        return pages
+
+
+def get_backend(name):
+    """
+    Backend used before falling back to the browser.
+
+    :param name: String, 'http', 'replay' or 'selenium'. The pages built by 'http' have not been checked against all the
+    rendered ones yet, so 'selenium' is the default of run.py.
+    :return: HttpBackend, PageBackend or None when only the browser must be used.
+    """
+    if name == 'http':
+        return HttpBackend()
+    elif name == 'replay':
+        return PageBackend()
+    elif name == 'selenium':
+        return None
+    raise ValueError('Unknown fetch backend: {}'.format(name))
@@ -0,0 +1,384 @@
+"""
+Single-pass extractor of the game pages (fichas) of acb.com.
+
+A ficha has two statistics tables: the first one with the information of the game (journey, date, venue, referees
+and the score of each quarter) and the second one with the box score of both teams. The page is parsed once with
+lxml, and both tables are read with precompiled XPath expressions into a GameRecord, which Game.create_instance and
+Participant.create_instances consume without touching the html again. As the records are plain data, parse_games()
+can read the fichas of a season in a pool of processes while a single one writes them in the database.
+
+The selections and the text of the elements behave like the PyQuery ones they replace (see src/html_text.py).
+"""
+import re
+import logging
+import datetime
+from collections import namedtuple, defaultdict
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import lxml.html
+from lxml import etree
+from src.utils import fill_dict, replace_nth_ocurrence
+from src.audit import BLANK_GAME_PATTERN
+from src.html_text import BY_CLASS, by_class, text
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GameRecord = namedtuple('GameRecord', ['game', 'home_team_name', 'away_team_name', 'score_home', 'score_away', 'box',
+                                       'game_error', 'box_error'])
+"""
+:param game: dict with the attributes of Game read from the page (kickoff_time, journey, venue, scores per quarter...)
+:param home_team_name: String, or None if it could not be read.
+:param away_team_name: String, or None if it could not be read.
+:param score_home: int, or None if it could not be read.
+:param score_away: int, or None if it could not be read.
+:param box: list of BoxRow, the players, coaches and team rows of both teams.
+:param game_error: Exception raised reading the information of the game, if any.
+:param box_error: Exception raised reading the box score, if any.
+"""
+
+BoxRow = namedtuple('BoxRow', ['team', 'number', 'stats'])
+"""
+:param team: int, 0 for the home team and 1 for the away team.
+:param number: String, number of the player, or 'Equipo' for the team row.
+:param stats: dict attribute of Participant -> value. It also has the acbid of the actor in 'id', if any.
+"""
+
+NEW_STATISTICS_TABLE = '<table class="estadisticasnew"'
+
+CELLS = etree.XPath("descendant-or-self::td")
+ROWS = etree.XPath("descendant-or-self::tr")
+LINKS = etree.XPath("descendant::a")
+
+TEAM_NAME_REGEX = re.compile(r"(.*) [0-9]")
+COACH_REGEX = re.compile(r'entrenador')
+
+QUARTER_ATTRIBUTES = {2: ('score_home_first', 'score_away_first'),
+                      3: ('score_home_second', 'score_away_second'),
+                      4: ('score_home_third', 'score_away_third'),
+                      5: ('score_home_fourth', 'score_away_fourth'),
+                      6: ('score_home_extra', 'score_away_extra')}
+
+CUP_ROUNDS = {1: 'quarter_final', 2: 'semi_final', 3: 'final'}
+
+"""
+We create the correspondance between the acb ids and the attributes in our database
+"""
+HEADER_TO_DB = {'D': 'number', 'Nombre': "display_name", 'Min': 'minutes', 'P': 'point', 'T2': 't2',
+                'T3': 't3', 'T1': 't1', 'REBD': 'defensive_reb', 'REBO': 'offensive_reb', 'A': 'assist',
+                'BR': 'steal', 'BP': 'turnover', 'C': 'counterattack', 'TAPF': 'block',
+                'TAPC': 'received_block', 'M': 'dunk', 'FPF': 'fault', 'FPC': 'received_fault',
+                '+/-': 'plus_minus', 'V': 'efficiency'}
+
+"""
+We add extra attributes that are not inferred directly from the stats, but from the context.
+"""
+CONTEXT_ATTRIBUTES = {"is_coach": "is_coach",
+                      "is_starter": "is_starter",
+                      "game": "game",
+                      "team": "team",
+                      "actor": "actor",
+                      "t1_attempt": "t1_attempt",
+                      "t2_attempt": "t2_attempt",
+                      "t3_attempt": "t3_attempt",
+                      "defensive_reb": "defensive_reb",
+                      "offensive_reb": "offensive_reb"}
+
+# acb errors: games with a player twice in the box score.
+WRONG_PAGES_FIRST = ['55313', '54017', '54026', '61072', '61076', '61107', '62177']  # if the good one is the first.
+WRONG_PAGES_SECOND = ['53154', '61218', '62177']  # if the good one is the second.
+
+BLANK_GAME_REGEX = re.compile(BLANK_GAME_PATTERN, re.DOTALL)  # the blank pages of src/audit.py.
+PARSE_CHUNK_SIZE = 8  # fichas sent at once to each process.
+PARSER_VERSION = 3  # to be increased when the records change, see src/parse_cache.py
+
+
+def cells(elements):
+    return [cell for element in elements for cell in CELLS(element)]
+
+
+def extract_game(raw_game, game_acbid):
+    """
+    Read the information of a game and its box score from its ficha.
+
+    :param raw_game: String
+    :param game_acbid: int
+    :return: GameRecord
+    """
+    # There are two different statistics table in acb.com. I assume they created the new one to introduce the +/- stat.
+    estadisticas_class = 'estadisticasnew' if NEW_STATISTICS_TABLE in raw_game else 'estadisticas'
+    tables = BY_CLASS(lxml.html.fromstring(raw_game), name=estadisticas_class)
+    if len(tables) < 2:
+        error = ValueError('The statistics tables of game {} are missing'.format(game_acbid))
+        return GameRecord({}, None, None, None, None, [], error, error)
+
+    home_team_name, away_team_name = _team_names(tables[1])
+
+    game, game_error = {}, None
+    try:
+        _game_information(tables[0], game)
+    except Exception as e:
+        game_error = e
+
+    scores = {0: None, 1: None}
+    box, box_error = [], None
+    try:
+        box = _box_score(tables[1], game_acbid, scores)
+    except Exception as e:
+        box_error = e
+
+    return GameRecord(game, home_team_name, away_team_name, scores[0], scores[1], box, game_error, box_error)
+
+
+def is_blank_game(raw_game):
+    """
+    A playoff game might be blank if the series ends before the last game.
+
+    :param raw_game: String
+    :return: bool
+    """
+    return bool(BLANK_GAME_REGEX.search(raw_game))
+
+
+def parse_game(game):
+    """
+    :param game: (game_acbid, raw_game)
+    :return: (bool the game is blank, GameRecord), or (False, exception) if the ficha could not be read.
+    """
+    game_acbid, raw_game = game
+    try:
+        return is_blank_game(raw_game), extract_game(raw_game, game_acbid)
+    except Exception as e:
+        return False, e
+
+
+def parse_games(games, workers=None, cache=None):
+    """
+    Parse several fichas, in a pool of processes if workers is given.
+
+    :param games: iterable of (file_name, game_acbid, raw_game)
+    :param workers: int, number of processes. None or 1 to parse them in this process.
+    :param cache: ParseCache of the folder of the fichas (see src/parse_cache.py), whose records are not parsed again.
+    :return: iterator of the results of parse_game(), in the order of games.
+    """
+    games = list(games)
+    cached = [cache.get(file_name, raw_game) if cache is not None else None for file_name, _, raw_game in games]
+    missing = [(game_acbid, raw_game) for (_, game_acbid, raw_game), result in zip(games, cached) if result is None]
+
+    with ProcessPoolExecutor(max_workers=workers) if missing and workers and workers > 1 else nullcontext() as executor:
+        parsed = executor.map(parse_game, missing, chunksize=PARSE_CHUNK_SIZE) if executor else map(parse_game, missing)
+        for (file_name, _, raw_game), result in zip(games, cached):
+            if result is None:
+                result = next(parsed)
+                if cache is not None:
+                    cache.put(file_name, raw_game, result)
+            yield result
+
+
+def cup_round(journey):
+    """
+    :param journey: String
+    :return: String, round of the cup of a journey, or None.
+    """
+    return CUP_ROUNDS.get(int(journey))
+
+
+def _team_names(info_teams_data):
+    names = []
+    team_rows = by_class([info_teams_data], 'estverde')
+    for i in [0, 2]:
+        team_cells = cells(team_rows[i:i + 1])
+        match = TEAM_NAME_REGEX.search(text(team_cells[0])) if team_cells else None
+        names.append(match.groups()[0] if match else None)
+    return names
+
+
+def _game_information(info_game_data, game):
+    scheduling_cells = cells(by_class([info_game_data], 'estnegro'))
+    scheduling_data = text(scheduling_cells[0]).split("|") if scheduling_cells else ['']
+    journey, date, time, venue, attendance = list(map(lambda x: x.strip(), scheduling_data))  # Remove extra spaces.
+
+    if date and time:
+        day, month, year = list(map(int, date.split("/")))
+        hour, minute = list(map(int, time.split(":")))
+        game['kickoff_time'] = datetime.datetime(year=year, month=month, day=day, hour=hour, minute=minute)
+
+    if attendance:
+        try:
+            game['attendance'] = int(attendance.split(":")[1])
+        except ValueError:
+            pass
+
+    if venue:
+        game['venue'] = venue
+
+    if journey:
+        game['journey'] = journey.split(" ")[1]
+
+    score_cells = cells(by_class([info_game_data], 'estnaranja'))
+    for i, (score_home_attribute, score_away_attribute) in QUARTER_ATTRIBUTES.items():
+        quarter_data = text(score_cells[i]) if i < len(score_cells) else ''
+        if quarter_data:
+            try:
+                game[score_home_attribute], game[score_away_attribute] = list(map(int, quarter_data.split("|")))
+            except ValueError:
+                pass
+
+    referees_data = text(score_cells[0]) if score_cells else ''
+    if referees_data:
+        referees = referees_data.split(":")[1].strip().split(",")
+        referees = list(filter(None, referees))
+        referees = list(map(lambda x: x.strip(), referees))
+        for n_ref, referee in enumerate(referees, 1):
+            game['referee_' + str(n_ref)] = referee
+
+
+def _header(info_players_data):
+    """
+    We make sure we only retrieve stats that are in the header. One clear example can be found when the
+    estadisticas_tag is 'estadisticas' since it hasn't got the +/- stat.
+    """
+    header_rows = ROWS(info_players_data)
+    header = [text(cell) for cell in cells(header_rows[1:2])]
+
+    """
+    However, the acb ids of the stats are not unique and some of them are repeteated.
+    We have three times a 'C' and two times a 'F'. We manually modify these ids.
+    """
+    # The first C is counterattack, the second C is received_block and the third received_fault.
+    header = replace_nth_ocurrence(header, 3, "C", "FPC")
+    header = replace_nth_ocurrence(header, 2, "C", "TAPC")
+    # The first F is block and the second F is  fault.
+    header = replace_nth_ocurrence(header, 2, "F", "FPF")
+    header = replace_nth_ocurrence(header, 1, "F", "TAPF")
+
+    # Preventing from missing stats
+    header_to_db = {key: match for key, match in HEADER_TO_DB.items() if key in header}
+    header_to_db.update(CONTEXT_ATTRIBUTES)
+    return header, header_to_db
+
+
+def _box_score(info_players_data, game_acbid, scores):
+    """
+    We create a dictionary that contains, for each of the teams, and for each of the players, and for each of the stats
+    the value of such stat for such player of such team.
+
+    > stats[team][player][stat]
+
+    where 'team' is the index of the team (0 for the home team), 'player' is the number of the player and 'stat' is the
+    attribute of Participant. The final score of each team is read from its 'Total' row.
+    """
+    header, header_to_db = _header(info_players_data)
+
+    acb_error_player = None
+    stats = defaultdict(dict)
+    current_team = None
+    score_flag = 0
+    new_display_name = None
+    for tr in ROWS(info_players_data):  # iterate over each row
+        if by_class([tr], 'estverde'):  # header
+            if by_class([tr], 'estverdel'):  # team information
+                current_team = 0 if current_team is None else 1  # first team home team
+                stats[current_team] = defaultdict(dict)
+            continue
+
+        # players, equipo, and coach.
+        number = None
+        for cont, td in enumerate(CELLS(tr)):  # iterate over each cell (stat)
+            td_text = text(td)
+
+            if td_text == "5f":
+                break
+
+            elif td_text == 'Total' or number == 'Total':
+                number = 'Total'
+                if score_flag < 2:
+                    score_flag += 1
+                    continue
+                elif score_flag == 2:
+                    score_flag += 1
+                    try:
+                        if current_team in scores:
+                            scores[current_team] = int(td_text)
+                    except ValueError as e:
+                        logger.warning('Game {}: the score could not be read: {}'.format(game_acbid, e))
+                    continue
+                else:
+                    score_flag = 0
+                    break
+
+            elif cont == 0:  # first cell number of the player
+                number = td_text if td_text else 'Equipo'
+                if number in stats[current_team]:  # preventing from errors with the number.
+                    if game_acbid in WRONG_PAGES_FIRST:  # acb error... >:(
+                        pass
+                    elif game_acbid in WRONG_PAGES_SECOND:
+                        stats[current_team][number] = acb_error_player
+                        break
+                    else:  # sometimes th acb has some duplicated players (error).
+                        continue
+
+                else:
+                    # Create the dict with default attributes.
+                    stats[current_team][number] = fill_dict(header_to_db.values())
+                    stats[current_team][number]['is_starter'] = 1 if by_class([td], 'gristit') else 0
+
+            elif cont == 1 and LINKS(td):  # second cell player id
+                href_attribute = LINKS(td)[0].get('href').split("=")  # the acb id is in the href attribute.
+                stats[current_team][number]['id'] = href_attribute[-1]
+
+                is_coach = COACH_REGEX.search(href_attribute[0])
+                stats[current_team][number]['is_coach'] = 1 if is_coach else 0
+                stats[current_team][number]['number'] = None if is_coach else int(number)
+
+                display_name = td_text
+                if ',' in display_name:
+                    try:
+                        last_name, first_name = list(map(lambda x: x.strip(), display_name.split(",")))
+                        new_display_name = str(first_name)[0] + '. ' + last_name
+                        stats[current_team][number]['display_name'] = new_display_name
+                    except (ValueError, IndexError):  # E.g Milisavljevic,
+                        stats[current_team][number]['display_name'] = new_display_name
+                else:  # E.g. San Emeterio
+                    stats[current_team][number]['display_name'] = display_name
+
+            elif '%' in header[cont]:  # discard percentages.
+                continue
+
+            elif '/' in td_text:  # T1, T2 or T3 in format success/attempts.
+                success, attempts = td_text.split("/")
+                try:
+                    stats[current_team][number][header_to_db[header[cont]]] = int(success)
+                except (ValueError, KeyError) as e:
+                    logger.warning('Game {}: {} of {} could not be read: {}'.format(game_acbid, header[cont], number, e))
+                try:
+                    stats[current_team][number][header_to_db[header[cont]] + "_attempt"] = int(attempts)
+                except (ValueError, KeyError) as e:
+                    logger.warning('Game {}: {} of {} could not be read: {}'.format(game_acbid, header[cont], number, e))
+
+            elif '+' in td_text:  # defensive and offensive rebounds in format D+O
+                defensive, offensive = td_text.split("+")
+                try:
+                    stats[current_team][number]["defensive_reb"] = int(defensive)
+                except ValueError as e:
+                    logger.warning('Game {}: the rebounds of {} could not be read: {}'.format(game_acbid, number, e))
+                try:
+                    stats[current_team][number]["offensive_reb"] = int(offensive)
+                except ValueError as e:
+                    logger.warning('Game {}: the rebounds of {} could not be read: {}'.format(game_acbid, number, e))
+
+            elif ':' in td_text:  # minutes in format minutes:seconds
+                minutes, seconds = td_text.split(":")
+                stats[current_team][number]["minutes"] = int(minutes) * 60 + int(seconds)
+
+            else:
+                if header[cont] in header_to_db:  # only add useful stats.
+                    try:
+                        stats[current_team][number][header_to_db[header[cont]]] = int(td_text) if td_text else 0
+                    except ValueError:
+                        stats[current_team][number][header_to_db[header[cont]]] = td_text
+
+            acb_error_player = stats[current_team][number]
+
+    return [BoxRow(team, number, player_stats) for team, team_dict in stats.items()
+            for number, player_stats in team_dict.items()]
@@ -0,0 +1,124 @@
+"""
+Gap detector of a season.
+
+The games of a competition in a season, and their fibalivestats ids, come from the journey index, the same lists the
+downloads use (see src/competition.py): only the games already played, and for the current season the journeys that
+are still open are not closed in the index. Comparing them with the manifest and with the database gives, for each
+stage, the pages that are missing and the ones saved but not inserted, so repairing a season only costs the holes.
+"""
+import os
+import logging
+from collections import namedtuple
+from src.download import saved_pages
+from src.fibalivestats import PAGE_URLS, PBP, SHOTCHART
+from src.audit import BLANK
+from src.competition import LACB, game_ids, game_jobs, fibalivestats_ids as competition_fibalivestats_ids, events_path, \
+    shotchart_path
+from src.utils import get_current_season
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Gaps = namedtuple('Gaps', ['download', 'insert'])
+STAGES = ('ficha', 'participants', 'pbp', 'shotchart')
+
+
+def expected_games(season, competition=LACB):
+    """
+    :param season: Season object.
+    :param competition: Competition, see src/competition.py
+    :return: dict game acbid -> (file, url) of its ficha.
+    """
+    ids = sorted(set(int(game_acbid) for game_acbid in game_ids(season, competition)))
+    return dict(zip(ids, game_jobs(season, competition, ids)))
+
+
+def expected_number_games(season, competition=LACB):
+    """
+    Number of games given by Season.get_number_games*, to check that the journey index is complete.
+
+    :param season: Season object.
+    :param competition: Competition, see src/competition.py
+    :return: int, the games of the league so far (only the closed journeys for the current season), or None for the
+    other competitions.
+    """
+    if competition != LACB:
+        return None
+    if season.season == get_current_season():
+        closed_journeys = min(season.get_current_journey() - 1, 2 * (season.num_teams - 1))
+        return max(closed_journeys, 0) * (season.num_teams // 2)
+    return season.get_number_games()
+
+
+def expected_fibalivestats(season, competition=LACB):
+    """
+    :param season: Season object.
+    :param competition: Competition, see src/competition.py
+    :return: dict fls_id -> game acbid, empty for the seasons without play-by-play.
+    """
+    return competition_fibalivestats_ids(season, competition)
+
+
+def fibalivestats_jobs(directory, kind, fibalivestats_ids):
+    """
+    :return: dict fls_id -> (file, url)
+    """
+    return {fls_id: (os.path.join(directory, str(game_acbid) + "-" + str(fls_id) + '.html'), PAGE_URLS[kind].format(fls_id))
+            for fls_id, game_acbid in fibalivestats_ids.items()}
+
+
+def find_gaps(season, competition=LACB):
+    """
+    Compare the expected games of a competition in a season with the pages saved and the rows of the database.
+
+    :param season: Season object.
+    :param competition: Competition, see src/competition.py
+    :return: dict stage -> Gaps. For ficha and participants the gaps are game acbids, and for pbp and shotchart
+    fls ids.
+    """
+    from models.game import Game
+    from models.participant import Participant
+    from models.event import Event
+    from models.shotchart import Shotchart
+
+    gaps = {}
+
+    games = expected_games(season, competition)
+    number_games = expected_number_games(season, competition)
+    if number_games is not None and len(games) < number_games:
+        # These games cannot be repaired from the index: its journeys have to be requested again.
+        logger.warning('Season {} {}: the journey index has {} games, {} expected'.format(
+            season.season, competition.code, len(games), number_games))
+    saved = saved_pages(list(games.values()))
+    inserted = {game.game_acbid for game in Game.select(Game.game_acbid).where(Game.season == season.season)}
+    # The blank playoff games (the series ended before) are saved but never inserted.
+    gaps['ficha'] = Gaps(sorted(acbid for acbid, (file_path, _) in games.items() if file_path not in saved),
+                         sorted(acbid for acbid, (file_path, _) in games.items()
+                                if file_path in saved and saved[file_path] != BLANK and acbid not in inserted))
+
+    with_participants = Participant.select(Participant.game)
+    without_participants = Game.select(Game.game_acbid).where((Game.season == season.season) &
+                                                              ~(Game.id << with_participants))
+    gaps['participants'] = Gaps([], sorted(game.game_acbid for game in without_participants if game.game_acbid in games))
+
+    fibalivestats_ids = expected_fibalivestats(season, competition)
+    for stage, kind, path, model, field in [
+            ('pbp', PBP, events_path, Event, Event.events_game_acbid),
+            ('shotchart', SHOTCHART, shotchart_path, Shotchart, Shotchart.shotchart_game_acbid)]:
+        if not fibalivestats_ids:
+            gaps[stage] = Gaps([], [])
+            continue
+        directory = path(season, competition)
+        jobs = fibalivestats_jobs(directory, kind, fibalivestats_ids)
+        saved = saved_pages(list(jobs.values()))
+        ids = [int(fls_id) for fls_id in fibalivestats_ids]
+        done = {row[0] for row in model.select(field).where(field << ids).distinct().tuples()}
+        gaps[stage] = Gaps(sorted(fls_id for fls_id, (file_path, _) in jobs.items() if file_path not in saved),
+                           sorted(fls_id for fls_id, (file_path, _) in jobs.items()
+                                  if file_path in saved and int(fls_id) not in done
+                                  and int(fibalivestats_ids[fls_id]) in inserted))
+
+    for stage in STAGES:
+        logger.info('Season {} {} {}: {} pages missing, {} not inserted'.format(
+            season.season, competition.code, stage, len(gaps[stage].download), len(gaps[stage].insert)))
+    return gaps
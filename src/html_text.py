@@ -0,0 +1,112 @@
+"""
+Selections and text of lxml elements that behave like the PyQuery ones they replace in the extractors
+(src/ficha.py and src/pbp.py).
+
+A class selector applied to an element also matches the element itself, and text() follows the rules of
+PyQuery.text(): the whitespace of each run of text is squashed, inline elements are joined, and blocks and <br>
+start a new line.
+"""
+import re
+from lxml import etree
+
+BY_CLASS = etree.XPath("descendant-or-self::*[contains(concat(' ', normalize-space(@class), ' '), concat(' ', $name, ' '))]")
+
+# The elements that PyQuery.text() does not separate with a new line.
+INLINE_TAGS = {'a', 'abbr', 'acronym', 'b', 'bdo', 'big', 'br', 'button', 'cite', 'code', 'dfn', 'em', 'i', 'img',
+               'input', 'kbd', 'label', 'map', 'object', 'q', 'samp', 'script', 'select', 'small', 'span', 'strong',
+               'sub', 'sup', 'textarea', 'time', 'tt', 'var'}
+SEPARATOR = True  # a <br>
+BLOCK = None  # the beginning or the end of a block
+
+WHITESPACE_REGEX = re.compile('[\x20\x09\x0C\u200B\x0A\x0D]+')
+
+
+def _text_parts(element):
+    """
+    :param element: lxml element
+    :return: list of the texts of the element and its descendants, with BLOCK and SEPARATOR between them.
+    """
+    if callable(element.tag):  # comments and processing instructions
+        return []
+    parts = []
+    if element.tag == 'br':
+        parts.append(SEPARATOR)
+    elif element.tag not in INLINE_TAGS:
+        parts.append(BLOCK)
+    if element.text is not None:
+        parts.append(element.text)
+    for child in element:
+        parts.extend(_text_parts(child))
+        if child.tail is not None:
+            parts.append(child.tail)
+    if element.tag not in INLINE_TAGS and element.tag != 'br':
+        parts.append(BLOCK)
+    return parts
+
+
+def _squash_blocks(parts):
+    squashed = []
+    for part in parts:
+        if part is not BLOCK:
+            squashed.append(part)
+        elif not squashed or squashed[-1] is not BLOCK:
+            squashed.append(BLOCK)
+    return squashed
+
+
+def _strip_blocks(parts):
+    """
+    Remove the breaks before the first text and after the last one (the same slices as PyQuery).
+    """
+    if not parts:
+        return parts
+    for start, part in enumerate(parts):
+        if isinstance(part, str):
+            break
+    for end, part in enumerate(parts[:start - 1 if start > 0 else None:-1]):
+        if isinstance(part, str):
+            break
+    return parts[start:-end if end > 0 else None]
+
+
+def _merge_texts(parts):
+    merged, buffer = [], []
+    for part in parts + [BLOCK]:
+        if isinstance(part, str):
+            buffer.append(part)
+            continue
+        if buffer:
+            item = WHITESPACE_REGEX.sub(' ', ''.join(buffer)).strip()
+            if item:
+                merged.append(item)
+            buffer = []
+        merged.append(part)
+    return merged[:-1]
+
+
+def text(element):
+    """
+    :param element: lxml element
+    :return: String, the text of the element as given by PyQuery.text()
+    """
+    parts = _strip_blocks(_squash_blocks(_text_parts(element)))
+    parts = _strip_blocks(_squash_blocks(_merge_texts(parts)))
+    return ''.join('\n' if not isinstance(part, str) else part for part in parts).strip()
+
+
+def by_class(elements, name):
+    """
+    :param elements: list of lxml elements
+    :param name: String, css class
+    :return: list of the elements, or their descendants, with the class.
+    """
+    return [match for element in elements for match in BY_CLASS(element, name=name)]
+
+
+def selection_text(element, name):
+    """
+    :param element: lxml element
+    :param name: String, css class
+    :return: String, the text of the elements with the class, joined with spaces like PyQuery.text()
+    """
+    return ' '.join(text(match) for match in BY_CLASS(element, name=name))
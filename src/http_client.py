@@ -0,0 +1,182 @@
+import time
+import logging
+import threading
+import requests
+from collections import defaultdict
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from src.throttle import AimdController, THROTTLE_STATUS, MAX_LIMIT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+POOL_MAXSIZE = MAX_LIMIT
+HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class HttpClient:
+    """
+    HTTP client shared by all the downloads.
+
+    Each host gets its own session with a pool of keep-alive connections, so consecutive requests reuse the same TCP
+    connection. Compressed transfer is always negotiated and every request has connect/read timeouts. The client
+    keeps per-host accounting of requests, bytes (decoded and transferred) and latency.
+
+    The requests in flight to each host are limited by an AimdController (see src/throttle.py), which grows the limit
+    while the host answers fast and backs off when it throttles. For streamed responses the slot is released once
+    the headers are received.
+
+    :param timeout: (connect timeout, read timeout) in seconds
+    :param pool_maxsize: int, maximum number of connections kept per host.
+
+    A proxy can be set with set_proxy(), e.g. the replay server of src/replay.py.
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_maxsize=POOL_MAXSIZE):
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.sessions = {}
+        self.proxy = None
+        self.controllers = defaultdict(AimdController)
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: {'requests': 0, 'errors': 0, 'bytes': 0, 'wire_bytes': 0, 'seconds': 0.0})
+
+    def session(self, url):
+        """
+        :param url: String
+        :return: requests.Session of the host of the url.
+        """
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                if self.proxy:
+                    session.proxies.update({'http': self.proxy, 'https': self.proxy})
+                self.sessions[host] = session
+            return self.sessions[host]
+
+    def set_proxy(self, proxy):
+        """
+        Send every request through a proxy.
+
+        :param proxy: String, url of the proxy, or None to connect directly.
+        """
+        with self.lock:
+            self.proxy = proxy
+            for session in self.sessions.values():
+                session.proxies.clear()
+                if proxy:
+                    session.proxies.update({'http': proxy, 'https': proxy})
+
+    def controller(self, url):
+        """
+        :param url: String
+        :return: AimdController of the host of the url.
+        """
+        with self.lock:
+            return self.controllers[urlparse(url).netloc]
+
+    def get(self, url, stream=False, **kwargs):
+        """
+        GET request through the session of the host.
+
+        When stream is set the body is not read here, and the caller must account it with add_bytes().
+
+        :param url: String
+        :param stream: bool
+        :return: requests.Response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).netloc
+        controller = self.controller(url)
+        controller.acquire()
+        start = time.time()
+        try:
+            response = self.session(url).get(url, stream=stream, **kwargs)
+            if not stream:
+                content = response.content
+        except Exception as e:
+            controller.release(time.time() - start, throttled=isinstance(e, requests.Timeout))
+            with self.lock:
+                self.stats[host]['errors'] += 1
+            raise
+        controller.release(time.time() - start, throttled=response.status_code in THROTTLE_STATUS)
+
+        with self.lock:
+            stats = self.stats[host]
+            stats['requests'] += 1
+            stats['seconds'] += time.time() - start
+            if not stream:
+                stats['bytes'] += len(content)
+                stats['wire_bytes'] += wire_bytes(response, len(content))
+        return response
+
+    def add_bytes(self, url, n_bytes, wire_bytes=None):
+        """
+        Account the body of a streamed response.
+
+        :param url: String
+        :param n_bytes: int, decoded bytes.
+        :param wire_bytes: int, bytes transferred, if known.
+        """
+        with self.lock:
+            stats = self.stats[urlparse(url).netloc]
+            stats['bytes'] += n_bytes
+            stats['wire_bytes'] += n_bytes if wire_bytes is None else wire_bytes
+
+    def report(self):
+        """
+        :return: dict host -> dict with requests, errors, bytes, wire_bytes, seconds, mean latency, and the current
+        concurrency limit and moving average latency of its controller.
+        """
+        with self.lock:
+            stats = {host: dict(host_stats) for host, host_stats in self.stats.items()}
+            controllers = dict(self.controllers)
+        report = {}
+        for host, host_stats in stats.items():
+            report[host] = host_stats
+            report[host]['latency'] = host_stats['seconds'] / host_stats['requests'] if host_stats['requests'] else 0.0
+            controller_stats = controllers[host].stats() if host in controllers else {}
+            report[host]['limit'] = controller_stats.get('limit')
+            report[host]['recent_latency'] = controller_stats.get('latency', 0.0)
+            report[host]['throttled'] = controller_stats.get('throttled', 0)
+        return report
+
+    def log_report(self):
+        for host, stats in sorted(self.report().items()):
+            logger.info('{}: {} requests ({} errors, {} throttled), {:.1f} MB ({:.1f} MB transferred), {:.3f}s mean '
+                        'latency ({:.3f}s recent), {} concurrent requests allowed'.format(
+                            host, stats['requests'], stats['errors'], stats['throttled'], stats['bytes'] / 1e6,
+                            stats['wire_bytes'] / 1e6, stats['latency'], stats['recent_latency'], stats['limit']))
+
+
+def wire_bytes(response, default):
+    """
+    :param response: requests.Response whose body has been read.
+    :param default: int, returned when the bytes transferred are not known.
+    :return: int, bytes of the body as transferred, i.e. before decompressing it.
+    """
+    try:
+        return response.raw.tell() or default
+    except Exception:
+        return default
+
+
+def get_client():
+    """
+    :return: the HttpClient shared by the process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
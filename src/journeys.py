@@ -0,0 +1,102 @@
+import os
+import re
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.download import get_page, DOWNLOAD_CONCURRENCY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HISTORICO_URL = "http://jv.acb.com/historico.php?jornada={}&cod_competicion={}&cod_edicion={}"
+
+
+def parse_journey(content, competition='LACB'):
+    """
+    Extract the games of a journey from its historico.php page.
+
+    :param content: String
+    :param competition: String, e.g. LACB
+    :return: dict with the list of game acbids and the list of (fls_id, game_acbid) pairs.
+    """
+    fls_ids = re.findall(r'<div class="partido borde_azul" id="partido-([0-9]+)">', content, re.DOTALL)
+    game_ids = re.findall(r'"http://www.acb.com/fichas/' + competition + r'([0-9]+).php', content, re.DOTALL)
+    return {'game_ids': game_ids, 'game_events_ids': list(zip(fls_ids, game_ids))}
+
+
+class JourneyIndex:
+    """
+    Index of the games of each journey of a season, built from the historico.php pages.
+
+    The parsed journeys are persisted in journeys.json within the season folder. Journeys marked as closed are never
+    requested again, so later runs only fetch the journeys that were still open (e.g. the current one).
+    """
+
+    def __init__(self, season, competition='LACB', concurrency=DOWNLOAD_CONCURRENCY):
+        self.season = season
+        self.competition = competition
+        self.concurrency = concurrency
+        self.path = os.path.join(season.SEASON_PATH, 'journeys{}.json'.format('' if competition == 'LACB' else '_' + competition))
+        self.journeys = self._load()
+
+    def game_ids(self, first_journey, last_journey, closed_until=None):
+        """
+        :param first_journey: int
+        :param last_journey: int
+        :param closed_until: int, last journey that is already closed. By default all of them.
+        :return: list of game acbids.
+        """
+        self.update(first_journey, last_journey, closed_until)
+        game_ids = []
+        for journey in range(first_journey, last_journey + 1):
+            game_ids += self.journeys[str(journey)]['game_ids']
+        return game_ids
+
+    def game_events_ids(self, first_journey, last_journey, closed_until=None):
+        """
+        :param first_journey: int
+        :param last_journey: int
+        :param closed_until: int, last journey that is already closed. By default all of them.
+        :return: dict fls_id -> game acbid.
+        """
+        self.update(first_journey, last_journey, closed_until)
+        game_events_ids = {}
+        for journey in range(first_journey, last_journey + 1):
+            game_events_ids.update(dict(self.journeys[str(journey)]['game_events_ids']))
+        return game_events_ids
+
+    def update(self, first_journey, last_journey, closed_until=None):
+        """
+        Fetch concurrently the journeys that are not closed yet, and persist the index.
+
+        :param first_journey: int
+        :param last_journey: int
+        :param closed_until: int, last journey that is already closed. By default all of them.
+        """
+        closed_until = last_journey if closed_until is None else closed_until
+        pending = [journey for journey in range(first_journey, last_journey + 1)
+                   if not self.journeys.get(str(journey), {}).get('closed')]
+        if not pending:
+            return
+
+        logger.info('Fetching {} journeys of season {} ({})...'.format(len(pending), self.season.season, self.competition))
+        urls = [HISTORICO_URL.format(journey, self.competition, self.season.season_id) for journey in pending]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            contents = list(executor.map(get_page, urls))
+
+        for journey, content in zip(pending, contents):
+            self.journeys[str(journey)] = parse_journey(content, self.competition)
+            self.journeys[str(journey)]['closed'] = journey <= closed_until
+        self._save()
+
+    def _load(self):
+        if os.path.isfile(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        return {}
+
+    def _save(self):
+        tmp_path = self.path + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.journeys, file)
+        os.replace(tmp_path, self.path)
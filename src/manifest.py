@@ -0,0 +1,194 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = './data/manifest.db'
+
+OK = 'ok'
+FAILED = 'failed'
+PENDING = 'pending'
+QUARANTINED = 'quarantined'
+INVALID = 'invalid'
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+class Manifest:
+    """
+    Persistent record of every download: url, file, status, size, hash, attempts and timestamp.
+
+    The download stages use it to resume exactly where a previous run stopped, and to know which pages are still
+    missing without walking the data folders.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS downloads ("
+                        "url TEXT PRIMARY KEY, file_path TEXT, status TEXT NOT NULL, http_status INTEGER, "
+                        "size INTEGER, hash TEXT, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS downloads_file_path ON downloads (file_path)")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(downloads)")]
+        if 'verdict' not in columns:  # manifests created before the pages were validated on write.
+            self.db.execute("ALTER TABLE downloads ADD COLUMN verdict TEXT")
+        self.db.execute("CREATE TABLE IF NOT EXISTS audits ("
+                        "file_path TEXT PRIMARY KEY, rule TEXT NOT NULL, mtime REAL, size INTEGER, hash TEXT)")
+        self.db.commit()
+
+    def expect(self, jobs):
+        """
+        Register the pages that a stage is going to download, so they are reported as missing until they are saved.
+
+        :param jobs: list of (file_path, url)
+        """
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO downloads (url, file_path, status, updated_at) VALUES (?, ?, ?, ?)",
+                                [(url, file_path, PENDING, time.time()) for file_path, url in jobs])
+            self.db.commit()
+
+    def record_success(self, url, file_path, content, http_status=200, attempts=1, verdict=None):
+        """
+        :param url: String
+        :param file_path: String or None if the page is not saved.
+        :param content: String or bytes
+        :param http_status: int
+        :param attempts: int
+        :param verdict: String, result of the validation of the page (see src/audit.py).
+        """
+        data = content if isinstance(content, bytes) else content.encode('utf-8')
+        self._upsert(url, file_path, OK, http_status, len(data), hashlib.sha1(data).hexdigest(), attempts, None,
+                     verdict)
+
+    def record_invalid(self, url, file_path, content, verdict, attempts=1):
+        """
+        Record a page that was downloaded but did not pass the validation, so it was not saved.
+
+        :param url: String
+        :param file_path: String
+        :param content: String
+        :param verdict: String
+        :param attempts: int
+        """
+        data = content.encode('utf-8')
+        self._upsert(url, file_path, INVALID, None, len(data), hashlib.sha1(data).hexdigest(), attempts, None, verdict)
+
+    def record_failure(self, url, file_path, error, attempts=1):
+        """
+        :param url: String
+        :param file_path: String or None if the page is not saved.
+        :param error: Exception or String
+        :param attempts: int
+        """
+        self._upsert(url, file_path, FAILED, None, None, None, attempts, str(error))
+
+    def quarantine(self, url, file_path, reason):
+        """
+        Mark a page that could not be downloaded correctly after all the attempts, so it is reported instead of
+        being retried over and over. The download stages skip it until the quarantine is cleared.
+
+        :param url: String
+        :param file_path: String
+        :param reason: String
+        """
+        self._upsert(url, file_path, QUARANTINED, None, None, None, 0, reason)
+
+    def quarantined(self):
+        """
+        :return: set of the urls quarantined.
+        """
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT url FROM downloads WHERE status=?", (QUARANTINED,))}
+
+    def clear_quarantine(self):
+        """
+        Let the download stages try again the quarantined pages.
+
+        :return: number of pages released.
+        """
+        with self.lock:
+            cursor = self.db.execute("UPDATE downloads SET status=?, attempts=0, updated_at=? WHERE status=?",
+                                     (PENDING, time.time(), QUARANTINED))
+            self.db.commit()
+        return cursor.rowcount
+
+    def verdicts(self, file_paths):
+        """
+        :param file_paths: list of String
+        :return: dict file_path -> verdict of the files already downloaded.
+        """
+        file_paths = list(file_paths)
+        verdicts = {}
+        with self.lock:
+            for i in range(0, len(file_paths), 500):
+                chunk = file_paths[i:i + 500]
+                rows = self.db.execute("SELECT file_path, verdict FROM downloads WHERE status=? AND file_path IN ({})".format(
+                    ','.join('?' * len(chunk))), [OK] + chunk).fetchall()
+                verdicts.update(rows)
+        return verdicts
+
+    def missing(self, directory=None):
+        """
+        Pages registered or attempted that have not been downloaded yet.
+
+        :param directory: String, only the pages saved within this directory.
+        :return: list of (file_path, url, status, attempts)
+        """
+        query = "SELECT file_path, url, status, attempts FROM downloads WHERE status != ?"
+        params = [OK]
+        if directory:
+            query += " AND file_path LIKE ?"
+            params.append(os.path.join(directory, '') + '%')
+        with self.lock:
+            return self.db.execute(query + " ORDER BY file_path", params).fetchall()
+
+    def audited(self, rule):
+        """
+        Files that already passed an audit rule, see src/audit.py.
+
+        :param rule: String
+        :return: dict file_path -> (mtime, size, hash)
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT file_path, mtime, size, hash FROM audits WHERE rule=?", (rule,)).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def record_audited(self, rule, files):
+        """
+        :param rule: String
+        :param files: list of (file_path, mtime, size, hash)
+        """
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO audits (file_path, rule, mtime, size, hash) VALUES (?, ?, ?, ?, ?)",
+                                [(file_path, rule, mtime, size, digest) for file_path, mtime, size, digest in files])
+            self.db.commit()
+
+    def _upsert(self, url, file_path, status, http_status, size, digest, attempts, error, verdict=None):
+        with self.lock:
+            self.db.execute("INSERT INTO downloads (url, file_path, status, http_status, size, hash, attempts, error, "
+                            "verdict, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT(url) DO UPDATE SET file_path=COALESCE(excluded.file_path, file_path), "
+                            "status=excluded.status, http_status=excluded.http_status, size=excluded.size, "
+                            "hash=excluded.hash, attempts=attempts + excluded.attempts, error=excluded.error, "
+                            "verdict=excluded.verdict, updated_at=excluded.updated_at",
+                            (url, file_path, status, http_status, size, digest, attempts, error, verdict, time.time()))
+            self.db.commit()
+
+
+def get_manifest():
+    """
+    :return: the Manifest of the data folder, opened the first time it is needed.
+    """
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = Manifest()
+        return _manifest
@@ -0,0 +1,137 @@
+"""
+Persistent cache of the parsed pages.
+
+The records read by the extractors (GameRecord of src/ficha.py, PbpBatch of src/pbp.py and ShotBatch of src/court.py)
+are kept for each folder of pages in a gzipped pickle, './data/parsed/<season>/<kind>.pkl.gz', which maps the name of
+each page to the sha1 of its content and its pickled record. A record is only reused while the page has the same
+content and the extractor the same PARSER_VERSION (a new version discards the whole file), so the inserts after a
+change of the schema or a reset of the database read the pages but do not parse them again.
+
+The cache is disabled by default (see enable()).
+"""
+import os
+import gzip
+import pickle
+import hashlib
+import logging
+from src.raw_store import DATA_PATH, key_from_directory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_PATH = os.path.join(DATA_PATH, 'parsed/')
+PICKLE_PROTOCOL = 4
+GZIP_LEVEL = 1
+
+_settings = {'enabled': False, 'path': PARSE_CACHE_PATH}
+
+
+class ParseCache:
+    """
+    Parsed records of the pages of a folder.
+
+    :param directory: String, folder of the pages.
+    :param version: int, PARSER_VERSION of the extractor.
+    :param path: String, folder of the cache. None for a disabled cache, that parses every page.
+    """
+
+    def __init__(self, directory, version, path=None):
+        self.version = version
+        self.records = {}
+        self.hits = self.misses = 0
+        self.changed = False
+        self.file_path = None
+        if path is None:
+            return
+
+        kind, season = key_from_directory(directory)
+        self.file_path = os.path.join(path, season, '{}.pkl.gz'.format(kind.replace('/', '_')))
+        if os.path.isfile(self.file_path):
+            try:
+                with gzip.open(self.file_path, 'rb') as file:
+                    version, records = pickle.load(file)
+            except Exception as e:
+                logger.warning('The parse cache {} could not be read: {}'.format(self.file_path, e))
+                return
+            if version == self.version:
+                self.records = records
+            else:
+                logger.info('The parser of {} has changed, its cache is discarded'.format(directory))
+
+    def get(self, file_name, content):
+        """
+        :param file_name: String
+        :param content: String, the page.
+        :return: the record parsed from the same content, or None.
+        """
+        if self.file_path is None:
+            return None
+        entry = self.records.get(file_name)
+        if entry is None or content is None or entry[0] != _digest(content):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(entry[1])
+
+    def put(self, file_name, content, record):
+        if self.file_path is None or content is None:
+            return
+        try:
+            self.records[file_name] = (_digest(content), pickle.dumps(record, protocol=PICKLE_PROTOCOL))
+            self.changed = True
+        except Exception as e:  # e.g. an exception of lxml in the record.
+            logger.debug('The record of {} could not be cached: {}'.format(file_name, e))
+
+    def parse(self, file_name, content, parser):
+        """
+        :param file_name: String
+        :param content: String, the page.
+        :param parser: function that reads the record of a page.
+        :return: the cached record of the page, or the one given by the parser.
+        """
+        record = self.get(file_name, content)
+        if record is not None:
+            return record
+        record = parser(content)
+        self.put(file_name, content, record)
+        return record
+
+    def save(self):
+        if self.file_path is None:
+            return
+        if self.changed:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            tmp_path = self.file_path + '.part'
+            with gzip.open(tmp_path, 'wb', compresslevel=GZIP_LEVEL) as file:
+                pickle.dump((self.version, self.records), file, protocol=PICKLE_PROTOCOL)
+            os.replace(tmp_path, self.file_path)
+            self.changed = False
+        logger.info('Parse cache {}: {} pages reused, {} parsed'.format(self.file_path, self.hits, self.misses))
+
+
+def _digest(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def enable(path=PARSE_CACHE_PATH):
+    """
+    Keep the records parsed by the insert stages in the cache.
+
+    :param path: String
+    """
+    _settings['enabled'] = True
+    _settings['path'] = path
+    logger.info('The parsed pages are cached in {}'.format(path))
+
+
+def is_enabled():
+    return _settings['enabled']
+
+
+def open_cache(directory, version):
+    """
+    :param directory: String, folder of the pages.
+    :param version: int, PARSER_VERSION of the extractor.
+    :return: ParseCache, disabled if the cache is not enabled.
+    """
+    return ParseCache(directory, version, _settings['path'] if _settings['enabled'] else None)
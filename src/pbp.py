@@ -0,0 +1,84 @@
+"""
+Columnar extractor of the play-by-play pages of fibalivestats.
+
+The #playbyplay fragment is walked once and every action (the divs whose class starts with 'pbpa') becomes a row of a
+PbpBatch, whose fields are lists with one value per action, from the first action of the game to the last one (the
+pages list them from the last to the first). Event.scrap_and_insert only matches the players with the actors and
+tracks the rosters over these lists.
+
+An action is 'parsed' when its time, score, jersey and player could be read. The other ones (e.g. timeouts) keep the
+fallback values read from the attributes of the div: the clock from its id and the period from its class.
+
+The text of the elements is extracted like PyQuery does (see src/html_text.py).
+"""
+import re
+from collections import namedtuple
+import lxml.html
+from lxml import etree
+from src.utils import convert_time
+from src.html_text import text, selection_text
+
+PARSER_VERSION = 2  # to be increased when the records change, see src/parse_cache.py
+
+PbpBatch = namedtuple('PbpBatch', ['side', 'legend', 'period', 'clock', 'elapsed_time', 'home_score', 'away_score',
+                                   'jersey', 'name', 'parsed', 'fallback_legend', 'fallback_period', 'fallback_clock'])
+
+PLAYBYPLAY = etree.XPath("//*[@id='playbyplay']")
+ACTIONS = etree.XPath("descendant-or-self::div[starts-with(@class, 'pbpa')]")
+
+MARKER_REGEX = re.compile(r'([0-9]{2}:[0-9]{2})([0-9]+)-([0-9]+)')
+CLOCK_REGEX = re.compile(r'([0-9]{2}:[0-9]{2})')
+PERIOD_CLASS_REGEX = re.compile(r'per_[a-z]?([a-z]?[0-9]+)')
+
+
+def extract_pbp(content):
+    """
+    :param content: String, a play-by-play page.
+    :return: PbpBatch, empty if the page has no #playbyplay.
+    """
+    batch = PbpBatch(*[[] for _ in PbpBatch._fields])
+    playbyplay = PLAYBYPLAY(lxml.html.fromstring(content))
+    if not playbyplay:
+        return batch
+
+    home_score = away_score = 0
+    for action in reversed(ACTIONS(playbyplay[0])):
+        tag = action.get('class')
+        action_text = selection_text(action, 'pbp-action')
+        time_text = selection_text(action, 'pbp-time')
+
+        legend = period = time = jersey = display_name = elapsed_time = None
+        parsed = False
+        try:
+            legend = action_text.split(", ")[-1].split("\n")[0]
+            period, marker = time_text.split(" ")
+            marker_search = MARKER_REGEX.search(marker)
+            if marker_search:
+                time, home_score, away_score = marker_search.groups()
+                home_score, away_score = int(home_score), int(away_score)
+            else:
+                time = CLOCK_REGEX.search(marker).groups()[0]
+            jersey, display_name, _ = action_text.split(", ")
+            jersey = int(jersey)
+            parsed = True
+            elapsed_time = convert_time(time, period[1:])
+        except Exception:
+            pass
+
+        # Cells without player associated (e.g. timeouts and missing info)
+        period_search = PERIOD_CLASS_REGEX.search(tag)
+
+        batch.side.append(1 if "pbpt1" in tag else 2 if "pbpt2" in tag else None)
+        batch.legend.append(legend)
+        batch.period.append(period)
+        batch.clock.append(time)
+        batch.elapsed_time.append(elapsed_time)
+        batch.home_score.append(home_score)
+        batch.away_score.append(away_score)
+        batch.jersey.append(jersey)
+        batch.name.append(display_name)
+        batch.parsed.append(parsed)
+        batch.fallback_legend.append(action_text if action_text != '' else text(action).split("\n")[0])
+        batch.fallback_period.append("P" + period_search.groups()[0] if period_search else None)
+        batch.fallback_clock.append(action.get('id'))
+    return batch
@@ -0,0 +1,184 @@
+"""
+Compressed, content-addressed store for the raw pages.
+
+Each page is compressed and saved once under blobs/<hash[:2]>/<hash>.<codec>, where hash is the sha1 of the content.
+A small SQLite index maps (kind, season, acbid) to the blob. The key is inferred from the usual path of the page, so
+'./data/2017/games/1-62001.html' is stored as ('games', '2017', '1-62001') and './data/actors/players/Y9G.html' as
+('actors/players', '', 'Y9G').
+
+The store is disabled by default. When it is enabled (see enable()) the functions of src/download.py write new pages
+to it, and read pages from it when there is not a loose file.
+"""
+import os
+import gzip
+import sqlite3
+import hashlib
+import logging
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available.
+    zstandard = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATA_PATH = './data/'
+RAW_STORE_PATH = os.path.join(DATA_PATH, 'raw/')
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 9
+
+_store = None
+
+
+class RawStore:
+    def __init__(self, path=RAW_STORE_PATH):
+        self.path = path
+        self.blobs_path = os.path.join(path, 'blobs')
+        os.makedirs(self.blobs_path, exist_ok=True)
+        self.codec = 'zst' if zstandard else 'gz'
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(path, 'index.db'), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages ("
+                        "kind TEXT NOT NULL, season TEXT NOT NULL, acbid TEXT NOT NULL, blob TEXT NOT NULL, "
+                        "size INTEGER, PRIMARY KEY (kind, season, acbid))")
+        self.db.commit()
+
+    def put(self, key, content):
+        """
+        Store a page.
+
+        :param key: (kind, season, acbid)
+        :param content: String
+        :return: name of the blob
+        """
+        data = content.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        blob = '{}.{}'.format(digest, self.codec)
+        blob_path = self._blob_path(blob)
+        if not os.path.isfile(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = blob_path + '.part.{}'.format(threading.get_ident())
+            with open(tmp_path, 'wb') as file:
+                file.write(self._compress(data))
+            os.replace(tmp_path, blob_path)
+
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO pages (kind, season, acbid, blob, size) VALUES (?, ?, ?, ?, ?)",
+                            key + (blob, len(data)))
+            self.db.commit()
+        return blob
+
+    def get(self, key):
+        """
+        :param key: (kind, season, acbid)
+        :return: content of the page, or None if it is not stored.
+        """
+        blob = self.blob(key)
+        if blob is None:
+            return None
+        with open(self._blob_path(blob), 'rb') as file:
+            return self._decompress(blob, file.read()).decode('utf-8')
+
+    def blob(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT blob FROM pages WHERE kind=? AND season=? AND acbid=?", key).fetchone()
+        return row[0] if row else None
+
+    def delete(self, key):
+        with self.lock:
+            self.db.execute("DELETE FROM pages WHERE kind=? AND season=? AND acbid=?", key)
+            self.db.commit()
+
+    def acbids(self, kind, season):
+        """
+        :return: sorted list of the acbids stored for a kind and season.
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT acbid FROM pages WHERE kind=? AND season=? ORDER BY acbid",
+                                   (kind, season)).fetchall()
+        return [row[0] for row in rows]
+
+    def _blob_path(self, blob):
+        return os.path.join(self.blobs_path, blob[:2], blob)
+
+    def _compress(self, data):
+        if self.codec == 'zst':
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    @staticmethod
+    def _decompress(blob, data):
+        if blob.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError('The blob {} is compressed with zstd, please install zstandard'.format(blob))
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+
+def enable(path=RAW_STORE_PATH):
+    """
+    Enable the raw store for the pages saved and read through src/download.py.
+
+    :param path: String
+    """
+    global _store
+    _store = RawStore(path)
+    logger.info('Raw pages are stored compressed in {} ({})'.format(path, _store.codec))
+    return _store
+
+
+def get_store():
+    """
+    :return: RawStore or None when the store is disabled.
+    """
+    return _store
+
+
+def key_from_path(file_path):
+    """
+    Infer the key of a page from its path under the data folder.
+
+    :param file_path: String
+    :return: (kind, season, acbid)
+    """
+    relative = os.path.relpath(os.path.abspath(file_path), os.path.abspath(DATA_PATH))
+    parts = relative.replace(os.sep, '/').split('/')
+    acbid = os.path.splitext(parts[-1])[0]
+    folders = parts[:-1]
+    season = folders.pop(0) if folders and folders[0].isdigit() else ''
+    return '/'.join(folders), season, acbid
+
+
+def key_from_directory(directory):
+    """
+    :param directory: String
+    :return: (kind, season) of the pages saved in a directory.
+    """
+    kind, season, _ = key_from_path(os.path.join(directory, 'page.html'))
+    return kind, season
+
+
+def import_directory(directory, remove_loose=False):
+    """
+    Move the loose pages of a directory into the store.
+
+    :param directory: String
+    :param remove_loose: bool, remove the loose files once stored.
+    :return: number of pages stored
+    """
+    store = get_store() or enable()
+    imported = 0
+    for file_name in sorted(os.listdir(directory)):
+        file_path = os.path.join(directory, file_name)
+        if not os.path.isfile(file_path) or not file_name.endswith('.html'):
+            continue
+        with open(file_path, 'r', encoding='utf-8') as file:
+            store.put(key_from_path(file_path), file.read())
+        if remove_loose:
+            os.remove(file_path)
+        imported += 1
+
+    logger.info('{} pages of {} imported into the raw store'.format(imported, directory))
+    return imported
@@ -0,0 +1,213 @@
+"""
+Local stand-in of the remote sites, backed by a recorded archive of pages.
+
+The archive is a copy of a working folder: its manifest (see src/manifest.py) gives the page downloaded for each url,
+and the page is read from the loose file or from the raw store of the archive. The server is an HTTP proxy, so the
+urls are not rewritten: once enabled (see enable()) every request of the HttpClient goes through it, and the browsers
+created by DriverPool too. Only plain http urls are served, the https ones (CONNECT) are refused.
+
+A fixed latency (with jitter) and a rate of 503 errors can be injected, with a seed, so the throughput of the
+download engine can be measured in reproducible conditions. Without them a whole season is re-ingested offline at
+disk speed.
+"""
+import os
+import gzip
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.utils import requote_uri
+from src.manifest import MANIFEST_PATH, OK
+from src.raw_store import RAW_STORE_PATH, RawStore, key_from_path
+from src.http_client import get_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPLAY_HOST = '127.0.0.1'
+ERROR_STATUS = 503
+
+_server = None
+
+
+class ReplayArchive:
+    """
+    Pages recorded in a working folder, by url.
+
+    :param root: String, folder that contains the data folder of the archive.
+    """
+
+    def __init__(self, root='.'):
+        self.root = root
+        manifest_path = os.path.join(root, MANIFEST_PATH)
+        if not os.path.isfile(manifest_path):
+            raise FileNotFoundError('There is no manifest in {}'.format(manifest_path))
+        db = sqlite3.connect(manifest_path)
+        try:
+            self.files = dict(db.execute("SELECT url, file_path FROM downloads WHERE status=? AND file_path IS NOT NULL",
+                                         (OK,)).fetchall())
+        finally:
+            db.close()
+        # The urls are requested as the client quotes them.
+        self.files.update({requote_uri(url): file_path for url, file_path in list(self.files.items())})
+
+        store_path = os.path.join(root, RAW_STORE_PATH)
+        self.store = RawStore(store_path) if os.path.isfile(os.path.join(store_path, 'index.db')) else None
+
+    def get(self, url):
+        """
+        :param url: String
+        :return: bytes of the page, or None if it was not recorded.
+        """
+        file_path = self.files.get(url) or self.files.get(requote_uri(url))
+        if file_path is None:
+            return None
+        archived_path = os.path.join(self.root, file_path)
+        if os.path.isfile(archived_path):
+            with open(archived_path, 'rb') as file:
+                return file.read()
+        if self.store is not None:
+            content = self.store.get(key_from_path(file_path))
+            if content is not None:
+                return content.encode('utf-8')
+        return None
+
+    def __len__(self):
+        return len(set(self.files.values()))
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        replay = self.server.replay
+        delay, fail = replay.draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            replay.count('errors')
+            return self._send(ERROR_STATUS, b'')
+
+        content = replay.archive.get(self.path)
+        if content is None:
+            replay.count('missing')
+            return self._send(404, b'<html><head><title>404 Not Found</title></head></html>')
+
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            replay.count('not_modified')
+            return self._send(304, b'', {'ETag': etag})
+
+        headers = {'ETag': etag, 'Content-Type': 'text/html; charset=utf-8'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        replay.count('served', len(content))
+        self._send(200, content, headers)
+
+    def do_CONNECT(self):
+        self.server.replay.count('missing')
+        self._send(501, b'')
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ReplayServer:
+    """
+    HTTP proxy that answers every request with the page recorded in an archive.
+
+    :param archive: ReplayArchive
+    :param latency: float, seconds added to every request.
+    :param jitter: float, maximum seconds added or subtracted at random to the latency.
+    :param error_rate: float, fraction of the requests answered with a 503.
+    :param seed: int, seed of the random latencies and errors, for reproducible runs.
+    :param port: int, 0 for any free port.
+    """
+
+    def __init__(self, archive, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, port=0):
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'served': 0, 'not_modified': 0, 'missing': 0, 'errors': 0, 'bytes': 0}
+        self.httpd = ThreadingHTTPServer((REPLAY_HOST, port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.httpd.server_address[:2])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def draw(self):
+        """
+        :return: (seconds of latency, bool the request fails) of a new request.
+        """
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate > 0 and self.random.random() < self.error_rate
+        return max(0.0, delay), fail
+
+    def count(self, name, n_bytes=0):
+        with self.lock:
+            self.stats[name] += 1
+            self.stats['bytes'] += n_bytes
+
+    def log_report(self):
+        with self.lock:
+            stats = dict(self.stats)
+        logger.info('Replay: {} requests, {} served ({:.1f} MB), {} not modified, {} not recorded, {} errors '
+                    'injected'.format(stats['requests'], stats['served'], stats['bytes'] / 1e6,
+                                      stats['not_modified'], stats['missing'], stats['errors']))
+
+
+def enable(root, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+    """
+    Serve every download from the archive of a working folder.
+
+    :param root: String, folder that contains the data folder of the archive.
+    :param latency: float, seconds
+    :param jitter: float, seconds
+    :param error_rate: float
+    :param seed: int
+    :return: ReplayServer
+    """
+    global _server
+    _server = ReplayServer(ReplayArchive(root), latency, jitter, error_rate, seed).start()
+    get_client().set_proxy(_server.url)
+    logger.info('Replaying {} pages of {} from {} ({:.3f}s latency, {:.1%} errors)'.format(
+        len(_server.archive), root, _server.url, latency, error_rate))
+    return _server
+
+
+def get_server():
+    """
+    :return: ReplayServer or None when the replay is disabled.
+    """
+    return _server
@@ -1,7 +1,8 @@
 import os
 import re
 import numpy as np
-from src.download import validate_dir, open_or_download,download,get_page
+from src.download import validate_dir, open_or_download,download
+from src.journeys import JourneyIndex
 from pyquery import PyQuery as pq
 from utils.log import logger
 
@@ -14,15 +15,20 @@ TEAMS_PATH = os.path.join(DATA_PATH, 'teams/')
 ACTORS_PATH = os.path.join(DATA_PATH, 'actors/')
 PLAYERS_PATH = os.path.join(ACTORS_PATH, 'players/')
 COACHES_PATH = os.path.join(ACTORS_PATH, 'coaches/')
+PHOTOS_PATH = os.path.join(ACTORS_PATH, 'photos/')
 
 validate_dir(TEAMS_PATH)
 validate_dir(ACTORS_PATH)
 validate_dir(PLAYERS_PATH)
 validate_dir(COACHES_PATH)
+validate_dir(PHOTOS_PATH)
 
 from_journey = 1
 to_journey = 54
 
+# Journeys of each competition in historico.php: the Copa del Rey has the quarter-finals, semifinals and final.
+JOURNEYS = {'LACB': (from_journey, to_journey), 'CREY': (1, 3)}
+
 PLAYOFF_MAPPER = {
     1994: [3, 5, 5],
     1995: [3, 5, 5],
@@ -60,21 +66,29 @@ class Season:
         self.SEASON_PATH = os.path.join(DATA_PATH, str(self.season))
         self.GAMES_PATH = os.path.join(self.SEASON_PATH, 'games')
 
+        self.GAMES_COPA_PATH = os.path.join(self.SEASON_PATH, 'games_copa')
+
         validate_dir(self.SEASON_PATH)
         validate_dir(self.GAMES_PATH)
+        validate_dir(self.GAMES_COPA_PATH)
 
         if self.season >= 2016:
             self.EVENTS_PATH = os.path.join(self.SEASON_PATH, 'events')
             self.SHOTCHART_PATH = os.path.join(self.SEASON_PATH, 'shotchart')
+            self.EVENTS_PATH_COPA = os.path.join(self.SEASON_PATH, 'events_copa')
+            self.SHOTCHART_PATH_COPA = os.path.join(self.SEASON_PATH, 'shotchart_copa')
 
             validate_dir(self.EVENTS_PATH)
             validate_dir(self.SHOTCHART_PATH)
+            validate_dir(self.EVENTS_PATH_COPA)
+            validate_dir(self.SHOTCHART_PATH_COPA)
 
         #self.current_journey=self.get_current_journey(season)
         self.relegation_playoff_seasons = [1994, 1995, 1996, 1997]
         self.num_teams = self.get_number_teams()
         self.playoff_format = self.get_playoff_format()
         self.mismatched_teams = []
+        self._journey_indexes = {}
 
         #self.game_events_ids=self.get_game_events_ids()
         #self.game_ids=self.get_game_ids()
@@ -82,39 +96,28 @@ class Season:
         #if self.season == get_current_season():
         #    self.current_game_events_ids=self.get_current_game_events_ids()
 
-    def get_game_events_ids(self):
-        game_events_ids = {}
-        for i in range(from_journey, to_journey + 1):
-            url = "http://jv.acb.com/historico.php?jornada={}&cod_competicion=LACB&cod_edicion={}".format(i,self.season_id)
-            content = get_page(url)
-
-            fls_ids = re.findall(r'<div class="partido borde_azul" id="partido-([0-9]+)">', content, re.DOTALL)
-            game_ids = re.findall(r'"http://www.acb.com/fichas/LACB([0-9]+).php', content, re.DOTALL)
-            game_events_ids.update(dict(zip(fls_ids, game_ids)))
-
-        return game_events_ids
-
-    def get_game_ids(self):
-        game_ids_list=[]
-        for i in range(from_journey, to_journey + 1):
-            url = "http://jv.acb.com/historico.php?jornada={}&cod_competicion=LACB&cod_edicion={}".format(i,self.season_id)
-            content = get_page(url)
-
-            game_ids = re.findall(r'"http://www.acb.com/fichas/LACB([0-9]+).php', content, re.DOTALL)
-            game_ids_list+=game_ids
-        return game_ids_list
-
-    def get_current_game_events_ids(self):
-        current_game_events_ids = {}
-        for i in range(from_journey, self.get_current_journey() + 1):
-            url = "http://jv.acb.com/historico.php?jornada={}&cod_competicion=LACB&cod_edicion={}".format(i,self.season_id)
-            content = get_page(url)
-
-            fls_ids = re.findall(r'<div class="partido borde_azul" id="partido-([0-9]+)">', content, re.DOTALL)
-            game_ids = re.findall(r'"http://www.acb.com/fichas/LACB([0-9]+).php', content, re.DOTALL)
-            current_game_events_ids.update(dict(zip(fls_ids, game_ids)))
+    def journey_index(self, competition='LACB'):
+        """
+        Index of the games of each journey, persisted in the season folder (see src/journeys.py).
 
-        return current_game_events_ids
+        :param competition: String, code of the competition, e.g. LACB or CREY
+        """
+        if competition not in self._journey_indexes:
+            self._journey_indexes[competition] = JourneyIndex(self, competition)
+        return self._journey_indexes[competition]
+
+    def get_game_events_ids(self, competition='LACB'):
+        return self.journey_index(competition).game_events_ids(*JOURNEYS[competition])
+
+    def get_game_ids(self, competition='LACB'):
+        return self.journey_index(competition).game_ids(*JOURNEYS[competition])
+
+    def get_current_game_events_ids(self, competition='LACB'):
+        if competition != 'LACB':  # the cup has its own calendar, its few journeys are requested again until it ends.
+            return self.journey_index(competition).game_events_ids(*JOURNEYS[competition], closed_until=0)
+        current_journey = self.get_current_journey()
+        # The current journey may still be in progress, so it is requested again in later runs.
+        return self.journey_index().game_events_ids(from_journey, current_journey, closed_until=current_journey - 1)
 
     def save_teams(self):
         """
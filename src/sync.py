@@ -0,0 +1,84 @@
+"""
+High-water marks of the incremental sync of a season.
+
+The state is persisted in sync.json within the season folder: the last journey whose games were all downloaded and
+inserted. A sync handles the journeys after it up to the current one included, so a weekly update costs the request of
+the calendar, the new journeys and their games, instead of a sweep of the whole season. A journey with a game that
+failed, or still in progress, stays pending and is requested again by the next sync.
+"""
+import os
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SyncState:
+    def __init__(self, season):
+        self.season = season
+        self.path = os.path.join(season.SEASON_PATH, 'sync.json')
+        self.state = self._load()
+
+    @property
+    def last_journey(self):
+        return self.state.get('last_journey', 0)
+
+    def pending_journeys(self, current_journey):
+        """
+        :param current_journey: int, latest journey shown in the calendar, which may still be in progress.
+        :return: (first journey, last journey) not completely ingested yet, the current one included. The range is
+        empty when up to date.
+        """
+        return self.last_journey + 1, current_journey
+
+    def new_games(self, first_journey, last_journey):
+        """
+        :param first_journey: int
+        :param last_journey: int, the current journey, which is requested again in later syncs until it is closed.
+        :return: list of (journey, list of game acbids, dict fls_id -> game acbid), one per journey.
+        """
+        index = self.season.journey_index()
+        index.update(first_journey, last_journey, closed_until=last_journey - 1)
+        journeys = []
+        for journey in range(first_journey, last_journey + 1):
+            games = index.journeys[str(journey)]
+            game_events_ids = dict(games['game_events_ids']) if self.season.season >= 2016 else {}
+            journeys.append((journey, games['game_ids'], game_events_ids))
+        return journeys
+
+    def advance(self, journeys, is_ingested):
+        """
+        Move the high-water mark to the last of the journeys that precede the first one not completely ingested.
+
+        :param journeys: list of (journey, list of game acbids, dict fls_id -> game acbid), as given by new_games().
+        :param is_ingested: function (game acbids, dict fls_id -> game acbid) -> bool, all the games of a journey are
+        downloaded and inserted.
+        :return: int, last journey synced.
+        """
+        last_journey = self.last_journey
+        for journey, game_ids, game_events_ids in journeys:
+            if not game_ids or not is_ingested(game_ids, game_events_ids):
+                logger.info('Journey {} of season {} is not complete yet, it will be synced again'.format(
+                    journey, self.season.season))
+                break
+            last_journey = journey
+
+        if last_journey > self.last_journey:
+            self.state['last_journey'] = last_journey
+            self.state.pop('last_game', None)  # written by older versions.
+            self._save()
+        logger.info('Season {} synced up to journey {}'.format(self.season.season, self.last_journey))
+        return self.last_journey
+
+    def _load(self):
+        if os.path.isfile(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        return {}
+
+    def _save(self):
+        tmp_path = self.path + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,73 @@
+import time
+import threading
+
+INITIAL_LIMIT = 4
+MIN_LIMIT = 1
+MAX_LIMIT = 16
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 2.0  # seconds, the requests in flight when backing off do not back off again.
+LATENCY_TOLERANCE = 2.0  # the latency is healthy while it is below this factor of the best latency observed.
+EWMA_ALPHA = 0.2
+THROTTLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class AimdController:
+    """
+    Additive-increase/multiplicative-decrease limit of the concurrent requests to a host.
+
+    Every successful request with a healthy latency increases the limit by 1/limit, i.e. about one more request in
+    flight per round of requests. A throttled request (429, 5xx or a timeout) halves it. The latency is tracked as an
+    exponentially weighted moving average, and the limit does not grow while it is above LATENCY_TOLERANCE times the
+    best average observed.
+    """
+
+    def __init__(self, initial_limit=INITIAL_LIMIT, min_limit=MIN_LIMIT, max_limit=MAX_LIMIT):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until there is room for one more request.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, throttled=False):
+        """
+        :param latency: float, seconds of the request.
+        :param throttled: bool, the host answered 429/5xx or the request timed out.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.requests += 1
+            if throttled:
+                self.throttled += 1
+                now = time.time()
+                if now - self.last_decrease > DECREASE_COOLDOWN:
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self.last_decrease = now
+            else:
+                self.latency = latency if self.latency is None else \
+                    EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+                self.best_latency = self.latency if self.best_latency is None else min(self.best_latency, self.latency)
+                if self.latency <= LATENCY_TOLERANCE * self.best_latency:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def stats(self):
+        """
+        :return: dict with the current limit, requests in flight and latencies.
+        """
+        with self.condition:
+            return {'limit': int(self.limit), 'in_flight': self.in_flight, 'latency': self.latency or 0.0,
+                    'best_latency': self.best_latency or 0.0, 'requests': self.requests, 'throttled': self.throttled}
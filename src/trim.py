@@ -0,0 +1,126 @@
+"""
+Fragment-trimmed storage of the fibalivestats pages.
+
+The rendered pages weigh hundreds of KB of scripts and markup, while Event.scrap_and_insert and
+Shotchart.scrap_and_insert only read #playbyplay and #shotchart_data. When trimming is enabled (see enable()) only
+that fragment is saved, within a small page whose head records the source url, the capture time and the size of the
+full page. The full page can optionally be kept in a 'full' subfolder, which the insert stages do not read.
+"""
+import os
+import html
+import logging
+import datetime
+from pyquery import PyQuery as pq
+from src.download import list_pages, read_content, save_content
+from src.fibalivestats import PBP, SHOTCHART, PAGE_URLS, HTTP_PAGE_MARKER
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRIMMED_PAGE_MARKER = '<meta name="generator" content="fibalivestats-trimmed">'
+FULL_PAGES_FOLDER = 'full'
+
+# Fragment of each page read by the parsers.
+FRAGMENTS = {PBP: '#playbyplay', SHOTCHART: '#shotchart_data'}
+
+_settings = {'enabled': False, 'keep_full': False}
+
+
+def enable(keep_full=False):
+    """
+    Save only the fragments of the fibalivestats pages captured from now on.
+
+    :param keep_full: bool, keep also the full page in the 'full' subfolder.
+    """
+    _settings['enabled'] = True
+    _settings['keep_full'] = keep_full
+    logger.info('The fibalivestats pages are trimmed to their fragment{}'.format(
+        ' (full pages kept)' if keep_full else ''))
+
+
+def is_enabled():
+    return _settings['enabled']
+
+
+def is_trimmed(content):
+    """
+    :param content: String
+    :return: bool, the page only contains the fragment (trimmed or built without browser).
+    """
+    return TRIMMED_PAGE_MARKER in content or HTTP_PAGE_MARKER in content
+
+
+def trim_page(kind, fls_id, content):
+    """
+    :param kind: String, PBP or SHOTCHART
+    :param fls_id: String
+    :param content: String, the full page.
+    :return: String, the page with only the fragment, or the same page if it is already trimmed or the fragment is
+    not found.
+    """
+    if is_trimmed(content):
+        return content
+    fragment = pq(content)(FRAGMENTS[kind])
+    if not fragment:
+        return content
+
+    header = '{}<meta name="source" content="{}"><meta name="captured" content="{}"><meta name="full-size" content="{}">'.format(
+        TRIMMED_PAGE_MARKER, html.escape(PAGE_URLS[kind].format(fls_id)), datetime.datetime.utcnow().isoformat(),
+        len(content.encode('utf-8')))
+    return '<html><head>{}<title>{}</title></head><body>{}</body></html>'.format(header, fls_id, fragment.outer_html())
+
+
+def full_page_path(file_path):
+    """
+    :param file_path: String
+    :return: String, path where the full page is kept.
+    """
+    directory, file_name = os.path.split(file_path)
+    return os.path.join(directory, FULL_PAGES_FOLDER, file_name)
+
+
+def prepare_page(kind, fls_id, file_path, content):
+    """
+    Page to save for a capture, according to the storage mode. The full page is kept first if requested.
+
+    :param kind: String, PBP or SHOTCHART
+    :param fls_id: String
+    :param file_path: String
+    :param content: String
+    :return: String
+    """
+    if not is_enabled():
+        return content
+    if _settings['keep_full'] and not is_trimmed(content):
+        os.makedirs(os.path.dirname(full_page_path(file_path)), exist_ok=True)
+        save_content(full_page_path(file_path), content)
+    return trim_page(kind, fls_id, content)
+
+
+def trim_directory(directory, kind, keep_full=None):
+    """
+    Trim the pages already saved in a directory.
+
+    :param directory: String
+    :param kind: String, PBP or SHOTCHART
+    :param keep_full: bool, keep also the full pages in the 'full' subfolder. By default as set in enable().
+    :return: (bytes before, bytes after)
+    """
+    keep_full = _settings['keep_full'] if keep_full is None else keep_full
+    before, after = 0, 0
+    for file_name in list_pages(directory):
+        file_path = os.path.join(directory, file_name)
+        content = read_content(file_path)
+        fls_id = os.path.splitext(file_name)[0].split('-', 1)[1]
+        trimmed = trim_page(kind, fls_id, content)
+        before += len(content.encode('utf-8'))
+        after += len(trimmed.encode('utf-8'))
+        if trimmed is content:
+            continue
+        if keep_full:
+            os.makedirs(os.path.dirname(full_page_path(file_path)), exist_ok=True)
+            save_content(full_page_path(file_path), content)
+        save_content(file_path, trimmed)
+
+    logger.info('Pages of {} trimmed from {:.1f} MB to {:.1f} MB'.format(directory, before / 1e6, after / 1e6))
+    return before, after
@@ -1,5 +1,6 @@
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options, FirefoxProfile
+from urllib.parse import urlparse
 import platform
 import logging
 import datetime
@@ -7,6 +8,14 @@ import datetime
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PAGE_LOAD_TIMEOUT = 60
+BLOCKED_RESOURCES = {
+    'permissions.default.image': 2,
+    'permissions.default.stylesheet': 2,
+    'browser.display.use_document_fonts': 0,
+    'gfx.downloadable_fonts.enabled': False,
+}
+
 
 def replace_nth_ocurrence(source, n, letter, new_value):
     """
@@ -46,16 +55,29 @@ def convert_time(time, period):
     return 60*minutes+seconds
 
 
-def create_driver(driver_path):
+def create_driver(driver_path, proxy=None):
+    """
+    Headless Firefox for the fibalivestats pages. Images, fonts and CSS are not loaded, as only the html of the
+    page is captured. There is no implicit wait: the captures wait explicitly for the fragment they read
+    (see SeleniumBackend in src/fibalivestats.py).
+
+    :param driver_path: String
+    :param proxy: String, url of an http proxy, e.g. the replay server of src/replay.py.
+    :return: selenium webdriver
+    """
     options = Options()
     options.headless = True
-    #fp = webdriver.FirefoxProfile()
-    #fp.set_preference("http.response.timeout", 30)
-    #fp.set_preference("dom.max_script_run_time", 30)
-    #driver = webdriver.Firefox(options=options, firefox_profile=fp, executable_path=chrome_driver_path)
-    driver = webdriver.Firefox(options=options, executable_path=driver_path)
-    driver.implicitly_wait(30)
-    driver.set_page_load_timeout(300)
+    profile = FirefoxProfile()
+    for name, value in BLOCKED_RESOURCES.items():
+        profile.set_preference(name, value)
+    if proxy:
+        proxy_url = urlparse(proxy)
+        profile.set_preference('network.proxy.type', 1)
+        for scheme in ('http', 'ssl'):
+            profile.set_preference('network.proxy.{}'.format(scheme), proxy_url.hostname)
+            profile.set_preference('network.proxy.{}_port'.format(scheme), proxy_url.port)
+    driver = webdriver.Firefox(options=options, firefox_profile=profile, executable_path=driver_path)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
 
     return driver
 
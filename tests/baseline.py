@@ -0,0 +1,402 @@
+"""
+The PyQuery parsers of the baseline (Game.create_instance, Participant._create_players_and_coaches,
+Event.scrap_and_insert and Shotchart.scrap_and_insert), without the database: they return the values that were
+written in it, so the tests can compare them with the lxml extractors of src/ficha.py, src/pbp.py and src/court.py.
+The code that reads the pages is kept as it was.
+"""
+import re
+import math
+import datetime
+from collections import defaultdict
+from pyquery import PyQuery as pq
+from src.utils import fill_dict, replace_nth_ocurrence, convert_time
+
+
+class BaselineGame:
+    """
+    The attributes of the Game that Participant._create_players_and_coaches read and wrote.
+    """
+
+    def __init__(self, game_acbid):
+        self.game_acbid = game_acbid
+        self.score_home = None
+        self.score_away = None
+        self.team_home_id = 'home'
+        self.team_away_id = 'away'
+
+    def save(self):
+        pass
+
+
+def game_information(raw_game):
+    """
+    :param raw_game: String
+    :return: (dict with the attributes of the game read from the page, home team name, away team name)
+    """
+    estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"', raw_game) else '.estadisticas'
+
+    doc = pq(raw_game)
+    game_dict = dict()
+
+    info_teams_data = doc(estadisticas_tag).eq(1)
+    home_team_name = None
+    away_team_name = None
+    for i in [0, 2]:
+        team_data = info_teams_data('.estverde').eq(i)('td').eq(0).text()
+        team_name = re.search("(.*) [0-9]", team_data).groups()[0]
+        home_team_name = team_name if i == 0 else home_team_name
+        away_team_name = team_name if i != 0 else away_team_name
+
+    info_game_data = doc(estadisticas_tag).eq(0)
+
+    scheduling_data = info_game_data('.estnegro')('td').eq(0).text()
+    scheduling_data = scheduling_data.split("|")
+    journey, date, time, venue, attendance = list(map(lambda x: x.strip(), scheduling_data))
+
+    if date and time:
+        day, month, year = list(map(int, date.split("/")))
+        hour, minute = list(map(int, time.split(":")))
+        game_dict['kickoff_time'] = datetime.datetime(year=year, month=month, day=day, hour=hour, minute=minute)
+
+    if attendance:
+        try:
+            game_dict['attendance'] = int(attendance.split(":")[1])
+        except ValueError:
+            pass
+
+    if venue:
+        game_dict['venue'] = venue
+
+    if journey:
+        game_dict['journey'] = journey.split(" ")[1]
+
+    attributes = {2: ('score_home_first', 'score_away_first'), 3: ('score_home_second', 'score_away_second'),
+                  4: ('score_home_third', 'score_away_third'), 5: ('score_home_fourth', 'score_away_fourth'),
+                  6: ('score_home_extra', 'score_away_extra')}
+    for i in range(2, 7):
+        score_home_attribute, score_away_attribute = attributes[i]
+        quarter_data = info_game_data('.estnaranja')('td').eq(i).text()
+        if quarter_data:
+            try:
+                game_dict[score_home_attribute], game_dict[score_away_attribute] = list(
+                    map(int, quarter_data.split("|")))
+            except ValueError:
+                pass
+
+    referees_data = info_game_data('.estnaranja')('td').eq(0).text()
+    if referees_data:
+        referees = referees_data.split(":")[1].strip().split(",")
+        referees = list(filter(None, referees))
+        referees = list(map(lambda x: x.strip(), referees))
+        n_ref = 1
+        for referee in referees:
+            game_dict['referee_'+str(n_ref)] = referee
+            n_ref += 1
+
+    return game_dict, home_team_name, away_team_name
+
+
+def box_score(raw_game, game):
+    """
+    :param raw_game: String
+    :param game: BaselineGame, whose scores are set.
+    :return: stats[team][number] -> dict with the attributes of the participant, and 'id' with the acbid of the actor.
+    """
+    estadisticas_tag = '.estadisticasnew' if re.search(r'<table class="estadisticasnew"',
+                                                       raw_game) else '.estadisticas'
+    doc = pq(raw_game)
+    info_players_data = doc(estadisticas_tag).eq(1)
+
+    header_text = info_players_data('tr').eq(1)
+    header = []
+    for index in header_text('td').items():
+        header.append(index.text())
+
+    header = replace_nth_ocurrence(header, 3, "C", "FPC")
+    header = replace_nth_ocurrence(header, 2, "C", "TAPC")
+    header = replace_nth_ocurrence(header, 2, "F", "FPF")
+    header = replace_nth_ocurrence(header, 1, "F", "TAPF")
+
+    header_to_db = {'D': 'number', 'Nombre': "display_name", 'Min': 'minutes', 'P': 'point', 'T2': 't2',
+                    'T3': 't3', 'T1': 't1', 'REBD': 'defensive_reb', 'REBO': 'offensive_reb', 'A': 'assist',
+                    'BR': 'steal', 'BP': 'turnover', 'C': 'counterattack', 'TAPF': 'block',
+                    'TAPC': 'received_block', 'M': 'dunk', 'FPF': 'fault', 'FPC': 'received_fault',
+                    '+/-': 'plus_minus', 'V': 'efficiency'}
+    for key, match in list(header_to_db.items()):
+        if key not in header:
+            header_to_db.pop(key)
+    header_to_db.update({"is_coach": "is_coach",
+                         "is_starter": "is_starter",
+                         "game": "game",
+                         "team": "team",
+                         "actor": "actor",
+                         "t1_attempt": "t1_attempt",
+                         "t2_attempt": "t2_attempt",
+                         "t3_attempt": "t3_attempt",
+                         "defensive_reb": "defensive_reb",
+                         "offensive_reb": "offensive_reb"})
+
+    acb_error_player = None
+    stats = defaultdict(dict)
+    current_team = None
+    score_flag = 0
+    for tr in info_players_data('tr').items():
+        if tr('.estverde'):
+            if tr.eq(0)('.estverdel'):
+                current_team = 0 if current_team is None else 1
+                stats[current_team] = defaultdict(dict)
+            else:
+                pass
+        else:
+            number = None
+            for cont, td in enumerate(tr('td').items()):
+
+                if td.text() == "5f":
+                    break
+
+                elif td.text() == 'Total' or number == 'Total':
+                    number = 'Total'
+                    if score_flag < 2:
+                        score_flag += 1
+                        continue
+                    elif score_flag == 2:
+                        score_flag += 1
+                        try:
+                            game.score_home = int(td.text()) if current_team == 0 else game.score_home
+                        except Exception:
+                            pass
+                        try:
+                            game.score_away = int(td.text()) if current_team == 1 else game.score_away
+                        except Exception:
+                            pass
+                        game.save()
+                        continue
+                    else:
+                        score_flag = 0
+                        break
+
+                elif cont == 0:
+                    number = td.text() if td.text() else 'Equipo'
+                    if number in stats[current_team]:
+                        wrong_pages_first = ['55313', '54017', '54026', '61072', '61076', '61107', '62177']
+                        wrong_pages_second = ['53154', '61218', '62177']
+                        if game.game_acbid in wrong_pages_first:
+                            pass
+                        elif game.game_acbid in wrong_pages_second:
+                            stats[current_team][number] = acb_error_player
+                            break
+                        else:
+                            continue
+
+                    else:
+                        stats[current_team][number] = fill_dict(header_to_db.values())
+                        stats[current_team][number]['is_starter'] = 1 if td('.gristit') else 0
+                        stats[current_team][number]['game'] = game
+                        stats[current_team][number]['team'] = game.team_home_id if current_team == 0 else game.team_away_id
+
+                elif cont == 1 and td('a'):
+                    href_attribute = td('a').attr('href').split("=")
+                    stats[current_team][number]['id'] = href_attribute[-1]
+
+                    is_coach = re.search(r'entrenador', href_attribute[0])
+                    stats[current_team][number]['is_coach'] = 1 if is_coach else 0
+                    stats[current_team][number]['number'] = None if is_coach else int(number)
+
+                    display_name = td.text()
+                    if ',' in display_name:
+                        try:
+                            last_name, first_name = list(map(lambda x: x.strip(), td.text().split(",")))
+                            new_display_name = str(first_name)[0] + '. ' + last_name
+                            stats[current_team][number]['display_name'] = new_display_name
+                        except:
+                            stats[current_team][number]['display_name'] = new_display_name
+                    else:
+                        stats[current_team][number]['display_name'] = display_name
+
+                elif '%' in header[cont]:
+                    continue
+
+                elif '/' in td.text():
+                    success, attempts = td.text().split("/")
+                    try:
+                        stats[current_team][number][header_to_db[header[cont]]] = int(success)
+                    except Exception:
+                        pass
+                    try:
+                        stats[current_team][number][header_to_db[header[cont]] + "_attempt"] = int(attempts)
+                    except Exception:
+                        pass
+
+                elif '+' in td.text():
+                    defensive, offensive = td.text().split("+")
+                    try:
+                        stats[current_team][number]["defensive_reb"] = int(defensive)
+                    except Exception:
+                        pass
+                    try:
+                        stats[current_team][number]["offensive_reb"] = int(offensive)
+                    except Exception:
+                        pass
+
+                elif ':' in td.text():
+                    minutes, seconds = td.text().split(":")
+                    stats[current_team][number]["minutes"] = int(minutes) * 60 + int(seconds)
+
+                else:
+                    if header[cont] in header_to_db:
+                        try:
+                            stats[current_team][number][header_to_db[header[cont]]] = int(
+                                td.text()) if td.text() else 0
+                        except:
+                            stats[current_team][number][header_to_db[header[cont]]] = td.text()
+
+                acb_error_player = stats[current_team][number]
+    return stats
+
+
+def events(content):
+    """
+    :param content: String, a play-by-play page.
+    :return: list of (side, legend, period, time, elapsed_time, jersey, display_name, home_score, away_score) of each
+    action, from the first one. The display name is None for the actions without player.
+    """
+    playbyplay = pq(content)('#playbyplay')
+    actions = []
+    home_score = away_score = 0
+    for elem in reversed(list(playbyplay('div').items())):
+        if elem.attr['class'] and elem.attr['class'].startswith("pbpa"):
+
+            tag = elem.attr['class']
+            side = 1 if "pbpt1" in tag else 2 if "pbpt2" in tag else None
+
+            try:
+                legend = elem('.pbp-action').text().split(", ")[-1].split("\n")[0]
+                period, marker = elem('.pbp-time').text().split(" ")
+                marker_search = re.search(r'([0-9]{2}:[0-9]{2})([0-9]+)-([0-9]+)', marker)
+                if marker_search:
+                    time, home_score, away_score = marker_search.groups()
+                else:
+                    time = re.search(r'([0-9]{2}:[0-9]{2})', marker).groups()[0]
+                jersey, display_name, _ = elem('.pbp-action').text().split(", ")
+                jersey = int(jersey)
+
+            except:
+                legend = elem('.pbp-action').text() if elem('.pbp-action').text() != '' else \
+                elem.text().split("\n")[0]
+                time = elem.attr['id']
+                period = "P" + re.search(r'per_[a-z]?([a-z]?[0-9]+)', tag).groups()[0]
+                jersey = -1
+                display_name = None
+
+            elapsed_time = convert_time(time, period[1:])
+            actions.append((side, legend, period, time, elapsed_time, jersey, display_name, int(home_score),
+                            int(away_score)))
+    return actions
+
+
+def shots(content):
+    """
+    :param content: String, a shotchart page.
+    :return: list of dicts with the values read and computed for each shot.
+    """
+    shotchart = pq(content)('#shotchart_data')
+    actions = []
+    first_shot = True
+    home_attack_left = 0
+
+    for elem in list(shotchart('span').items()):
+
+        scored = None
+        period = None
+        bottom_px = None
+        left_px = None
+        bottom_px_adjust = None
+        left_px_adjust = None
+
+        if elem.attr['class']:
+            tag = elem.attr['class']
+            list_tags = tag.split(" ")
+            shot_score = list_tags[1]
+            shot_score_adjust = shot_score.split("_")[0]
+
+            if shot_score == "black_missed" or shot_score == "white_missed":
+                scored = 0
+            elif shot_score == "black_made" or shot_score == "white_made":
+                scored = 1
+
+            period = list_tags[2]
+
+            if period == "sc_per1":
+                period = 1
+            elif period == "sc_per2":
+                period = 2
+            elif period == "sc_per3":
+                period = 3
+            elif period == "sc_per4":
+                period = 4
+            elif period == "sc_perot":
+                period = "OT"
+
+            team = list_tags[4]
+
+        if elem.attr['style']:
+
+            tag = elem.attr['style']
+            list_tags = tag.split(" ")
+            bottom_px = list_tags[1]
+            bottom_px = float(bottom_px.split("%")[0])
+            left_px = list_tags[3]
+            left_px = float(left_px.split("%")[0])
+
+            if first_shot:
+                if left_px < 50.0:
+                    home_attack_left = 1 if team == "sc_tn1" else 0
+                else:
+                    home_attack_left = 0 if team == "sc_tn1" else 1
+                first_shot = False
+
+            if shot_score_adjust == "white" and home_attack_left == 1:
+                if period in [1, 2]:
+                    left_px_adjust, bottom_px_adjust = left_px, bottom_px
+                else:
+                    left_px_adjust, bottom_px_adjust = 100.0-left_px, 100.0-bottom_px
+            elif shot_score_adjust == "white" and home_attack_left == 0:
+                if period in [1, 2]:
+                    left_px_adjust, bottom_px_adjust = 100.0-left_px, 100.0-bottom_px
+                else:
+                    left_px_adjust, bottom_px_adjust = left_px, bottom_px
+            elif shot_score_adjust == "black" and home_attack_left == 1:
+                if period in [1, 2]:
+                    left_px_adjust, bottom_px_adjust = 100.0-left_px, 100.0-bottom_px
+                else:
+                    left_px_adjust, bottom_px_adjust = left_px, bottom_px
+            elif shot_score_adjust == "black" and home_attack_left == 0:
+                if period in [1, 2]:
+                    left_px_adjust, bottom_px_adjust = left_px, bottom_px
+                else:
+                    left_px_adjust, bottom_px_adjust = 100.0-left_px, 100.0-bottom_px
+
+            if elem.attr['title']:
+                tag = elem.attr['title']
+                if tag.startswith(","):
+                    tag = tag.split(",")
+                    tag.remove(tag[0])
+                    jersey = tag[0].strip()
+                    display_name = tag[1].strip()
+                    shot_txt = tag[2].strip()
+                else:
+                    list_tags = tag.split(",")
+                    jersey = list_tags[0]
+                    display_name = list_tags[1].strip()
+                    shot_txt = list_tags[2].strip()
+
+            left_m_adjust = (left_px_adjust * 28) / 100
+            bottom_m_adjust = (bottom_px_adjust * 15) / 100
+            distance = math.sqrt((left_m_adjust - 1.575) ** 2 + (bottom_m_adjust - 7.5) ** 2)
+
+            actions.append({"colour": shot_score_adjust, "team": team, "jersey": jersey, "name": display_name,
+                            "scored": scored, "period": period, "bottom_px": bottom_px, "left_px": left_px,
+                            "bottom_px_adjust": bottom_px_adjust, "left_px_adjust": left_px_adjust,
+                            "bottom_m_adjust": bottom_m_adjust, "left_m_adjust": left_m_adjust,
+                            "distance": distance, "shot_txt": shot_txt})
+    return actions
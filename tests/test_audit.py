@@ -0,0 +1,26 @@
+import os
+import src.manifest
+import src.raw_store
+from src.manifest import Manifest
+from src.audit import audit
+
+VALID_GAME = '<html><title>ACB.COM</title><table class="estadisticasnew"></table><table class="estadisticasnew"></table></html>'
+INVALID_GAME = '<html><title>ACB.COM</title><table class="estadisticasnew"></table><tabla class="estadisticasnew"></tabla></html>'
+
+
+def test_pages_rewritten_with_the_same_mtime_and_size_are_scanned_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.manifest, '_manifest', Manifest(str(tmp_path / 'manifest.sqlite')))
+    monkeypatch.setattr(src.raw_store, 'DATA_PATH', str(tmp_path / 'data'))
+    directory = tmp_path / 'data' / '2017' / 'games'
+    directory.mkdir(parents=True)
+    page = directory / '62001.html'
+    assert len(VALID_GAME) == len(INVALID_GAME)
+
+    page.write_text(VALID_GAME)
+    stat = os.stat(str(page))
+    assert audit(str(directory), workers=1) == ([], [], 1, 0)
+    assert audit(str(directory), workers=1) == ([], [], 0, 1)
+
+    page.write_text(INVALID_GAME)
+    os.utime(str(page), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert audit(str(directory), workers=1) == ([], ['62001.html'], 1, 0)
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from src.court import ShotBatch, extract_shots, court_geometry
+from tests import baseline
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_PATH, file_name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def shot_batch(shots):
+    """
+    :param shots: list of (colour, period, team, left_px, bottom_px)
+    :return: ShotBatch
+    """
+    colour, period, team, left_px, bottom_px = zip(*shots)
+    n = len(shots)
+    return ShotBatch(list(colour), [1] * n, list(period), list(team), np.array(bottom_px, dtype=float),
+                     np.array(left_px, dtype=float), ['0'] * n, ['A. Player'] * n, ['2PT tiro'] * n)
+
+
+def test_two_pointers_on_the_wrong_half_are_moved():
+    # The home team attacks the left basket in the first half (first shot of sc_tn1 at left 10).
+    batch = shot_batch([('white', 1, 'sc_tn1', 10.0, 50.0),
+                        ('black', 1, 'sc_tn2', 30.0, 40.0),  # flipped by normalise to 70, 60
+                        ('white', 1, 'sc_tn1', 80.0, 20.0)])  # not flipped
+    is_two = np.array([True, True, True])
+
+    geometry = court_geometry(batch, is_two=is_two)
+
+    np.testing.assert_allclose(geometry.left_px_adjust, [10.0, 30.0, 20.0])
+    np.testing.assert_allclose(geometry.bottom_px_adjust, [50.0, 40.0, 80.0])
+
+
+def test_three_pointers_are_not_moved():
+    batch = shot_batch([('white', 1, 'sc_tn1', 10.0, 50.0),
+                        ('black', 1, 'sc_tn2', 30.0, 40.0)])
+
+    geometry = court_geometry(batch, is_two=np.array([True, False]))
+
+    np.testing.assert_allclose(geometry.left_px_adjust, [10.0, 70.0])
+    np.testing.assert_allclose(geometry.bottom_px_adjust, [50.0, 60.0])
+
+
+def test_extract_shots_and_court_geometry_match_the_pyquery_parser():
+    content = read_fixture('shotchart.html')
+
+    batch = extract_shots(content)
+    geometry = court_geometry(batch)  # the baseline never moved the two pointers
+
+    expected = baseline.shots(content)
+    assert len(batch.left_px) == len(expected) == 9
+    for field in ('colour', 'scored', 'period', 'team', 'name', 'shot_txt'):
+        assert getattr(batch, field) == [shot[field] for shot in expected]
+    assert batch.jersey == [shot['jersey'].strip() for shot in expected]
+    for field in ('left_px', 'bottom_px'):
+        np.testing.assert_allclose(getattr(batch, field), [shot[field] for shot in expected])
+    for field in geometry._fields:
+        np.testing.assert_allclose(getattr(geometry, field), [shot[field] for shot in expected])
+
+
+def test_extract_shots_without_shots():
+    batch = extract_shots('<html><body><div id="shotchart_data"></div></body></html>')
+
+    assert len(batch.left_px) == 0 and len(court_geometry(batch).distance) == 0
@@ -0,0 +1,34 @@
+import pytest
+import src.download
+from src.download import stream_to_file
+
+
+class BrokenResponse:
+    status_code = 200
+    encoding = 'utf-8'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_content(self, chunk_size, decode_unicode=False):
+        yield '<html><title>ACB.COM</title>'
+        raise ConnectionError('connection reset')
+
+
+class BrokenClient:
+    def get(self, url, cookies=None, stream=False):
+        return BrokenResponse()
+
+
+def test_an_interrupted_download_leaves_no_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.download, 'get_client', lambda: BrokenClient())
+    monkeypatch.setattr(src.download.raw_store, 'get_store', lambda: None)
+    file_path = str(tmp_path / '62001.html')
+
+    with pytest.raises(ConnectionError):
+        stream_to_file(file_path, 'http://www.acb.com/fichas/LACB62001.php')
+
+    assert list(tmp_path.iterdir()) == []
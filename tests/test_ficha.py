@@ -0,0 +1,79 @@
+import os
+import pytest
+from src.ficha import extract_game, is_blank_game, parse_games
+from src.parse_cache import ParseCache
+from tests import baseline
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+FICHAS = [('ficha_new.html', '62041'), ('ficha_old.html', '53154')]
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_PATH, file_name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def box_stats(record):
+    """
+    :param record: GameRecord
+    :return: stats[team][number] like the baseline, without the attributes set when the game is inserted.
+    """
+    stats = {}
+    for row in record.box:
+        stats.setdefault(row.team, {})[row.number] = {key: value for key, value in row.stats.items()
+                                                      if key not in ('game', 'team')}
+    return stats
+
+
+@pytest.mark.parametrize('file_name, game_acbid', FICHAS)
+def test_extract_game_matches_the_pyquery_parser(file_name, game_acbid):
+    raw_game = read_fixture(file_name)
+
+    record = extract_game(raw_game, game_acbid)
+
+    game_dict, home_team_name, away_team_name = baseline.game_information(raw_game)
+    game = baseline.BaselineGame(game_acbid)
+    stats = baseline.box_score(raw_game, game)
+    expected = {team: {number: {key: value for key, value in player_stats.items() if key not in ('game', 'team')}
+                       for number, player_stats in team_dict.items()} for team, team_dict in stats.items()}
+
+    assert record.game_error is None and record.box_error is None
+    assert record.game == game_dict
+    assert (record.home_team_name, record.away_team_name) == (home_team_name, away_team_name)
+    assert (record.score_home, record.score_away) == (game.score_home, game.score_away)
+    assert box_stats(record) == expected
+
+
+def test_extract_game_reads_the_ficha():
+    record = extract_game(read_fixture('ficha_new.html'), '62041')
+
+    assert record.home_team_name == 'VALENCIA BASKET'
+    assert (record.score_home, record.score_away) == (81, 85)
+    assert record.game['journey'] == '5'
+    assert record.game['attendance'] == 8500
+    assert (record.game['score_home_second'], record.game['score_away_second']) == (19, 25)
+    assert 'score_home_extra' not in record.game
+    player = box_stats(record)[0]['6']
+    assert (player['display_name'], player['minutes'], player['t2'], player['t2_attempt']) == ('B. Dubljevic', 1692, 6, 9)
+    assert (player['defensive_reb'], player['offensive_reb'], player['plus_minus']) == (5, 2, 8)
+
+
+def test_extract_game_without_statistics():
+    record = extract_game('<html><title>ACB.COM</title><body></body></html>', '1')
+
+    assert isinstance(record.game_error, ValueError) and record.box == []
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_parse_games_gives_the_records_of_extract_game(workers, tmp_path):
+    games = [(file_name, game_acbid, read_fixture(file_name)) for file_name, game_acbid in FICHAS]
+    expected = [(is_blank_game(raw_game), extract_game(raw_game, game_acbid)) for _, game_acbid, raw_game in games]
+    directory = str(tmp_path / 'data' / '2017' / 'games') + '/'
+
+    cache = ParseCache(directory, 'test', path=str(tmp_path / 'parsed'))
+    assert list(parse_games(games, workers=workers, cache=cache)) == expected
+    cache.save()
+
+    cache = ParseCache(directory, 'test', path=str(tmp_path / 'parsed'))
+    assert list(parse_games(games, workers=workers, cache=cache)) == expected
+    assert (cache.hits, cache.misses) == (len(games), 0)
@@ -0,0 +1,38 @@
+from src.parse_cache import ParseCache
+
+
+def parse_count(calls):
+    def parser(content):
+        calls.append(content)
+        return {'length': len(content)}
+    return parser
+
+
+def test_records_are_reused_while_the_page_and_the_parser_are_the_same(tmp_path):
+    directory = str(tmp_path / 'data' / '2017' / 'events') + '/'
+    path = str(tmp_path / 'parsed')
+    calls = []
+
+    cache = ParseCache(directory, 1, path=path)
+    assert cache.parse('1-2.html', 'page', parse_count(calls)) == {'length': 4}
+    cache.save()
+
+    cache = ParseCache(directory, 1, path=path)
+    assert cache.parse('1-2.html', 'page', parse_count(calls)) == {'length': 4}
+    assert cache.parse('1-2.html', 'new page', parse_count(calls)) == {'length': 8}
+    assert calls == ['page', 'new page']
+    cache.save()
+
+    cache = ParseCache(directory, 2, path=path)  # a new PARSER_VERSION discards the records
+    assert cache.get('1-2.html', 'new page') is None
+
+
+def test_disabled_cache_parses_every_page(tmp_path):
+    calls = []
+    cache = ParseCache(str(tmp_path / 'data' / '2017' / 'events') + '/', 1)
+
+    cache.parse('1-2.html', 'page', parse_count(calls))
+    cache.parse('1-2.html', 'page', parse_count(calls))
+    cache.save()
+
+    assert calls == ['page', 'page'] and list(tmp_path.iterdir()) == []
@@ -0,0 +1,57 @@
+import os
+import lxml.html
+from pyquery import PyQuery as pq
+from src.pbp import extract_pbp
+from src.html_text import text
+from src.utils import convert_time
+from tests import baseline
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_PATH, file_name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def resolve(batch):
+    """
+    The values that Event.scrap_and_insert takes from a PbpBatch when the players match an actor.
+    """
+    actions = []
+    for i in range(len(batch.side)):
+        if batch.parsed[i]:
+            legend, period, time = batch.legend[i], batch.period[i], batch.clock[i]
+            jersey, display_name = batch.jersey[i], batch.name[i]
+        else:
+            legend, period, time = batch.fallback_legend[i], batch.fallback_period[i], batch.fallback_clock[i]
+            jersey, display_name = -1, None
+        actions.append((batch.side[i], legend, period, time, convert_time(time, period[1:]), jersey, display_name,
+                        batch.home_score[i], batch.away_score[i]))
+    return actions
+
+
+def test_extract_pbp_matches_the_pyquery_parser():
+    content = read_fixture('pbp.html')
+
+    actions = resolve(extract_pbp(content))
+
+    assert actions == baseline.events(content)
+    assert [action[1] for action in actions] == [
+        'COMIENZA EL PARTIDO', 'Salto ganado',
+        '6, B. Dubljevic,\n2PT bandeja convertido',  # nested blocks: the action is not parsed
+        'Se retira', 'Entra a pista',
+        'Pérdida por mal pase', '3PT convertido', 'PERIODO FINALIZADO', 'TIEMPO MUERTO', 'Falta personal',
+        'Tiro libre 1/2 convertido', 'Tiro libre 2/2 convertido', 'PARTIDO FINALIZADO']
+
+
+def test_extract_pbp_without_playbyplay():
+    assert extract_pbp('<html><body><div id="header"></div></body></html>').side == []
+
+
+def test_text_matches_pyquery():
+    content = read_fixture('pbp.html')
+    root = lxml.html.fromstring(content)
+    for element in root.iter():
+        if not callable(element.tag):
+            assert text(element) == pq(element).text()
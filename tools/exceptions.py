@@ -5,4 +5,28 @@ class LoggerException(Exception):
             :param message: Description
             :type message: str
         """
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+
+class DownloadException(Exception):
+    def __init__(self, message):
+        """Exception class for the downloads that failed after all the retries.
+
+            :param message: Description
+            :type message: str
+        """
+        super().__init__(message)
+
+
+class InvalidPageException(DownloadException):
+    def __init__(self, message, content=None):
+        """Exception class for the pages downloaded without the expected structure.
+
+            :param message: Verdict of the validation
+            :type message: str
+            :param content: Content of the page
+            :type content: str
+        """
+        super().__init__(message)
+        self.verdict = message
+        self.content = content